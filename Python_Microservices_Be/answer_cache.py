@@ -0,0 +1,226 @@
+# backend/answer_cache.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+from inference_scheduler import embed_query
+from telemetry import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_PROMPT_TYPE = "default_fallback"
+
+
+def recipe_fingerprint(prompt_type):
+    """Changes whenever the LLM or the prompt template that answers prompt_type changes."""
+    from chain_handler import get_prompt_template  # Imported here: chain_handler pulls in langchain
+
+    template = get_prompt_template(prompt_type).messages[0].prompt.template
+    return hashlib.sha256(json.dumps([config.LLM_MODEL_NAME, template]).encode("utf-8")).hexdigest()[:16]
+
+
+class SemanticAnswerCache:
+    """
+    Caches RAG answers per (collection_name, prompt_type, recipe), where the recipe
+    fingerprints the model and prompt template, so answers from a replaced model or
+    edited prompt are not served. A new question is a hit when its embedding is at
+    least `similarity_threshold` (cosine) close to a cached question in the same bucket. Entries are evicted LRU-first beyond `max_entries`
+    and expire after `ttl_seconds`; every entry is mirrored to a SQLite file so the
+    cache survives restarts. Invalidations are recorded there too, so they reach every
+    process sharing the file.
+    """
+
+    def __init__(self, path, similarity_threshold, max_entries, ttl_seconds):
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # entry_id -> entry dict, least recently used first
+        self._db = None
+        self._generations = {}  # collection_name -> invalidation generation the entries are from
+        self.hits = 0
+        self.misses = 0
+
+    # --- Persistence ---
+    def _connect(self):
+        # Opened lazily so importing the module does not touch the disk
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "id TEXT PRIMARY KEY, collection_name TEXT, prompt_type TEXT, question TEXT, "
+                "embedding BLOB, answer TEXT, sources TEXT, created_at REAL, last_used REAL, recipe TEXT)"
+            )
+            if "recipe" not in [column[1] for column in self._db.execute("PRAGMA table_info(answers)")]:
+                # Files from before recipes: their rows never match a recipe and age out
+                self._db.execute("ALTER TABLE answers ADD COLUMN recipe TEXT")
+            # Bumped by invalidate_collection so other processes drop their in-memory copies
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS generations (collection_name TEXT PRIMARY KEY, generation INTEGER)"
+            )
+            self._db.commit()
+            self._generations = dict(self._db.execute("SELECT collection_name, generation FROM generations"))
+            self._load("")
+            self._evict()
+        return self._db
+
+    def _load(self, where, params=()):
+        """Adds the matching SQLite rows to the in-memory entries, least recently used first."""
+        rows = self._db.execute(
+            "SELECT id, collection_name, prompt_type, recipe, question, embedding, answer, sources, created_at "
+            f"FROM answers {where} ORDER BY last_used", params
+        ).fetchall()
+        for entry_id, collection_name, prompt_type, recipe, question, embedding, answer, sources, created_at in rows:
+            self._entries[entry_id] = {
+                "collection_name": collection_name,
+                "prompt_type": prompt_type,
+                "recipe": recipe,
+                "question": question,
+                "embedding": np.frombuffer(embedding, dtype=np.float32),
+                "answer": answer,
+                "sources": json.loads(sources),
+                "created_at": created_at,
+            }
+
+    def _refresh(self, collection_name):
+        """Reloads a collection's entries from SQLite if another process invalidated it since."""
+        row = self._db.execute(
+            "SELECT generation FROM generations WHERE collection_name = ?", (collection_name,)
+        ).fetchone()
+        generation = row[0] if row else 0
+        if generation == self._generations.get(collection_name, 0):
+            return
+        for entry_id in [i for i, e in self._entries.items() if e["collection_name"] == collection_name]:
+            del self._entries[entry_id]
+        self._load("WHERE collection_name = ?", (collection_name,))
+        self._generations[collection_name] = generation
+
+    def _delete(self, entry_ids):
+        for entry_id in entry_ids:
+            self._entries.pop(entry_id, None)
+        if entry_ids:
+            self._db.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in entry_ids])
+            self._db.commit()
+
+    def _evict(self):
+        """Drops expired entries, then the least recently used ones beyond max_entries."""
+        now = time.time()
+        expired = [i for i, e in self._entries.items() if now - e["created_at"] > self.ttl_seconds]
+        expired_set = set(expired)
+        overflow = max(0, len(self._entries) - len(expired) - self.max_entries)
+        lru = [i for i in self._entries if i not in expired_set][:overflow]
+        self._delete(expired + lru)
+
+    # --- Public API ---
+    def embed(self, question):
+        """Embeds a question with the shared embedding model."""
+        embedding = embed_query(question)
+        return np.asarray(embedding, dtype=np.float32)
+
+    def recipe(self, prompt_type):
+        """Fingerprint of the model and prompt template currently answering prompt_type."""
+        return recipe_fingerprint(prompt_type)
+
+    def lookup(self, collection_name, prompt_type, question):
+        """
+        Returns (entry, query_embedding). `entry` is the cached answer dict or None on a miss;
+        pass the embedding back to store() so the question is not embedded twice.
+        """
+        prompt_type = prompt_type or DEFAULT_PROMPT_TYPE
+        recipe = self.recipe(prompt_type)
+        query_embedding = self.embed(question)
+        with self._lock:
+            self._connect()
+            self._refresh(collection_name)
+            now = time.time()
+            best_id, best_score = None, -1.0
+            for entry_id, entry in self._entries.items():
+                if (entry["collection_name"] != collection_name or entry["prompt_type"] != prompt_type
+                        or entry["recipe"] != recipe):
+                    continue
+                if now - entry["created_at"] > self.ttl_seconds:
+                    continue
+                # Embeddings are normalized, so the dot product is the cosine similarity
+                score = float(np.dot(entry["embedding"], query_embedding))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.similarity_threshold:
+                self.misses += 1
+                return None, query_embedding
+
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, best_id))
+            self._db.commit()
+            return dict(self._entries[best_id], similarity=round(best_score, 4)), query_embedding
+
+    def store(self, collection_name, prompt_type, question, query_embedding, answer, sources):
+        """Adds an answer to the cache and the on-disk store."""
+        prompt_type = prompt_type or DEFAULT_PROMPT_TYPE
+        recipe = self.recipe(prompt_type)
+        embedding = np.asarray(query_embedding, dtype=np.float32)
+        entry_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            self._entries[entry_id] = {
+                "collection_name": collection_name,
+                "prompt_type": prompt_type,
+                "recipe": recipe,
+                "question": question,
+                "embedding": embedding,
+                "answer": answer,
+                "sources": sources,
+                "created_at": now,
+            }
+            db.execute(
+                "INSERT INTO answers (id, collection_name, prompt_type, question, embedding, answer, sources, "
+                "created_at, last_used, recipe) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry_id, collection_name, prompt_type, question, embedding.tobytes(),
+                 answer, json.dumps(sources), now, now, recipe)
+            )
+            db.commit()
+            self._evict()
+
+    def invalidate_collection(self, collection_name):
+        """Drops every cached answer for a collection (e.g. after it is re-ingested)."""
+        with self._lock:
+            db = self._connect()
+            stale = [i for i, e in self._entries.items() if e["collection_name"] == collection_name]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            # Also drops rows other processes stored, and tells them to drop their copies
+            db.execute("DELETE FROM answers WHERE collection_name = ?", (collection_name,))
+            db.execute(
+                "INSERT INTO generations VALUES (?, 1) "
+                "ON CONFLICT(collection_name) DO UPDATE SET generation = generation + 1", (collection_name,)
+            )
+            self._generations[collection_name] = db.execute(
+                "SELECT generation FROM generations WHERE collection_name = ?", (collection_name,)
+            ).fetchone()[0]
+            db.commit()
+        if stale:
+            log.info("Invalidated %d cached answers for '%s'.", len(stale), collection_name)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# The process-wide answer cache
+answer_cache = SemanticAnswerCache(
+    path=config.ANSWER_CACHE_PATH,
+    similarity_threshold=config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS
+)
@@ -1,15 +1,29 @@
 # backend/app.py
 
-from flask import Flask, request, jsonify
+import time
+_import_started = time.perf_counter()  # For the import timing recorded at the end of this module
+
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
+import sys
+import json
+import uuid
 
 # Import our new modules
+# Only light modules are imported at load time, so a new worker opens its port quickly.
+# The pipeline (langchain, Chroma, numpy, models) is imported inside the handlers and
+# warmed up in the background after start (see startup.py).
 import config
-from document_processor import load_and_embed_pdf, generate_collection_name
-from retriever_factory import get_retriever
-from chain_handler import get_rag_chain, get_direct_llm_chain
-from validator_pdf import validate_court_case_pdf,extract_text_for_validation
+import startup
+from chroma_client import UnknownCollectionError
+from model_registry import model_registry
+from rerank_engine import rerank_engine
+from inference_scheduler import embedding_batcher
+from telemetry import metrics, trace, set_attribute, get_logger, EVENTS
+
+log = get_logger(__name__)
+
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app) # Enable Cross-Origin Resource Sharing
@@ -21,8 +35,34 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+def _loaded(name):
+    """An already imported module (KeyError otherwise): a /metrics scrape must not import the pipeline."""
+    return sys.modules[name]
+
+# State of the shared caches and models, read when /metrics is scraped
+metrics.gauge_callback("legalai_answer_cache_entries", "Entries in the semantic answer cache.",
+                       lambda: _loaded("answer_cache").answer_cache.stats()["entries"])
+metrics.gauge_callback("legalai_answer_cache_lookups", "Answer cache lookups by result since start.",
+                       lambda: {"hit": _loaded("answer_cache").answer_cache.stats()["hits"],
+                                "miss": _loaded("answer_cache").answer_cache.stats()["misses"]}, labelname="result")
+metrics.gauge_callback("legalai_query_variant_cache_lookups", "Query rewrite cache lookups by result since start.",
+                       lambda: {"hit": _loaded("retriever_factory").query_variant_cache.stats()["hits"],
+                                "miss": _loaded("retriever_factory").query_variant_cache.stats()["misses"]}, labelname="result")
+metrics.gauge_callback("legalai_rerank_score_cache_entries", "Cached (query, chunk) rerank scores.",
+                       lambda: rerank_engine.stats()["cache_entries"])
+metrics.gauge_callback("legalai_model_loaded", "1 if the model is loaded in this process.",
+                       lambda: {name: int(m["loaded"]) for name, m in model_registry.metrics()["models"].items()}, labelname="model")
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
+    """
+    Saves the PDF and queues it for background ingestion. Returns 202 with a
+    job_id to poll at /api/upload/status/<job_id>, or 200 straight away when
+    the same content is already indexed.
+    """
+    from document_processor import generate_collection_name, is_collection_indexed
+    from ingestion_jobs import ingestion_queue, QueueFullError
+
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
     
@@ -31,39 +71,106 @@ def upload_file():
     if file.filename == '' or not file.filename.endswith('.pdf'):
         return jsonify({"error": "Invalid or no selected file"}), 400
         
+    filepath = None
     try:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
+        # Every upload gets its own file: it is ingested later by a background job, so two
+        # different PDFs with the same client filename must not overwrite each other
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}.pdf")
         file.save(filepath)
-        validation_result = validate_court_case_pdf(filepath)
-        if not validation_result["is_valid"]:
-            print(f"Validation FAILED for {file.filename}. Confidence: {validation_result['confidence']}, Hits: {validation_result['keywords_matched']}")
+
+        # The collection name is derived from the file contents; if this exact
+        # document was ingested before, there is nothing left to parse or embed.
+        collection_name = generate_collection_name(filepath)
+        job = ingestion_queue.active_job_for(collection_name)
+        if job is None and is_collection_indexed(collection_name):
             os.remove(filepath)
+            EVENTS.inc(event="upload_already_indexed")
             return jsonify({
-                    "error": "File does not appear to be a valid legal document. Please upload a court case, judgment, or similar file.",
-                    "details": {
-                        "confidence": validation_result['confidence'],
-                        "keywords_matched": validation_result['keywords_matched']
-                    }
-                })
-        print(f"Validation PASSED for {file.filename}. Confidence: {validation_result['confidence']}, Hits: {validation_result['keywords_matched']}")
-        
-        # Generate a unique collection name for this PDF
-        collection_name = generate_collection_name(filepath)
-        
-        # Process and embed the PDF
-        load_and_embed_pdf(filepath, collection_name)
-        
-        # Return the unique collection_name to the frontend
-        # The frontend will need to store this to ask questions about this specific PDF
+                "message": f"File '{file.filename}' processed successfully.",
+                "collection_name": collection_name,
+                "status": "done",
+                "already_indexed": True
+            }), 200
+
+        if job is None:
+            # The queue owns the file from here on
+            job = ingestion_queue.submit(filepath, file.filename, collection_name)
+            EVENTS.inc(event="upload_queued")
+        else:
+            # The running job reads its own copy of the same content
+            os.remove(filepath)
+            EVENTS.inc(event="upload_joined_active_job")
+
+        # The frontend stores the collection_name to ask questions about this PDF
+        # once the job reports "done".
         return jsonify({
-            "message": f"File '{file.filename}' processed successfully.",
-            "collection_name": collection_name
-        }), 200
+            "message": f"File '{file.filename}' queued for processing.",
+            "job_id": job["job_id"],
+            "collection_name": collection_name,
+            "status": job["status"],
+            "status_url": f"/api/upload/status/{job['job_id']}"
+        }), 202
+    except QueueFullError as e:
+        os.remove(filepath)
+        EVENTS.inc(event="upload_rejected_queue_full")
+        return jsonify({"error": f"Too many uploads in progress, please retry shortly. ({str(e)})"}), 429
     except Exception as e:
+        log.exception("Upload of '%s' failed.", file.filename)
+        # Nothing will ingest the saved copy
+        if filepath is not None and os.path.exists(filepath):
+            os.remove(filepath)
         return jsonify({"error": f"Failed to process file: {str(e)}"}), 500
 
+@app.route('/api/upload/status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    """Reports the stage, chunk progress and error (if any) of an ingestion job."""
+    from ingestion_jobs import ingestion_queue
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+    return jsonify(job)
+
+def serialize_sources(docs):
+    """Converts retrieved documents into the JSON 'sources' list returned to the frontend."""
+    return [
+        {"content": doc.page_content, "page": doc.metadata.get('page', 'N/A')} 
+        for doc in docs
+    ]
+
+def parse_num_variants(value):
+    """
+    Validates the optional 'num_variants' of an ask request. None keeps the configured
+    default; integers are clamped to 0..config.MULTI_QUERY_VARIANTS. Raises ValueError otherwise.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("'num_variants' must be an integer")
+    try:
+        num_variants = int(value)
+    except ValueError:
+        raise ValueError("'num_variants' must be an integer") from None
+    return max(0, min(num_variants, config.MULTI_QUERY_VARIANTS))
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    """Wraps an SSE generator in a non-buffered streaming response."""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/ask_rag', methods=['POST'])
 def ask_rag():
+    from answer_cache import answer_cache
+    from chain_handler import get_rag_chain
+    from document_artifacts import get_precomputed
+    from retriever_factory import get_retriever
+
     data = request.get_json()
     query = data.get('question')
     collection_name = data.get('collection_name')
@@ -71,37 +178,260 @@ def ask_rag():
 
     if not query or not collection_name:
         return jsonify({"error": "Missing 'question' or 'collection_name'"}), 400
-    
     try:
-        retriever = get_retriever(collection_name)
-        rag_chain = get_rag_chain(retriever)
+        num_variants = parse_num_variants(data.get('num_variants'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    with trace("ask_rag", collection_name=collection_name, prompt_type=prompt_type or "default_fallback"):
+        try:
+            # Whole-document prompt types are served from the precomputed artifact when it is current
+            artifact = get_precomputed(collection_name, prompt_type)
+            if artifact:
+                set_attribute("outcome", "precomputed")
+                return jsonify({
+                    "answer": artifact["answer"],
+                    "sources": artifact["sources"],
+                    "prompt_type_used": prompt_type,
+                    "precomputed": True
+                })
 
-        input_payload = {"question": query, "prompt_type": prompt_type}
-        answer = rag_chain.invoke(input_payload)
-        
-        # --- CORRECTED WAY TO GET SOURCES ---
-        # We re-invoke the retriever to get the final list of documents
-        # that were actually used to generate the answer.
-        retrieved_docs = retriever.invoke(query)
-        # ------------------------------------
+            query_embedding = None
+            if config.ANSWER_CACHE_ENABLED:
+                cached, query_embedding = answer_cache.lookup(collection_name, prompt_type, query)
+                if cached:
+                    set_attribute("outcome", "cache_hit")
+                    return jsonify({
+                        "answer": cached["answer"],
+                        "sources": cached["sources"],
+                        "prompt_type_used": prompt_type if prompt_type else "default_fallback",
+                        "cached": True
+                    })
+
+            retriever = get_retriever(collection_name, num_variants=num_variants)
+            rag_chain = get_rag_chain(retriever, return_sources=True)
+
+            input_payload = {"question": query, "prompt_type": prompt_type}
+            # A single retrieval pass: the chain returns the answer together with
+            # the documents that were used to generate it.
+            result = rag_chain.invoke(input_payload)
+            answer = result["answer"]
         
-        sources = [
-            {"content": doc.page_content, "page": doc.metadata.get('page', 'N/A')} 
-            for doc in retrieved_docs
-        ]
-
-        response_data = {
-            "answer": answer, 
-            "sources": sources,
-            "prompt_type_used": prompt_type if prompt_type else "default_fallback"
-        }
-        return jsonify(response_data)
+            sources = serialize_sources(result["docs"])
+
+            if config.ANSWER_CACHE_ENABLED:
+                answer_cache.store(collection_name, prompt_type, query, query_embedding, answer, sources)
+
+            response_data = {
+                "answer": answer, 
+                "sources": sources,
+                "prompt_type_used": prompt_type if prompt_type else "default_fallback"
+            }
+            return jsonify(response_data)
 
+        except UnknownCollectionError as e:
+            set_attribute("outcome", "unknown_collection")
+            return jsonify({"error": str(e)}), 404
+        except Exception as e:
+            log.exception("RAG answer for collection '%s' failed.", collection_name)
+            set_attribute("outcome", "error")
+            return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+
+@app.route('/api/ask_rag_stream', methods=['POST'])
+def ask_rag_stream():
+    """
+    Streams the RAG answer as Server-Sent Events: a 'sources' event once the
+    rerank is done, 'token' events while the LLM generates, then 'done'.
+    """
+    from answer_cache import answer_cache
+    from chain_handler import stream_rag_answer
+    from document_artifacts import get_precomputed
+    from retriever_factory import get_retriever
+
+    data = request.get_json()
+    query = data.get('question')
+    collection_name = data.get('collection_name')
+    prompt_type = data.get('prompt_type', None)
+
+    if not query or not collection_name:
+        return jsonify({"error": "Missing 'question' or 'collection_name'"}), 400
+    try:
+        num_variants = parse_num_variants(data.get('num_variants'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def events():
+        with trace("ask_rag_stream", collection_name=collection_name, prompt_type=prompt_type or "default_fallback"):
+            try:
+                prompt_type_used = prompt_type if prompt_type else "default_fallback"
+                artifact = get_precomputed(collection_name, prompt_type)
+                if artifact:
+                    set_attribute("outcome", "precomputed")
+                    yield sse_event("sources", {"sources": artifact["sources"], "prompt_type_used": prompt_type_used, "precomputed": True})
+                    yield sse_event("token", {"text": artifact["answer"]})
+                    yield sse_event("done", {})
+                    return
+
+                query_embedding = None
+                if config.ANSWER_CACHE_ENABLED:
+                    cached, query_embedding = answer_cache.lookup(collection_name, prompt_type, query)
+                    if cached:
+                        set_attribute("outcome", "cache_hit")
+                        yield sse_event("sources", {"sources": cached["sources"], "prompt_type_used": prompt_type_used, "cached": True})
+                        yield sse_event("token", {"text": cached["answer"]})
+                        yield sse_event("done", {})
+                        return
+
+                retriever = get_retriever(collection_name, num_variants=num_variants)
+                sources, tokens = [], []
+                for kind, payload in stream_rag_answer(retriever, query, prompt_type):
+                    if kind == "sources":
+                        sources = serialize_sources(payload)
+                        yield sse_event("sources", {"sources": sources, "prompt_type_used": prompt_type_used})
+                    else:
+                        tokens.append(payload)
+                        yield sse_event("token", {"text": payload})
+
+                if config.ANSWER_CACHE_ENABLED:
+                    answer_cache.store(collection_name, prompt_type, query, query_embedding, "".join(tokens), sources)
+                yield sse_event("done", {})
+            except UnknownCollectionError as e:
+                set_attribute("outcome", "unknown_collection")
+                yield sse_event("error", {"error": str(e)})
+            except Exception as e:
+                log.exception("Streamed RAG answer for collection '%s' failed.", collection_name)
+                set_attribute("outcome", "error")
+                yield sse_event("error", {"error": f"An error occurred: {str(e)}"})
+
+    return sse_response(events())
+
+@app.route('/api/ask_direct_stream', methods=['POST'])
+def ask_direct_stream():
+    """Streams a direct (no retrieval) LLM answer as Server-Sent Events."""
+    from chain_handler import stream_direct_answer
+
+    data = request.get_json()
+    query = data.get('question')
+
+    if not query:
+        return jsonify({"error": "Missing 'question'"}), 400
+
+    def events():
+        with trace("ask_direct_stream"):
+            try:
+                for text in stream_direct_answer(query):
+                    yield sse_event("token", {"text": text})
+                yield sse_event("done", {})
+            except Exception as e:
+                log.exception("Streamed direct answer failed.")
+                set_attribute("outcome", "error")
+                yield sse_event("error", {"error": f"An error occurred: {str(e)}"})
+
+    return sse_response(events())
+
+
+@app.route('/api/corpus/search', methods=['POST'])
+def corpus_search():
+    """Searches passages across every ingested judgment, with optional court/year/case-number filters."""
+    import corpus
+
+    data = request.get_json()
+    query = data.get('question')
+    if not query:
+        return jsonify({"error": "Missing 'question'"}), 400
+
+    try:
+        results = corpus.search(query, k=int(data.get('k', 10)), filters=data.get('filters'))
+        return jsonify({"results": results})
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception("Corpus search failed.")
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+@app.route('/api/corpus/similar/<collection_name>', methods=['GET'])
+def corpus_similar(collection_name):
+    """Finds the judgments most similar to an ingested document (by its collection_name)."""
+    import corpus
+
+    filters = {key: request.args[key] for key in ("court", "year", "year_from", "year_to") if key in request.args}
+    try:
+        similar = corpus.find_similar_documents(collection_name, k=int(request.args.get('k', 5)), filters=filters)
+        return jsonify({"collection_name": collection_name, "similar": similar})
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        log.exception("Similar-document search for '%s' failed.", collection_name)
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+
+@app.route('/api/artifacts/<collection_name>', methods=['GET'])
+def document_artifacts_status(collection_name):
+    """Which whole-document answers (summary, entities, risks) are ready, stale or missing."""
+    from document_artifacts import artifact_status
+    return jsonify(artifact_status(collection_name))
+
+@app.route('/api/artifacts/<collection_name>/rebuild', methods=['POST'])
+def rebuild_document_artifacts(collection_name):
+    """Rebuilds the document's precomputed answers in the background."""
+    from document_artifacts import artifact_builder
+    from document_processor import is_collection_indexed
+
+    if not is_collection_indexed(collection_name):
+        return jsonify({"error": f"Collection '{collection_name}' is not indexed."}), 404
+    started = artifact_builder.schedule(collection_name, force=True)
+    return jsonify({"collection_name": collection_name, "status": "building" if started else "queued"}), 202
+
+
+@app.route('/api/metrics/models', methods=['GET'])
+def model_metrics():
+    """Load time, memory and reuse counters for the shared models."""
+    return jsonify(model_registry.metrics())
+
+@app.route('/api/metrics/answer_cache', methods=['GET'])
+def answer_cache_metrics():
+    """Entry count and hit/miss counters of the semantic answer cache."""
+    from answer_cache import answer_cache
+    return jsonify(answer_cache.stats())
+
+@app.route('/api/metrics/rerank', methods=['GET'])
+def rerank_metrics():
+    """Per-stage reranking timings and score-cache counters, for tuning RERANK_* settings."""
+    return jsonify(rerank_engine.stats())
+
+@app.route('/api/metrics/inference', methods=['GET'])
+def inference_metrics():
+    """Micro-batching of query embeddings and rerank pairs, the chunk embedding / query rewrite caches and LLM slots."""
+    from embedding_cache import embedding_cache
+    from llm_gateway import llm_gateway
+    from retriever_factory import query_variant_cache
+
+    return jsonify({"embed": embedding_batcher.stats(), "rerank": rerank_engine.stats()["micro_batching"],
+                    "embedding_cache": embedding_cache.stats(), "query_variants": query_variant_cache.stats(),
+                    "llm_gateway": llm_gateway.stats()})
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage timings, retrieval/token histograms and cache gauges in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving (models may still be warming up)."""
+    return jsonify({"status": "ok", "uptime_s": startup.status()["uptime_s"]})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 503 until the pipeline is imported, Chroma is open and the models are loaded."""
+    status = startup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+startup.record_timing("import:app", time.perf_counter() - _import_started)
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    # Development server only; production runs asgi.py (see README)
+    # Models load in the background while the server already answers (see /readyz)
+    startup.start_warm_up()
+    app.run(debug=True, port=5001)
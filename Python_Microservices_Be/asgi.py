@@ -0,0 +1,332 @@
+# backend/asgi.py
+# Production entry point. The question endpoints are native async handlers:
+# embedding, vector search and reranking run on a dedicated CPU executor while
+# Ollama calls are awaited without holding a thread. Every other route is served
+# by the Flask app (app.py) mounted underneath. The pipeline modules are imported
+# on first use or by the background warm-up (see startup.py), so the port opens
+# before the models are loaded; /readyz tells when they are.
+#
+# Run with:  python asgi.py
+#       or:  uvicorn asgi:app --host 0.0.0.0 --port 5001 --workers 2
+
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import config
+import startup
+from chroma_client import UnknownCollectionError
+from app import app as flask_app, parse_num_variants, serialize_sources, sse_event
+from telemetry import trace, span, set_attribute, get_logger
+
+log = get_logger(__name__)
+
+# CPU-bound model work (embedding, Chroma search, reranking) runs here, never on the event loop
+cpu_executor = ThreadPoolExecutor(max_workers=config.CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu")
+
+
+class Overloaded(Exception):
+    """Raised when the request queue is full."""
+
+
+class ConcurrencyLimiter:
+    """
+    Lets at most `max_active` requests run at once and `max_waiting` more wait
+    for a slot; further requests are rejected (HTTP 429) instead of piling up.
+    """
+
+    def __init__(self, max_active, max_waiting):
+        self._semaphore = asyncio.Semaphore(max_active)
+        self._max_waiting = max_waiting
+        self._waiting = 0
+
+    async def acquire(self):
+        if self._semaphore.locked() and self._waiting >= self._max_waiting:
+            raise Overloaded()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+
+ask_limiter = ConcurrencyLimiter(config.MAX_ACTIVE_ASKS, config.MAX_QUEUED_ASKS)
+
+
+class PermitStreamingResponse(StreamingResponse):
+    """
+    A streaming answer holding an ask_limiter permit. The permit is returned when the
+    response ends, however it ends: finished, failed, or the client gone before the
+    first chunk (then the body generator never runs, so it cannot release the permit).
+    """
+
+    def __init__(self, limiter, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+
+def sse_stream(events):
+    """An SSE response for an ask that acquired an ask_limiter permit."""
+    return PermitStreamingResponse(ask_limiter, events, media_type="text/event-stream",
+                                   headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def overloaded_response():
+    return JSONResponse(
+        {"error": "The server is busy, please retry shortly."},
+        status_code=429,
+        headers={"Retry-After": "1"}
+    )
+
+
+async def run_cpu(fn, *args, **kwargs):
+    # The copied context carries the request's trace into the executor thread
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, partial(context.run, fn, *args, **kwargs))
+
+
+# Modules the question handlers use; imported lazily (they pull in langchain, Chroma and numpy)
+ASK_MODULES = ("answer_cache", "chain_handler", "document_artifacts", "llm_interface", "retriever_factory")
+_ask_modules_imported = False
+
+async def import_ask_modules():
+    """Imports the pipeline on the CPU executor the first time, so a cold import never blocks the event loop."""
+    global _ask_modules_imported
+    if not _ask_modules_imported:
+        await run_cpu(lambda: [startup.timed_import(name) for name in ASK_MODULES])
+        _ask_modules_imported = True
+
+
+async def retrieve(collection_name, query, num_variants):
+    """Async retrieval: query rewriting (when needed) is awaited, search and rerank run on the CPU executor."""
+    from retriever_factory import get_retriever
+    retriever = await run_cpu(get_retriever, collection_name, num_variants=num_variants)
+    return await retriever.aretrieve(query, run_cpu)
+
+
+async def read_ask_payload(request):
+    """(question, collection_name, prompt_type, num_variants); raises ValueError for an invalid payload."""
+    data = await request.json()
+    return (
+        data.get('question'),
+        data.get('collection_name'),
+        data.get('prompt_type', None),
+        parse_num_variants(data.get('num_variants', None)),
+    )
+
+
+async def ask_rag(request):
+    try:
+        query, collection_name, prompt_type, num_variants = await read_ask_payload(request)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if not query or not collection_name:
+        return JSONResponse({"error": "Missing 'question' or 'collection_name'"}, status_code=400)
+
+    try:
+        await ask_limiter.acquire()
+    except Overloaded:
+        return overloaded_response()
+
+    try:
+        await import_ask_modules()
+        with trace("ask_rag", collection_name=collection_name, prompt_type=prompt_type or "default_fallback"):
+            return await answer_rag(query, collection_name, prompt_type, num_variants)
+    except UnknownCollectionError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+    except Exception as e:
+        log.exception("RAG answer for collection '%s' failed.", collection_name)
+        return JSONResponse({"error": f"An error occurred: {str(e)}"}, status_code=500)
+    finally:
+        ask_limiter.release()
+
+
+async def answer_rag(query, collection_name, prompt_type, num_variants):
+    from answer_cache import answer_cache
+    from chain_handler import build_answer_messages, chunk_text, prepare_context, record_generation
+    from document_artifacts import get_precomputed
+    from llm_interface import get_llm
+
+    prompt_type_used = prompt_type if prompt_type else "default_fallback"
+    artifact = await run_cpu(get_precomputed, collection_name, prompt_type)
+    if artifact:
+        set_attribute("outcome", "precomputed")
+        return JSONResponse({"answer": artifact["answer"], "sources": artifact["sources"],
+                             "prompt_type_used": prompt_type_used, "precomputed": True})
+
+    query_embedding = None
+    if config.ANSWER_CACHE_ENABLED:
+        cached, query_embedding = await run_cpu(answer_cache.lookup, collection_name, prompt_type, query)
+        if cached:
+            set_attribute("outcome", "cache_hit")
+            return JSONResponse({
+                "answer": cached["answer"],
+                "sources": cached["sources"],
+                "prompt_type_used": prompt_type_used,
+                "cached": True
+            })
+
+    docs = prepare_context(await retrieve(collection_name, query, num_variants), prompt_type)
+    messages = build_answer_messages(query, prompt_type, docs)
+    started = time.perf_counter()
+    with span("llm"):
+        response = await get_llm().ainvoke(messages)
+    answer = chunk_text(response)
+    record_generation(prompt_type, messages, answer, time.perf_counter() - started, getattr(response, "usage_metadata", None))
+    sources = serialize_sources(docs)
+
+    if config.ANSWER_CACHE_ENABLED:
+        await run_cpu(answer_cache.store, collection_name, prompt_type, query, query_embedding, answer, sources)
+
+    return JSONResponse({"answer": answer, "sources": sources, "prompt_type_used": prompt_type_used})
+
+
+async def ask_rag_stream(request):
+    try:
+        query, collection_name, prompt_type, num_variants = await read_ask_payload(request)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if not query or not collection_name:
+        return JSONResponse({"error": "Missing 'question' or 'collection_name'"}, status_code=400)
+
+    try:
+        await ask_limiter.acquire()
+    except Overloaded:
+        return overloaded_response()
+
+    async def events():
+        try:
+            await import_ask_modules()
+            with trace("ask_rag_stream", collection_name=collection_name, prompt_type=prompt_type or "default_fallback"):
+                async for event in stream_rag_events(query, collection_name, prompt_type, num_variants):
+                    yield event
+        except UnknownCollectionError as e:
+            yield sse_event("error", {"error": str(e)})
+        except Exception as e:
+            log.exception("Streamed RAG answer for collection '%s' failed.", collection_name)
+            yield sse_event("error", {"error": f"An error occurred: {str(e)}"})
+
+    return sse_stream(events())
+
+
+async def stream_rag_events(query, collection_name, prompt_type, num_variants):
+    from answer_cache import answer_cache
+    from chain_handler import build_answer_messages, chunk_text, prepare_context, record_generation
+    from document_artifacts import get_precomputed
+    from llm_interface import get_llm
+
+    prompt_type_used = prompt_type if prompt_type else "default_fallback"
+    artifact = await run_cpu(get_precomputed, collection_name, prompt_type)
+    if artifact:
+        set_attribute("outcome", "precomputed")
+        yield sse_event("sources", {"sources": artifact["sources"], "prompt_type_used": prompt_type_used, "precomputed": True})
+        yield sse_event("token", {"text": artifact["answer"]})
+        yield sse_event("done", {})
+        return
+
+    query_embedding = None
+    if config.ANSWER_CACHE_ENABLED:
+        cached, query_embedding = await run_cpu(answer_cache.lookup, collection_name, prompt_type, query)
+        if cached:
+            set_attribute("outcome", "cache_hit")
+            yield sse_event("sources", {"sources": cached["sources"], "prompt_type_used": prompt_type_used, "cached": True})
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("done", {})
+            return
+
+    docs = prepare_context(await retrieve(collection_name, query, num_variants), prompt_type)
+    sources = serialize_sources(docs)
+    yield sse_event("sources", {"sources": sources, "prompt_type_used": prompt_type_used})
+
+    messages = build_answer_messages(query, prompt_type, docs)
+    started = time.perf_counter()
+    tokens, usage = [], None
+    with span("llm"):
+        async for chunk in get_llm().astream(messages):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            text = chunk_text(chunk)
+            if text:
+                tokens.append(text)
+                yield sse_event("token", {"text": text})
+    answer = "".join(tokens)
+    record_generation(prompt_type, messages, answer, time.perf_counter() - started, usage)
+
+    if config.ANSWER_CACHE_ENABLED:
+        await run_cpu(answer_cache.store, collection_name, prompt_type, query, query_embedding, answer, sources)
+    yield sse_event("done", {})
+
+
+async def ask_direct_stream(request):
+    data = await request.json()
+    query = data.get('question')
+    if not query:
+        return JSONResponse({"error": "Missing 'question'"}, status_code=400)
+
+    try:
+        await ask_limiter.acquire()
+    except Overloaded:
+        return overloaded_response()
+
+    async def events():
+        try:
+            await import_ask_modules()
+            from chain_handler import get_direct_llm_chain
+            with trace("ask_direct_stream"):
+                async for text in get_direct_llm_chain().astream(query):
+                    if text:
+                        yield sse_event("token", {"text": text})
+            yield sse_event("done", {})
+        except Exception as e:
+            log.exception("Streamed direct answer failed.")
+            yield sse_event("error", {"error": f"An error occurred: {str(e)}"})
+
+    return sse_stream(events())
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    # Each worker process loads its models once; by default in the background, so the
+    # port opens right away and /readyz reports when the worker can answer quickly
+    if config.WARMUP_IN_BACKGROUND:
+        startup.start_warm_up()
+    else:
+        await run_cpu(startup.warm_up)
+    yield
+    cpu_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/ask_rag', ask_rag, methods=['POST']),
+        Route('/api/ask_rag_stream', ask_rag_stream, methods=['POST']),
+        Route('/api/ask_direct_stream', ask_direct_stream, methods=['POST']),
+        # Uploads, job status, corpus search and metrics stay on the Flask app
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run("asgi:app", host=config.SERVER_HOST, port=config.SERVER_PORT, workers=config.SERVER_WORKERS)
@@ -0,0 +1,3 @@
+# backend/benchmarks/__init__.py
+# Latency benchmarks for the upload and question pipelines. Run from the backend directory:
+#   python -m benchmarks.run_benchmarks --help
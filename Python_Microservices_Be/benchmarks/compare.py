@@ -0,0 +1,46 @@
+# backend/benchmarks/compare.py
+# Prints per-stage and per-concurrency-level deltas between two benchmark result files.
+#
+#   python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+import argparse
+import json
+
+
+def _delta(old, new):
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(old, new, metrics=("p50_ms", "p95_ms", "p99_ms")):
+    rows = []
+    for stage in sorted(set(old["stages"]) | set(new["stages"])):
+        a, b = old["stages"].get(stage), new["stages"].get(stage)
+        if a is None or b is None:
+            rows.append((stage, "only in " + ("new" if a is None else "old")))
+            continue
+        rows.append((stage, "  ".join(f"{m} {a[m]} -> {b[m]} ({_delta(a[m], b[m])})" for m in metrics)))
+
+    old_curve = {point["concurrency"]: point for point in old.get("concurrency", [])}
+    for point in new.get("concurrency", []):
+        before = old_curve.get(point["concurrency"])
+        if before:
+            rows.append((f"ask_rag x{point['concurrency']}",
+                         f"p95_ms {before['p95_ms']} -> {point['p95_ms']} ({_delta(before['p95_ms'], point['p95_ms'])})  "
+                         f"req/s {before['throughput_per_s']} -> {point['throughput_per_s']} "
+                         f"({_delta(before['throughput_per_s'], point['throughput_per_s'])})"))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+    with open(args.old) as f_old, open(args.new) as f_new:
+        old, new = json.load(f_old), json.load(f_new)
+    print(f"old: {old['meta'].get('git_commit')} {old['meta']['timestamp']}")
+    print(f"new: {new['meta'].get('git_commit')} {new['meta']['timestamp']}\n")
+    for name, line in compare(old, new):
+        print(f"{name:<22}{line}")
@@ -0,0 +1,152 @@
+# backend/benchmarks/fake_ollama.py
+# A stand-in for the Ollama HTTP API (/api/chat, /api/generate) with deterministic
+# output and configurable latency, so benchmarks measure our pipeline and not the model.
+#
+#   python -m benchmarks.fake_ollama --port 11435 --token-latency-ms 20
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORDS = ("the court held that the appellant petitioner respondent section article evidence "
+          "conviction acquittal bail appeal order judgment learned counsel submitted record").split()
+
+
+def _seed(text):
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def fake_completion(prompt, num_tokens):
+    """Deterministic tokens for a prompt. Query-rewriting prompts get one variant per line."""
+    seed = _seed(prompt)
+    if "different versions of the given user question" in prompt:
+        lines = []
+        for v in range(5):
+            words = [_WORDS[(seed + v * 7 + i * 3) % len(_WORDS)] for i in range(8)]
+            lines.append(f"{v + 1}. What did the court say about " + " ".join(words) + "?")
+        return [line + "\n" for line in lines]
+    return [_WORDS[(seed + i * 5) % len(_WORDS)] + " " for i in range(num_tokens)]
+
+
+class FakeOllama:
+    """
+    Threaded fake Ollama server. Every response waits `first_token_ms` and then
+    `token_latency_ms` per token, streamed as Ollama's newline-delimited JSON.
+    Setting `fail_next` makes that many following requests answer 503 (to exercise retries).
+    """
+
+    def __init__(self, host="127.0.0.1", port=11435, token_latency_ms=20.0, first_token_ms=100.0, num_tokens=64):
+        self.token_latency_s = token_latency_ms / 1000.0
+        self.first_token_s = first_token_ms / 1000.0
+        self.num_tokens = num_tokens
+        self.requests = 0
+        self.fail_next = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path in ("/", "/api/version"):
+                    return self._send_json({"version": "0.0.0-fake"})
+                if self.path == "/api/tags":
+                    return self._send_json({"models": []})
+                self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+                    fail = fake.fail_next > 0
+                    fake.fail_next -= fail
+                if fail:
+                    return self.send_error(503)
+
+                if self.path == "/api/chat":
+                    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+                    wrap = lambda text: {"message": {"role": "assistant", "content": text}}
+                elif self.path == "/api/generate":
+                    prompt = body.get("prompt", "")
+                    wrap = lambda text: {"response": text}
+                else:
+                    return self.send_error(404)
+
+                tokens = fake_completion(prompt, fake.num_tokens)
+                base = {"model": body.get("model", "fake"), "created_at": ""}
+                time.sleep(fake.first_token_s)
+
+                if body.get("stream", True) is False:
+                    time.sleep(fake.token_latency_s * len(tokens))
+                    return self._send_json({**base, **wrap("".join(tokens)), "done": True, "done_reason": "stop",
+                                            "prompt_eval_count": len(prompt.split()), "eval_count": len(tokens)})
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in tokens:
+                    time.sleep(fake.token_latency_s)
+                    self._write_chunk({**base, **wrap(token), "done": False})
+                self._write_chunk({**base, **wrap(""), "done": True, "done_reason": "stop",
+                                   "prompt_eval_count": len(prompt.split()), "eval_count": len(tokens)})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, obj):
+                obj["created_at"] = datetime.now(timezone.utc).isoformat()
+                data = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, obj):
+                data = json.dumps(obj).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake Ollama server with deterministic latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-latency-ms", type=float, default=20.0)
+    parser.add_argument("--first-token-ms", type=float, default=100.0)
+    parser.add_argument("--tokens", type=int, default=64, help="Tokens per answer")
+    args = parser.parse_args()
+    server = FakeOllama(args.host, args.port, args.token_latency_ms, args.first_token_ms, args.tokens)
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,399 @@
+# backend/benchmarks/run_benchmarks.py
+# End-to-end latency benchmark. Generates synthetic judgments, starts a fake Ollama,
+# then measures every pipeline stage in-process (validate, parse, split, embed,
+# persist, multi_query, vector_search, rerank, llm), the /api/upload and
+# /api/ask_rag endpoints, and /api/ask_rag latency/throughput at several
+# concurrency levels. Results are written as JSON; compare two runs with
+# `python -m benchmarks.compare old.json new.json`.
+#
+#   cd Python_Microservices_Be
+#   python -m benchmarks.run_benchmarks --pages 5 50 --concurrency 1 4 8
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import chain
+
+import config
+from benchmarks.fake_ollama import FakeOllama
+from benchmarks.synthetic_judgments import generate, STATUTES
+
+QUESTION_TEMPLATES = [
+    "What was the court's finding under {statute}?",
+    "Summarize the arguments of learned counsel regarding {statute}.",
+    "Why was the appeal allowed in relation to {statute}?",
+    "Which evidence did the trial court rely on for {statute}?",
+]
+
+
+def questions(n):
+    """n distinct questions, so score and answer caches do not flatter the numbers."""
+    pool = [t.format(statute=s) for s in STATUTES for t in QUESTION_TEMPLATES]
+    return [pool[i % len(pool)] + ("" if i < len(pool) else f" (variant {i // len(pool)})") for i in range(n)]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples_ms, wall_s=None):
+    """p50/p95/p99/mean/max in ms; throughput is per second of wall time (default: sum of samples)."""
+    values = sorted(samples_ms)
+    wall_s = wall_s if wall_s is not None else sum(values) / 1000.0
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "max_ms": round(values[-1], 2) if values else 0.0,
+        "throughput_per_s": round(len(values) / wall_s, 3) if wall_s else 0.0,
+    }
+
+
+class StageRecorder:
+    """Collects duration samples per stage name."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, stage, ms):
+        self.samples.setdefault(stage, []).append(ms)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000)
+
+    def summary(self):
+        return {stage: summarize(samples) for stage, samples in self.samples.items()}
+
+
+# --- Clients: the Flask app in-process, or a running server over HTTP ---
+class InProcessClient:
+    def __init__(self, flask_app):
+        self.app = flask_app
+
+    def post_json(self, path, body):
+        response = self.app.test_client().post(path, json=body)
+        return response.status_code, response.get_json()
+
+    def get_json(self, path):
+        response = self.app.test_client().get(path)
+        return response.status_code, response.get_json()
+
+    def upload(self, pdf_path):
+        with open(pdf_path, "rb") as f:
+            response = self.app.test_client().post(
+                "/api/upload", data={"file": (f, os.path.basename(pdf_path))}, content_type="multipart/form-data"
+            )
+        return response.status_code, response.get_json()
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def post_json(self, path, body):
+        response = self.session.post(self.base_url + path, json=body, timeout=600)
+        return response.status_code, response.json()
+
+    def get_json(self, path):
+        response = self.session.get(self.base_url + path, timeout=60)
+        return response.status_code, response.json()
+
+    def upload(self, pdf_path):
+        with open(pdf_path, "rb") as f:
+            response = self.session.post(self.base_url + "/api/upload",
+                                         files={"file": (os.path.basename(pdf_path), f, "application/pdf")}, timeout=600)
+        return response.status_code, response.json()
+
+
+def configure(workdir, ollama_url, answer_cache):
+    """Points every store at a scratch directory and the LLM at the fake Ollama. Must run before backend imports."""
+    config.OLLAMA_BASE_URL = ollama_url
+    config.CHROMA_CLIENT_MODE = "persistent"
+    config.CHROMA_PERSIST_DIRECTORY = os.path.join(workdir, "chroma")
+    config.LEXICAL_INDEX_DIRECTORY = os.path.join(workdir, "lexical_index")
+    config.ANSWER_CACHE_PATH = os.path.join(workdir, "answer_cache.sqlite3")
+    config.INGEST_JOB_DIRECTORY = os.path.join(workdir, "ingest_jobs")
+    config.EMBEDDING_CACHE_DIRECTORY = os.path.join(workdir, "embedding_cache")
+    config.INDEXED_DOCUMENTS_DIRECTORY = os.path.join(workdir, "indexed_documents")
+    config.ARTIFACT_DIRECTORY = os.path.join(workdir, "document_artifacts")
+    config.BULK_MANIFEST_PATH = os.path.join(workdir, "bulk_ingest_manifest.jsonl")
+    config.ANSWER_CACHE_ENABLED = answer_cache
+
+
+def bench_ingestion_stages(recorder, pdfs):
+    """Runs the ingestion steps one at a time, into throwaway collections, so each can be timed."""
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from chroma_client import get_client
+    from model_registry import model_registry, EMBEDDER
+    from pdf_extraction import iter_pages
+    from validator_pdf import extract_and_validate
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=config.CHUNK_SIZE, chunk_overlap=config.CHUNK_OVERLAP)
+    embedder = model_registry.get(EMBEDDER)
+    for i, (path, pages) in enumerate(pdfs):
+        with recorder.time("validate"):
+            result, prefetched, page_count = extract_and_validate(path)
+        if not result["is_valid"]:
+            raise RuntimeError(f"Synthetic PDF '{path}' failed validation: {result}")
+        with recorder.time("parse"):
+            all_pages = list(chain(prefetched, iter_pages(path, start_page=len(prefetched), page_count=page_count)))
+        with recorder.time("split"):
+            chunks = splitter.split_documents([Document(page_content=text, metadata={"page": n}) for n, text in all_pages])
+
+        texts = [chunk.page_content for chunk in chunks]
+        batches = [texts[s:s + config.EMBED_BATCH_SIZE] for s in range(0, len(texts), config.EMBED_BATCH_SIZE)]
+        with recorder.time("embed"):
+            vectors = [embedder.embed_documents(batch) for batch in batches]
+
+        name = f"bench_stages_{i}"
+        collection = get_client().get_or_create_collection(name)
+        with recorder.time("persist"):
+            offset = 0
+            for batch, batch_vectors in zip(batches, vectors):
+                collection.upsert(ids=[f"{name}_{offset + j}" for j in range(len(batch))],
+                                  embeddings=batch_vectors, documents=batch)
+                offset += len(batch)
+        get_client().delete_collection(name)
+        print(f"  stages: {os.path.basename(path)} ({pages} pages, {len(texts)} chunks)")
+
+
+def bench_upload(recorder, client, pdfs, reset=True, poll_interval=0.05):
+    """Times /api/upload until its job reports done; returns the collection names."""
+    from document_processor import delete_collection, generate_collection_name
+
+    collections = []
+    for path, pages in pdfs:
+        if reset:
+            # Start from scratch so the upload really parses and embeds
+            delete_collection(generate_collection_name(path))
+        start = time.perf_counter()
+        status, body = client.upload(path)
+        recorder.record("upload_accept", (time.perf_counter() - start) * 1000)
+        if status not in (200, 202):
+            raise RuntimeError(f"Upload of '{path}' failed ({status}): {body}")
+        job = body
+        while job.get("status") not in ("done", "failed"):
+            time.sleep(poll_interval)
+            _, job = client.get_json(body["status_url"])
+        if job["status"] == "failed":
+            raise RuntimeError(f"Ingestion of '{path}' failed: {job.get('error')}")
+        recorder.record("upload_total", (time.perf_counter() - start) * 1000)
+        recorder.record(f"upload_total_{pages}p", (time.perf_counter() - start) * 1000)
+        collections.append(body["collection_name"])
+    return collections
+
+
+def bench_query_stages(recorder, collections, qs, num_variants):
+    from chain_handler import build_answer_messages, prepare_context
+    from llm_interface import get_llm
+    from retriever_factory import get_retriever
+
+    for i, question in enumerate(qs):
+        retriever = get_retriever(collections[i % len(collections)], num_variants=num_variants)
+        base = retriever.base_retriever
+        with recorder.time("multi_query"):
+            variants = base.generate_variants(question)
+        with recorder.time("vector_search"):
+            docs = base.search([question] + variants)
+        with recorder.time("rerank"):
+            top = retriever.rerank(question, docs)
+        with recorder.time("context_pack"):
+            top = prepare_context(top)
+        with recorder.time("llm"):
+            get_llm().invoke(build_answer_messages(question, None, top))
+
+
+def bench_llm_gateway(ollama, clients):
+    """
+    Gateway behaviour against the fake Ollama: `clients` identical concurrent calls
+    should cost one upstream generation, and a 503 before the first token is retried.
+    """
+    from langchain_core.messages import HumanMessage
+    from llm_interface import get_llm
+
+    messages = [HumanMessage(content="Summarise the holding of the court in this judgment.")]
+    before = ollama.requests
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda _: _timed_invoke(messages), range(clients)))
+        wall_s = time.perf_counter() - start
+    coalesced = {"clients": clients, "upstream_requests": ollama.requests - before, **summarize(latencies, wall_s)}
+
+    ollama.fail_next = 1
+    before = ollama.requests
+    answer = get_llm().invoke([HumanMessage(content="Which sections were cited?")]).content
+    retried = {"upstream_requests": ollama.requests - before, "answered": bool(answer)}
+    print(f"  {clients} identical calls -> {coalesced['upstream_requests']} upstream; "
+          f"503 then retry -> {retried['upstream_requests']} upstream, answered={retried['answered']}")
+    return {"coalescing": coalesced, "retry": retried}
+
+
+def _timed_invoke(messages):
+    from llm_interface import get_llm
+    start = time.perf_counter()
+    get_llm().invoke(messages)
+    return (time.perf_counter() - start) * 1000
+
+
+def ask(client, collection, question, num_variants):
+    start = time.perf_counter()
+    status, _ = client.post_json("/api/ask_rag", {"question": question, "collection_name": collection,
+                                                  "num_variants": num_variants})
+    return (time.perf_counter() - start) * 1000, status
+
+
+def bench_concurrency(client, collections, levels, requests_per_client, num_variants, question_offset):
+    """ask_rag latency and throughput with `level` clients asking at once."""
+    curve = []
+    for level in levels:
+        n = level * requests_per_client
+        qs = questions(question_offset + n)[question_offset:]
+        question_offset += n
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(lambda i: ask(client, collections[i % len(collections)], qs[i], num_variants), range(n)))
+            wall_s = time.perf_counter() - start
+        ok = [ms for ms, status in results if status == 200]
+        curve.append({"concurrency": level, "errors": n - len(ok), **summarize(ok, wall_s)})
+        print(f"  concurrency {level}: p50 {curve[-1]['p50_ms']} ms, {curve[-1]['throughput_per_s']} req/s")
+    return curve
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _config_snapshot():
+    return {k: v for k, v in vars(config).items()
+            if k.isupper() and isinstance(v, (str, int, float, bool, list, dict, type(None)))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload and ask latency per pipeline stage.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 50], help="Page counts of the synthetic PDFs")
+    parser.add_argument("--docs-per-size", type=int, default=1)
+    parser.add_argument("--questions", type=int, default=20, help="Questions timed stage by stage")
+    parser.add_argument("--num-variants", type=int, default=config.MULTI_QUERY_VARIANTS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    parser.add_argument("--token-latency-ms", type=float, default=20.0)
+    parser.add_argument("--first-token-ms", type=float, default=100.0)
+    parser.add_argument("--llm-tokens", type=int, default=64)
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--base-url", default=None,
+                        help="Benchmark a running server (e.g. http://localhost:5001) instead of the app in-process. "
+                             "It must itself point at the fake Ollama; only the endpoints are measured.")
+    parser.add_argument("--answer-cache", action="store_true", help="Leave the semantic answer cache on")
+    parser.add_argument("--coalesce-clients", type=int, default=8, help="Identical concurrent LLM calls sent to the gateway")
+    parser.add_argument("--skip-stages", action="store_true", help="Only benchmark the endpoints")
+    parser.add_argument("--workdir", default=None, help="Scratch directory (default: a new temp dir)")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="legalai_bench_")
+    ollama = FakeOllama(port=args.ollama_port, token_latency_ms=args.token_latency_ms,
+                        first_token_ms=args.first_token_ms, num_tokens=args.llm_tokens).start()
+    configure(workdir, ollama.base_url, args.answer_cache)
+
+    from model_registry import model_registry
+    app_import_s = None
+    if args.base_url:
+        client = HttpClient(args.base_url)
+    else:
+        # Time to import the web app, i.e. until a new worker can open its port
+        import_start = time.perf_counter()
+        from app import app as flask_app
+        app_import_s = round(time.perf_counter() - import_start, 3)
+        flask_app.config["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+        os.makedirs(flask_app.config["UPLOAD_FOLDER"], exist_ok=True)
+        client = InProcessClient(flask_app)
+
+    print(f"Generating synthetic judgments in {workdir} ...")
+    pdfs = generate(os.path.join(workdir, "pdfs"), args.pages, args.docs_per_size)
+
+    warm_start = time.perf_counter()
+    model_registry.warm_up()
+    warm_up_s = time.perf_counter() - warm_start
+
+    # Stage timings need the stores in this process
+    args.skip_stages = args.skip_stages or bool(args.base_url)
+    recorder = StageRecorder()
+    if not args.skip_stages:
+        print("Ingestion stages ...")
+        bench_ingestion_stages(recorder, pdfs)
+    print("Upload endpoint ...")
+    collections = bench_upload(recorder, client, pdfs, reset=not args.base_url)
+
+    qs = questions(args.questions)
+    if not args.skip_stages:
+        print("Question stages ...")
+        bench_query_stages(recorder, collections, qs, args.num_variants)
+    print("Ask endpoint ...")
+    for i, question in enumerate(questions(2 * args.questions)[args.questions:]):
+        ms, status = ask(client, collections[i % len(collections)], question, args.num_variants)
+        if status == 200:
+            recorder.record("ask_rag", ms)
+
+    print("Concurrency curve ...")
+    curve = bench_concurrency(client, collections, args.concurrency, args.requests_per_client,
+                              args.num_variants, question_offset=2 * args.questions)
+    llm_gateway = None
+    if not args.base_url:
+        print("LLM gateway ...")
+        llm_gateway = bench_llm_gateway(ollama, args.coalesce_clients)
+    ollama.stop()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "mode": "http" if args.base_url else "in_process",
+            "args": vars(args),
+            "app_import_s": app_import_s,
+            "warm_up_s": round(warm_up_s, 3),
+            "llm_requests": ollama.requests,
+            "config": _config_snapshot(),
+        },
+        "stages": recorder.summary(),
+        "concurrency": curve,
+        "llm_gateway": llm_gateway,
+    }
+
+    output = args.output or os.path.join(os.path.dirname(__file__), "results",
+                                         datetime.now().strftime("bench_%Y%m%d_%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n{'stage':<22}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'per s':>9}")
+    for stage, s in results["stages"].items():
+        print(f"{stage:<22}{s['count']:>6}{s['p50_ms']:>11}{s['p95_ms']:>11}{s['p99_ms']:>11}{s['throughput_per_s']:>9}")
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# backend/benchmarks/synthetic_judgments.py
+# Generates court-judgment-like PDFs (a cause title the validator accepts, then
+# pages of legal prose) so the ingestion pipeline can be benchmarked without real cases.
+#
+#   python -m benchmarks.synthetic_judgments --out ./bench_pdfs --pages 5 50 200
+
+import argparse
+import os
+import random
+
+import fitz  # PyMuPDF
+
+COURTS = ["HIGH COURT OF DELHI AT NEW DELHI", "HIGH COURT OF JUDICATURE AT BOMBAY",
+          "HIGH COURT OF KARNATAKA AT BENGALURU", "HIGH COURT OF MADRAS"]
+STATUTES = ["Section 302 of the Indian Penal Code", "Section 438 of the Code of Criminal Procedure",
+            "Article 21 of the Constitution of India", "Order XXXIX Rule 1 of the Code of Civil Procedure",
+            "Section 138 of the Negotiable Instruments Act", "Section 34 of the Arbitration and Conciliation Act"]
+SENTENCES = [
+    "Learned counsel for the petitioner submitted that {statute} was not attracted on the facts of the case.",
+    "The respondent contended that the evidence on record clearly established the guilt of the appellant.",
+    "It is well settled that the burden of proof lies on the prosecution to establish the charge beyond reasonable doubt.",
+    "The trial court, after appreciating the evidence, recorded a finding that {statute} stood violated.",
+    "We have heard learned counsel for the parties at length and perused the material placed on record.",
+    "In our considered view, the impugned order suffers from no infirmity warranting interference.",
+    "The witness PW-{n} deposed that the incident took place on {day} {month} {year} at about {hour} p.m.",
+    "Reliance was placed on the decision of this Court in Criminal Appeal No. {n} of {year}.",
+    "The scope of {statute} has been examined in several decisions of the Supreme Court of India.",
+    "Accordingly, the appeal is allowed and the judgment of the Sessions Court dated {day} {month} {year} is set aside.",
+]
+MONTHS = ["January", "March", "May", "July", "September", "November"]
+
+
+def _sentence(rng):
+    return rng.choice(SENTENCES).format(
+        statute=rng.choice(STATUTES), n=rng.randint(1, 999), day=rng.randint(1, 28),
+        month=rng.choice(MONTHS), year=rng.randint(1995, 2023), hour=rng.randint(1, 11)
+    )
+
+
+def _cause_title(rng, case_index):
+    year = rng.randint(2005, 2023)
+    return (
+        f"IN THE {rng.choice(COURTS)}\n\n"
+        f"Criminal Appeal No. {100 + case_index} of {year}\n\n"
+        f"Ramesh Kumar ... Appellant / Petitioner\nversus\nState of {rng.choice(['Delhi', 'Maharashtra', 'Karnataka'])} ... Respondent\n\n"
+        f"CORAM: HON'BLE MR. JUSTICE A. SHARMA\n\n"
+        f"Advocate for the petitioner: Mr. R. Mehta\nAdvocate for the respondent: Ms. S. Iyer, APP\n\n"
+        f"JUDGMENT\n\n"
+    )
+
+
+def make_judgment_pdf(path, pages, seed=0, chars_per_page=2800):
+    """Writes a `pages`-page synthetic judgment to `path`. The same seed gives the same bytes."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    paragraph = 1
+    for page_index in range(pages):
+        text = _cause_title(rng, seed) if page_index == 0 else ""
+        while len(text) < chars_per_page:
+            text += f"{paragraph}. " + " ".join(_sentence(rng) for _ in range(rng.randint(3, 6))) + "\n\n"
+            paragraph += 1
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (40, 40, -40, -40), text, fontsize=8)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def generate(out_dir, page_counts, docs_per_size=1, seed=0):
+    """Creates docs_per_size PDFs for each page count; returns [(path, pages), ...]."""
+    os.makedirs(out_dir, exist_ok=True)
+    pdfs = []
+    for pages in page_counts:
+        for i in range(docs_per_size):
+            path = os.path.join(out_dir, f"judgment_{pages}p_{i}.pdf")
+            if not os.path.exists(path):
+                make_judgment_pdf(path, pages, seed=seed + pages * 1000 + i)
+            pdfs.append((path, pages))
+    return pdfs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic court-judgment PDFs.")
+    parser.add_argument("--out", default="./bench_pdfs")
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--docs-per-size", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for path, pages in generate(args.out, args.pages, args.docs_per_size, args.seed):
+        print(f"{path} ({pages} pages)")
@@ -0,0 +1,326 @@
+# backend/bulk_ingest.py
+# Backfills a directory tree of judgment PDFs without going through /api/upload.
+#   - A process pool validates (validator_pdf), extracts and splits each PDF.
+#   - The main process embeds chunks of several documents per call (through the
+#     embedding cache) and writes them to Chroma in large upserts spanning documents,
+#     into the same corpus shards (or per-document collections) and BM25 indexes as
+#     load_and_embed_pdf. A failed call fails only the documents in it.
+#   - Every finished document is appended to a manifest, so an interrupted run
+#     resumes with the documents it had not finished.
+#
+# Usage: python bulk_ingest.py <dir or pdf> [...] [--workers 8] [--manifest bulk_ingest_manifest.jsonl]
+#                              [--retry-failed]
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import config
+from validator_pdf import extract_and_validate
+
+# Manifest states. FINISHED ones are not processed again on resume; WRITING marks a
+# document whose Chroma write was interrupted, so its partial collection is dropped first.
+DONE = "done"
+INVALID = "invalid"
+SKIPPED = "skipped"  # Already indexed (e.g. uploaded through the API)
+FAILED = "failed"
+WRITING = "writing"
+FINISHED = (DONE, INVALID, SKIPPED)
+
+
+# --- Worker side (runs in the process pool; only light imports) ---
+def parse_document(path):
+    """Validates, extracts and splits one PDF. Returns the chunks as (text, metadata) pairs."""
+    # One open of the file: validation, then the remaining pages from the same document
+    validation, pages, total_pages = extract_and_validate(path, read_all=True)
+    if not validation["is_valid"]:
+        return {"valid": False, "confidence": validation["confidence"]}
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=config.CHUNK_SIZE, chunk_overlap=config.CHUNK_OVERLAP)
+    chunks = []
+    for page_number, text in pages:
+        page = Document(
+            page_content=text,
+            metadata={"source": path, "file_path": path, "page": page_number, "total_pages": total_pages}
+        )
+        chunks.extend((chunk.page_content, chunk.metadata) for chunk in splitter.split_documents([page]))
+    head = "\n".join(text for _, text in pages[:config.CORPUS_METADATA_PAGES])
+    return {"valid": True, "chunks": chunks, "head": head}
+
+
+# --- Main process ---
+class Manifest:
+    """Append-only JSON-lines log of per-document outcomes; the last line for a path wins."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Line cut short by an interruption
+                    self.entries[entry["path"]] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _identity(path):
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+    def status(self, path):
+        """The recorded status of the file, or None if it is unknown or changed since."""
+        entry = self.entries.get(path)
+        if entry is None or {"size": entry.get("size"), "mtime": entry.get("mtime")} != self._identity(path):
+            return None
+        return entry["status"]
+
+    def record(self, path, status, **fields):
+        entry = {"path": path, "status": status, **self._identity(path), **fields}
+        self.entries[path] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def find_pdfs(paths):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        elif path.lower().endswith(".pdf"):
+            found.append(path)
+    return sorted(os.path.abspath(p) for p in found)
+
+
+class BulkIngester:
+    def __init__(self, manifest, embed_batch, write_batch):
+        from model_registry import model_registry, EMBEDDER
+
+        self.manifest = manifest
+        self.embed_batch = embed_batch
+        self.write_batch = write_batch
+        self.embeddings = model_registry.get(EMBEDDER)
+        self.counts = {DONE: 0, INVALID: 0, SKIPPED: 0, FAILED: 0}
+        self.chunks = 0
+
+    def finish(self, path, status, **fields):
+        self.manifest.record(path, status, **fields)
+        self.counts[status] += 1
+
+    def _embed(self, ready):
+        """
+        Embeds the chunks of several parsed documents in shared calls of up to embed_batch.
+        Returns ({(document index, chunk index): vector}, {document index: error}); a failed
+        call fails only the documents with chunks in it.
+        """
+        from embedding_cache import embed_documents
+
+        rows = [(d, i, text) for d, (_, _, parsed, _) in enumerate(ready)
+                for i, (text, _) in enumerate(parsed["chunks"])]
+        vectors, failed = {}, {}
+        for start in range(0, len(rows), self.embed_batch):
+            batch = [row for row in rows[start:start + self.embed_batch] if row[0] not in failed]
+            if not batch:
+                continue
+            try:
+                batch_vectors = embed_documents(self.embeddings, [text for _, _, text in batch])
+            except Exception as e:
+                for d, _, _ in batch:
+                    failed.setdefault(d, f"Embedding failed: {e}")
+                continue
+            vectors.update(((d, i), vector) for (d, i, _), vector in zip(batch, batch_vectors))
+        return vectors, failed
+
+    def _write(self, ready, documents, vectors, failed):
+        """
+        Writes the embedded documents grouped by target (their corpus shard, or their own
+        collection), in upserts of up to write_batch chunks that may span documents. A
+        failed upsert fails the documents with chunks in it.
+        """
+        import corpus
+        from chroma_client import get_client
+
+        targets = {}  # target collection name -> (collection, [(document index, id, vector, text, metadata)])
+        for d in documents:
+            path, collection_name, parsed, _ = ready[d]
+            self.manifest.record(path, WRITING, collection_name=collection_name)
+            metadatas = [metadata for _, metadata in parsed["chunks"]]
+            if config.CORPUS_MODE:
+                name = corpus.shard_name(corpus.shard_for(collection_name))
+                case_metadata = corpus.extract_case_metadata(parsed["head"])
+                metadatas = corpus.chunk_metadatas(collection_name, case_metadata, metadatas)
+            else:
+                name = collection_name
+            if name not in targets:
+                try:
+                    if config.CORPUS_MODE:
+                        targets[name] = (corpus.shard_of(collection_name), [])
+                    else:
+                        targets[name] = (get_client().get_or_create_collection(name), [])
+                except Exception as e:
+                    failed[d] = f"Opening the Chroma collection failed: {e}"
+                    continue
+            targets[name][1].extend(
+                (d, f"{collection_name}_{i}", vectors[(d, i)], text, metadata)
+                for i, ((text, _), metadata) in enumerate(zip(parsed["chunks"], metadatas))
+            )
+
+        for collection, rows in targets.values():
+            for start in range(0, len(rows), self.write_batch):
+                batch = [row for row in rows[start:start + self.write_batch] if row[0] not in failed]
+                if not batch:
+                    continue
+                try:
+                    collection.upsert(ids=[row[1] for row in batch], embeddings=[row[2] for row in batch],
+                                      documents=[row[3] for row in batch], metadatas=[row[4] for row in batch])
+                except Exception as e:
+                    for row in batch:
+                        failed.setdefault(row[0], f"Writing to Chroma failed: {e}")
+
+    def _complete(self, path, collection_name, parsed):
+        """The per-document steps after its chunks are stored, ending with the completion marker."""
+        from answer_cache import answer_cache
+        from document_processor import mark_indexed, current_store
+        from lexical_index import BM25Index, save_index
+
+        lexical_index = BM25Index()
+        for i, (text, _) in enumerate(parsed["chunks"]):
+            lexical_index.add(f"{collection_name}_{i}", text)
+        save_index(collection_name, lexical_index)
+        answer_cache.invalidate_collection(collection_name)
+        mark_indexed(collection_name, len(parsed["chunks"]), current_store())
+
+    def embed_and_write(self, ready):
+        """
+        Embeds and writes several parsed documents together, like load_and_embed_pdf
+        does for one: corpus shard (or collection), BM25 index, completion marker.
+        Documents whose embedding or write failed are marked FAILED and the run goes on.
+        """
+        from document_processor import delete_collection
+
+        vectors, failed = self._embed(ready)
+        written = [d for d in range(len(ready)) if d not in failed]
+        self._write(ready, written, vectors, failed)
+
+        for d, (path, collection_name, parsed, started) in enumerate(ready):
+            count = len(parsed["chunks"])
+            if d not in failed:
+                try:
+                    self._complete(path, collection_name, parsed)
+                except Exception as e:
+                    failed[d] = str(e)
+            if d in failed:
+                if d in written:
+                    # Drop what was written, so a retry does not see a partial document
+                    delete_collection(collection_name)
+                self.finish(path, FAILED, collection_name=collection_name, error=failed[d])
+            else:
+                self.finish(path, DONE, collection_name=collection_name, chunks=count,
+                            seconds=round(time.perf_counter() - started, 2))
+                self.chunks += count
+
+
+def _progress(ingester, total, started):
+    finished = sum(ingester.counts.values())
+    elapsed = time.perf_counter() - started
+    rate = finished / elapsed if elapsed else 0.0
+    eta = f"{(total - finished) / rate / 60:.1f} min" if rate else "?"
+    print(f"[{finished}/{total}] {rate:.2f} docs/s, {ingester.chunks / elapsed if elapsed else 0:.1f} chunks/s, "
+          f"done={ingester.counts[DONE]} invalid={ingester.counts[INVALID]} skipped={ingester.counts[SKIPPED]} "
+          f"failed={ingester.counts[FAILED]}, ETA {eta}", flush=True)
+
+
+def run(paths, workers, manifest_path, retry_failed, report_every):
+    from document_processor import generate_collection_name, is_collection_indexed, delete_collection
+
+    manifest = Manifest(manifest_path)
+    skip = FINISHED if retry_failed else FINISHED + (FAILED,)
+    pdfs = [p for p in find_pdfs(paths) if manifest.status(p) not in skip]
+    print(f"{len(pdfs)} PDFs to ingest ({len(manifest.entries)} already in the manifest).")
+
+    ingester = BulkIngester(manifest, config.BULK_EMBED_BATCH, config.BULK_WRITE_BATCH)
+    started = last_report = time.perf_counter()
+    queue = iter(pdfs)
+    in_flight, ready = {}, []
+    # 'spawn' so workers do not inherit the loaded embedder
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        while True:
+            # Keep the pool busy without parsing far ahead of the embedder
+            while len(in_flight) < 2 * workers:
+                path = next(queue, None)
+                if path is None:
+                    break
+                collection_name = generate_collection_name(path)
+                if manifest.status(path) == WRITING:
+                    delete_collection(collection_name)
+                elif is_collection_indexed(collection_name):
+                    ingester.finish(path, SKIPPED, collection_name=collection_name)
+                    continue
+                in_flight[executor.submit(parse_document, path)] = (path, collection_name, time.perf_counter())
+            if not in_flight and not ready:
+                break
+
+            if in_flight:
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    path, collection_name, doc_started = in_flight.pop(future)
+                    try:
+                        parsed = future.result()
+                    except Exception as e:
+                        ingester.finish(path, FAILED, collection_name=collection_name, error=str(e))
+                        continue
+                    if not parsed["valid"]:
+                        ingester.finish(path, INVALID, collection_name=collection_name,
+                                        confidence=parsed["confidence"])
+                    elif not parsed["chunks"]:
+                        ingester.finish(path, FAILED, collection_name=collection_name, error="No text extracted.")
+                    else:
+                        ready.append((path, collection_name, parsed, doc_started))
+
+            # Enough chunks for full upserts, spanning documents
+            if ready and (not in_flight or sum(len(r[2]["chunks"]) for r in ready) >= config.BULK_WRITE_BATCH):
+                ingester.embed_and_write(ready)
+                ready = []
+
+            if time.perf_counter() - last_report >= report_every:
+                _progress(ingester, len(pdfs), started)
+                last_report = time.perf_counter()
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        manifest.close()
+    executor.shutdown()
+    _progress(ingester, len(pdfs), started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate, embed and index a directory tree of judgment PDFs.")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories (searched recursively).")
+    parser.add_argument("--workers", type=int, default=config.BULK_PARSE_WORKERS or os.cpu_count(),
+                        help="Processes validating, parsing and splitting PDFs.")
+    parser.add_argument("--manifest", default=config.BULK_MANIFEST_PATH,
+                        help="Checkpoint file; finished documents listed in it are not processed again.")
+    parser.add_argument("--retry-failed", action="store_true", help="Also retry documents that failed before.")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines.")
+    args = parser.parse_args()
+    run(args.paths, args.workers, args.manifest, args.retry_failed, args.report_every)
+
+
+if __name__ == "__main__":
+    main()
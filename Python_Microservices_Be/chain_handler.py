@@ -5,126 +5,152 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 from operator import itemgetter
+import time
 
 from llm_interface import get_llm
 from prompt_manager import load_prompt_templates
+from context_packer import pack_context
+from telemetry import (span, debug_payload, set_attribute, estimate_tokens, EVENTS, PROMPT_TOKENS,
+                       GENERATED_TOKENS, GENERATION_SECONDS, CONTEXT_TOKENS, CONTEXT_TOKENS_SAVED)
 
-def get_rag_chain(retriever):
+def format_docs(docs):
+    """Formats the retrieved documents into a single string."""
+    if not docs:
+        EVENTS.inc(event="empty_context")
+        return "No relevant documents found."
+    return "\n\n".join(f"Source: Page {doc.metadata.get('page', 'N/A')}\nContent: {doc.page_content}" for doc in docs)
+
+def prepare_context(docs, prompt_type=None):
+    """Packs the reranked documents into the prompt_type's token budget (see context_packer)."""
+    with span("context_pack"):
+        packed, report = pack_context(docs, prompt_type)
+    CONTEXT_TOKENS.observe(report["tokens_before"], stage="before")
+    CONTEXT_TOKENS.observe(report["tokens_after"], stage="after")
+    CONTEXT_TOKENS_SAVED.observe(report["tokens_saved"], prompt_type=prompt_type or "default_fallback")
+    set_attribute("context", report)
+    return packed
+
+def get_prompt_template(prompt_type):
+    """Selects the correct prompt template for the given prompt_type."""
+    prompt_templates = load_prompt_templates()
+    
+    # Priority 1: Use a dynamic prompt if a valid type is provided.
+    if prompt_type and prompt_type in prompt_templates:
+        template_info = prompt_templates[prompt_type]
+        # This is the template for specialized tasks
+        return ChatPromptTemplate.from_template(
+            "CONTEXT:\n---\n{context}\n---\n\n"
+            "USER'S REQUEST:\n---\n{question}\n---\n\n"
+            f"TASK:\n---\n{template_info['prompt_template']}\n---"
+        )
+    
+    # Priority 2: Use the default prompt for general Q&A.
+    return ChatPromptTemplate.from_template(
+        "CONTEXT:\n{context}\n\n"
+        "QUERY:\n{question}\n\n"
+        "Based *only* on the provided CONTEXT, answer the QUERY. "
+        "If the information is not found, state that. Be concise.\n\n"
+        "Answer:"
+    )
+
+def get_rag_chain(retriever, return_sources=False):
     """
     Creates a RAG chain that dynamically selects a prompt based on 'prompt_type'
     and falls back to a default prompt for general questions.
+    With return_sources=True the chain returns {"answer": str, "docs": [Document]},
+    where 'docs' are exactly the documents the answer was generated from.
     """
     llm = get_llm()
-    prompt_templates = load_prompt_templates()
-
-    def format_docs(docs):
-        """Formats the retrieved documents into a single string."""
-        if not docs:
-            print("WARNING: No documents retrieved!")
-            return "No relevant documents found."
-        formatted = "\n\n".join(f"Source: Page {doc.metadata.get('page', 'N/A')}\nContent: {doc.page_content}" for doc in docs)
-        print(f"DEBUG: Formatted {len(docs)} documents, total length: {len(formatted)}")
-        return formatted
 
-    def get_prompt_template(input_dict):
-        """Selects the correct prompt template based on the input."""
-        prompt_type = input_dict.get("prompt_type")
-        
-        # Priority 1: Use a dynamic prompt if a valid type is provided.
-        if prompt_type and prompt_type in prompt_templates:
-            template_info = prompt_templates[prompt_type]
-            # This is the template for specialized tasks
-            return ChatPromptTemplate.from_template(
-                "CONTEXT:\n---\n{context}\n---\n\n"
-                "USER'S REQUEST:\n---\n{question}\n---\n\n"
-                f"TASK:\n---\n{template_info['prompt_template']}\n---"
-            )
-        
-        # Priority 2: Use the default prompt for general Q&A.
-        return ChatPromptTemplate.from_template(
-            "CONTEXT:\n{context}\n\n"
-            "QUERY:\n{question}\n\n"
-            "Based *only* on the provided CONTEXT, answer the QUERY. "
-            "If the information is not found, state that. Be concise.\n\n"
-            "Answer:"
-        )
-
-    # --- Assemble the Full Chain ---
-    # This design uses a RunnableLambda to dynamically select and format the prompt
     def format_prompt(input_dict):
         """Get the prompt template, format it, and return the formatted prompt"""
-        prompt_template = get_prompt_template(input_dict)
-        # Format the prompt with context and question
-        try:
-            formatted = prompt_template.format_messages(
+        with span("prompt_format"):
+            formatted = get_prompt_template(input_dict.get("prompt_type")).format_messages(
                 context=input_dict.get("context", ""),
                 question=input_dict.get("question", "")
             )
-            # Debug: print the formatted prompt
-            print("=" * 80)
-            print("FORMATTED PROMPT:")
-            for i, msg in enumerate(formatted):
-                print(f"Message {i}: Type={msg.type}, Content length={len(msg.content)}")
-                print(f"Content preview: {msg.content[:200]}...")
-            print("=" * 80)
-            return formatted
-        except Exception as e:
-            print(f"Error formatting prompt: {e}")
-            print(f"Input dict keys: {input_dict.keys()}")
-            print(f"Context length: {len(input_dict.get('context', ''))}")
-            raise
-    
-    def debug_llm_response(response):
-        """Debug function to check LLM response"""
-        print("=" * 80)
-        print("LLM RESPONSE (BEFORE PARSER):")
-        print(f"Response type: {type(response)}")
-        if hasattr(response, 'content'):
-            content = response.content
-            print(f"Response content type: {type(content)}")
-            print(f"Response content: {content[:500] if content else 'EMPTY'}")
-            print(f"Response content length: {len(content) if content else 0}")
-            if not content or len(content.strip()) == 0:
-                print("WARNING: LLM returned empty content!")
-        else:
-            print(f"Response: {str(response)[:500]}")
-        print("=" * 80)
-        return response
-    
-    def ensure_string_output(response):
-        """Ensure we extract string content from the response"""
-        # StrOutputParser should handle this, but as a safety measure
-        if isinstance(response, str):
-            return response
-        elif hasattr(response, 'content'):
-            content = response.content
-            if content is None:
-                return ""
-            return str(content)
-        else:
-            return str(response)
-    
+        debug_payload("prompt", lambda: "\n\n".join(msg.content for msg in formatted))
+        return formatted
+
+    def generate(input_dict):
+        """Steps 3-5: prompt -> LLM -> string answer, with generation metrics"""
+        messages = format_prompt(input_dict)
+        started = time.perf_counter()
+        with span("llm"):
+            response = llm.invoke(messages)
+        answer = chunk_text(response)
+        record_generation(input_dict.get("prompt_type"), messages, answer,
+                          time.perf_counter() - started, getattr(response, "usage_metadata", None))
+        return answer
+
+    # Steps 3-5 are shared by both chain modes
+    answer_chain = RunnableLambda(generate)
+
+    # Retrieve once, pack the documents into the prompt's token budget, and keep
+    # them alongside the answer so the caller does not run the retriever again.
     full_chain = (
         {
-            # 1. Retrieve context based on the 'question'.
-            "context": itemgetter("question") | retriever | format_docs,
+            # 1. Retrieve the documents for the 'question'.
+            "docs": itemgetter("question") | retriever,
             # 2. Pass the original 'question' and 'prompt_type' through.
             "question": itemgetter("question"),
             "prompt_type": itemgetter("prompt_type")
         }
-        # 3. Format the prompt with the retrieved context
-        | RunnableLambda(format_prompt)
-        # 4. Pass the formatted messages to the LLM.
-        | llm
-        # 5. Debug the LLM response
-        | RunnableLambda(debug_llm_response)
-        # 6. Parse the output to a string.
-        | StrOutputParser()
-        # 7. Ensure we have a string (safety check)
-        | RunnableLambda(ensure_string_output)
+        | RunnablePassthrough.assign(docs=lambda x: prepare_context(x["docs"], x["prompt_type"]))
+        | RunnablePassthrough.assign(context=lambda x: format_docs(x["docs"]))
+        | {"answer": answer_chain, "docs": itemgetter("docs")}
     )
 
-    return full_chain
+    if return_sources:
+        return full_chain
+    return full_chain | itemgetter("answer")
+
+def build_answer_messages(question, prompt_type, docs):
+    """The chat messages the RAG chain sends to the LLM for these documents."""
+    return get_prompt_template(prompt_type).format_messages(
+        context=format_docs(docs),
+        question=question
+    )
+
+def chunk_text(chunk):
+    """Extracts the text of an LLM response or streamed chunk."""
+    content = chunk.content if hasattr(chunk, 'content') else chunk
+    return "" if content is None else str(content)
+
+def record_generation(prompt_type, messages, answer, seconds, usage=None):
+    """Prompt / generated token counts and generation time of one LLM answer."""
+    label = prompt_type or "default_fallback"
+    usage = usage or {}
+    prompt_tokens = usage.get("input_tokens") or estimate_tokens("".join(str(msg.content) for msg in messages))
+    PROMPT_TOKENS.observe(prompt_tokens, prompt_type=label)
+    GENERATED_TOKENS.observe(usage.get("output_tokens") or estimate_tokens(answer), prompt_type=label)
+    GENERATION_SECONDS.observe(seconds, prompt_type=label)
+    if not answer.strip():
+        EVENTS.inc(event="empty_llm_answer")
+    debug_payload("llm_response", answer)
+
+def stream_rag_answer(retriever, question, prompt_type=None):
+    """
+    Streaming counterpart of get_rag_chain(..., return_sources=True).
+    Yields ("sources", docs) as soon as retrieval and reranking are done,
+    then ("token", text) for every chunk the LLM generates.
+    """
+    llm = get_llm()
+    docs = prepare_context(retriever.invoke(question), prompt_type)
+    yield "sources", docs
+
+    messages = build_answer_messages(question, prompt_type, docs)
+    debug_payload("prompt", lambda: "\n\n".join(msg.content for msg in messages))
+    started = time.perf_counter()
+    parts, usage = [], None
+    with span("llm"):
+        for chunk in llm.stream(messages):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            text = chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield "token", text
+    record_generation(prompt_type, messages, "".join(parts), time.perf_counter() - started, usage)
 
 DIRECT_LLM_PROMPT_TEMPLATE = """
 You are an AI assistant specialized in Indian Legal Law, based on your custom training.
@@ -147,4 +173,10 @@ def get_direct_llm_chain():
         | llm
         | StrOutputParser()
     )
-    return direct_chain
\ No newline at end of file
+    return direct_chain
+
+def stream_direct_answer(question):
+    """Yields the direct LLM answer chunk by chunk as it is generated."""
+    for chunk in get_direct_llm_chain().stream(question):
+        if chunk:
+            yield chunk
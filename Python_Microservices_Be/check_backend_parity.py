@@ -0,0 +1,132 @@
+# backend/check_backend_parity.py
+# Compares the PyTorch and ONNX (int8) backends of the embedder and the reranker on the
+# chunks of an ingested document: embedding cosine similarity, overlap of the top-k
+# retrieved chunks, reranker rank correlation and top-n agreement, and throughput.
+# Run it before switching EMBEDDER_BACKEND / RERANKER_BACKEND to "onnx".
+#
+# Usage: python check_backend_parity.py --collection legal_case_<id> [--questions questions.txt]
+#                                       [--limit 500] [--top-k 15] [--output parity.json]
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import config
+from chroma_client import get_client
+from model_registry import load_embedder, load_reranker
+
+DEFAULT_QUESTIONS = [
+    "What are the facts of the case?",
+    "What was the final judgment of the court?",
+    "Which sections or articles were cited?",
+    "What arguments did the appellant make?",
+    "What arguments did the respondent make?",
+    "Who were the judges on the bench?",
+    "Was any compensation or sentence awarded?",
+    "What precedents did the court rely on?",
+]
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def _ranks(values):
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values)] = np.arange(len(values))
+    return ranks
+
+
+def _spearman(a, b):
+    if len(a) < 2:
+        return 1.0
+    return float(np.corrcoef(_ranks(a), _ranks(b))[0, 1])
+
+
+def compare_embedders(texts, questions, top_k):
+    report, vectors = {}, {}
+    for backend in ("torch", "onnx"):
+        embedder = load_embedder(backend)
+        docs, seconds = _timed(embedder.embed_documents, texts)
+        queries = np.array([embedder.embed_query(q) for q in questions], dtype=np.float32)
+        vectors[backend] = (np.array(docs, dtype=np.float32), queries)
+        report[f"{backend}_texts_per_sec"] = round(len(texts) / seconds, 1)
+
+    (torch_docs, torch_queries), (onnx_docs, onnx_queries) = vectors["torch"], vectors["onnx"]
+    cosine = np.sum(torch_docs * onnx_docs, axis=1) / (
+        np.linalg.norm(torch_docs, axis=1) * np.linalg.norm(onnx_docs, axis=1))
+    top_torch = np.argsort(-(torch_queries @ torch_docs.T), axis=1)[:, :top_k]
+    top_onnx = np.argsort(-(onnx_queries @ onnx_docs.T), axis=1)[:, :top_k]
+    overlap = [len(set(a) & set(b)) / len(a) for a, b in zip(top_torch.tolist(), top_onnx.tolist())]
+    report.update({
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "cosine_min": round(float(cosine.min()), 5),
+        f"retrieval_overlap_at_{top_k}": round(float(np.mean(overlap)), 4),
+    })
+    return report, top_torch
+
+
+def compare_rerankers(texts, questions, candidates):
+    report, scores = {}, {}
+    pairs = [[q, texts[i]] for q, row in zip(questions, candidates) for i in row]
+    for backend in ("torch", "onnx"):
+        reranker = load_reranker(backend)
+        result, seconds = _timed(
+            lambda: reranker.compute_score(pairs, batch_size=config.RERANK_BATCH_SIZE, max_length=config.RERANK_MAX_LENGTH))
+        scores[backend] = np.array(result if isinstance(result, list) else [result], dtype=np.float32)
+        report[f"{backend}_pairs_per_sec"] = round(len(pairs) / seconds, 1)
+
+    per_question = len(candidates[0])
+    correlations, agreement = [], []
+    for start in range(0, len(pairs), per_question):
+        a = scores["torch"][start:start + per_question]
+        b = scores["onnx"][start:start + per_question]
+        correlations.append(_spearman(a, b))
+        top_n = min(config.RERANK_TOP_N, per_question)
+        agreement.append(len(set(np.argsort(-a)[:top_n]) & set(np.argsort(-b)[:top_n])) / top_n)
+    report.update({
+        "spearman_mean": round(float(np.mean(correlations)), 4),
+        "spearman_min": round(float(np.min(correlations)), 4),
+        f"top_{config.RERANK_TOP_N}_agreement": round(float(np.mean(agreement)), 4),
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the torch and ONNX embedder / reranker backends.")
+    parser.add_argument("--collection", required=True, help="Collection whose chunks are used as the corpus (e.g. a corpus shard, legal_corpus_00).")
+    parser.add_argument("--questions", help="Text file with one question per line (default: generic legal questions).")
+    parser.add_argument("--limit", type=int, default=500, help="Maximum number of chunks to embed.")
+    parser.add_argument("--top-k", type=int, default=config.RETRIEVAL_K)
+    parser.add_argument("--output", help="Also write the report to this JSON file.")
+    args = parser.parse_args()
+
+    texts = [t for t in get_client().get_collection(args.collection).get(
+        limit=args.limit, include=["documents"])["documents"] if t]
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    top_k = min(args.top_k, len(texts))
+
+    embedder_report, candidates = compare_embedders(texts, questions, top_k)
+    report = {
+        "collection": args.collection,
+        "chunks": len(texts),
+        "questions": len(questions),
+        "onnx_quantization": config.ONNX_QUANTIZATION,
+        "embedder": embedder_report,
+        "reranker": compare_rerankers(texts, questions, candidates.tolist()),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# backend/chroma_client.py
+
+import threading
+from collections import OrderedDict
+
+import config
+
+_client = None
+_client_lock = threading.Lock()
+
+# collection name -> langchain Chroma handle, least recently used first
+_stores = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+class UnknownCollectionError(LookupError):
+    """The collection does not exist (and the caller must not create it)."""
+
+
+def _create_client():
+    import chromadb
+    from chromadb.config import Settings
+
+    mode = config.CHROMA_CLIENT_MODE
+    if mode == "http":
+        # Several Flask workers share one Chroma server instead of each mapping the index
+        return chromadb.HttpClient(host=config.CHROMA_SERVER_HOST, port=config.CHROMA_SERVER_PORT)
+    if mode == "ephemeral":
+        # In-memory stand-in for a server, e.g. for local experiments and tests
+        return chromadb.EphemeralClient()
+    if mode == "persistent":
+        return chromadb.PersistentClient(
+            path=config.CHROMA_PERSIST_DIRECTORY,
+            settings=Settings(
+                # Unload the least recently used HNSW segments beyond the memory limit
+                chroma_segment_cache_policy="LRU",
+                chroma_memory_limit_bytes=config.CHROMA_MEMORY_LIMIT_BYTES,
+            )
+        )
+    raise ValueError(f"Unknown CHROMA_CLIENT_MODE '{mode}' (expected 'persistent', 'http' or 'ephemeral').")
+
+
+def get_client():
+    """Returns the process-wide Chroma client, created once (see CHROMA_CLIENT_MODE)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = _create_client()
+        return _client
+
+
+def get_vector_store(collection_name, create=True):
+    """
+    Returns a langchain Chroma handle for the collection, reusing open handles
+    (at most CHROMA_MAX_OPEN_COLLECTIONS, least recently used dropped first).
+    With create=False a missing collection raises UnknownCollectionError instead of being created.
+    """
+    with _stores_lock:
+        store = _stores.get(collection_name)
+        if store is not None:
+            _stores.move_to_end(collection_name)
+            return store
+
+    import chromadb.errors
+    from langchain_chroma import Chroma
+    from model_registry import model_registry, EMBEDDER
+
+    if not create:
+        # Chroma raises NotFoundError (ValueError before 0.6) for a missing collection
+        not_found = (ValueError, getattr(chromadb.errors, "NotFoundError", ValueError))
+        try:
+            get_client().get_collection(collection_name)
+        except not_found as e:
+            raise UnknownCollectionError(f"Collection '{collection_name}' does not exist.") from e
+
+    store = Chroma(
+        client=get_client(),
+        collection_name=collection_name,
+        embedding_function=model_registry.get(EMBEDDER)
+    )
+    with _stores_lock:
+        _stores[collection_name] = store
+        _stores.move_to_end(collection_name)
+        while len(_stores) > config.CHROMA_MAX_OPEN_COLLECTIONS:
+            _stores.popitem(last=False)
+    return store
+
+
+def forget_vector_store(collection_name):
+    """Drops the cached handle, e.g. after the collection was deleted."""
+    with _stores_lock:
+        _stores.pop(collection_name, None)
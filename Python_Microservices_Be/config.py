@@ -5,19 +5,158 @@ OLLAMA_BASE_URL = "http://localhost:11434"  # Default Ollama API URL
 # Replace with the actual name of your custom-trained Indian legal LLM in Ollama
 LLM_MODEL_NAME = "LLM-Legal-M:latest" # Using llama3 as a stand-in for "LLM-Legal-M"
 
+# LLM Gateway Configuration (every Ollama call goes through llm_gateway.py)
+LLM_MAX_CONCURRENT = 2  # Generations sent to Ollama at once; more wait, interactive asks first
+LLM_MAX_QUEUED = 16  # Generations waiting for a slot by priority; later ones wait in submission order
+LLM_MAX_RETRIES = 2  # Retries for connection errors, timeouts and 429/5xx before the first token
+LLM_RETRY_BACKOFF_SECONDS = 0.5  # Doubles with every retry
+LLM_CONNECT_TIMEOUT_SECONDS = 5
+LLM_READ_TIMEOUT_SECONDS = 120  # Longest silence between two streamed chunks (includes model loading)
+
 # Embedding Model Configuration
 EMBEDDING_MODEL_NAME = "BAAI/bge-base-en-v1.5"
 EMBEDDING_MODEL_KWARGS = {'device': 'cpu'} # Use 'cuda' if you have a GPU
 EMBEDDING_ENCODE_KWARGS = {'normalize_embeddings': True}
 
+# Inference Backend Configuration
+# "torch": PyTorch (full precision on CPU)
+# "onnx": ONNX Runtime; the model is exported (and int8-quantized) under ONNX_MODEL_DIRECTORY on first load.
+# Compare accuracy and speed with `python check_backend_parity.py` before switching.
+EMBEDDER_BACKEND = "torch"
+RERANKER_BACKEND = "torch"
+ONNX_MODEL_DIRECTORY = "./onnx_models"
+ONNX_QUANTIZATION = "avx2"  # optimum AutoQuantizationConfig preset (avx2, avx512, avx512_vnni, arm64); None = fp32 ONNX
+ONNX_INTRA_OP_THREADS = 4  # Threads per ONNX Runtime forward pass
+ONNX_INTER_OP_THREADS = 1
+TORCH_NUM_THREADS = None  # PyTorch intra-op threads (None = PyTorch default)
+
+# Retrieval Configuration
+MULTI_QUERY_VARIANTS = 5  # LLM-generated rewrites searched alongside the question (0 = question only)
+MULTI_QUERY_TIMEOUT_SECONDS = 4.0  # Longer rewrites are abandoned; the question-only results are used
+MULTI_QUERY_MAX_PENDING = 4  # Rewrites running at once, abandoned ones included; beyond it questions are not rewritten
+# Rewriting is skipped when the question alone already retrieves well (None disables a check):
+MULTI_QUERY_SKIP_DENSE_SIMILARITY = 0.85  # ...all RERANK_TOP_N best chunks have this cosine similarity (needs normalized embeddings)
+MULTI_QUERY_SKIP_RERANK_SCORE = 4.0  # ...or all RERANK_TOP_N reranked chunks score this high (raw cross-encoder logit)
+QUERY_VARIANT_CACHE_SIZE = 2048  # Questions whose rewrites are kept in memory
+QUERY_VARIANT_CACHE_TTL_SECONDS = 24 * 3600
+RETRIEVAL_K = 20  # Nearest chunks fetched per query
+RRF_K = 60  # Reciprocal-rank fusion constant
+
+# Hybrid (BM25 + dense) Retrieval Configuration
+HYBRID_RETRIEVAL = True
+LEXICAL_K = 20  # BM25 hits fused in per query
+LEXICAL_INDEX_DIRECTORY = "./lexical_index"
+LEXICAL_INDEX_CACHE_SIZE = 64  # Per-collection indexes kept in memory
+
 # Reranker Configuration
 CROSS_ENCODER_MODEL_NAME = "BAAI/bge-reranker-base"
 RERANK_TOP_N = 3  # Number of documents to return after reranking
+RERANK_CANDIDATE_TOP_M = 30  # Candidates (by fusion score) sent to the cross-encoder
+RERANK_BATCH_SIZE = 16  # Pairs per cross-encoder forward pass (pairs are length-sorted first)
+RERANK_MAX_LENGTH = 512  # Token limit per [query, chunk] pair
+RERANK_SCORE_CACHE_SIZE = 50000  # Cached (query, chunk) scores
+
+# Telemetry Configuration
+# Every request feeds the Prometheus metrics at GET /metrics; only a sample is logged in full
+TRACE_SAMPLE_RATE = 0.01  # Fraction of requests logged as a JSON trace with spans, prompt and LLM output
+TRACE_DEBUG_PAYLOAD_CHARS = 2000  # Characters kept per debug payload (prompt, LLM response)
+TRACE_LOG_PATH = None  # File for sampled traces (None = stderr)
+LOG_LEVEL = "INFO"  # Operational messages on stderr (model loads, ingestion results, Ollama errors)
+
+# Inference Micro-Batching Configuration
+# Query embeddings and rerank pairs from concurrent requests are pooled into shared forward passes
+INFERENCE_MICRO_BATCHING = True
+INFERENCE_MAX_WAIT_MS = 5  # How long a group waits for more requests before running
+EMBED_MICRO_BATCH_MAX = 64  # Query texts per pooled embedding call
+RERANK_MICRO_BATCH_MAX = 128  # Pairs per pooled rerank group (scored in RERANK_BATCH_SIZE passes)
+
+# Context Packing Configuration
+# Token budget of the retrieved context per prompt_type ("default" = general Q&A)
+CONTEXT_TOKEN_BUDGETS = {
+    "default": 1200,
+    "contextual_case_summary": 2000,
+    "identify_key_entities": 1600,
+    "risk_analysis": 1600,
+}
+CONTEXT_ORDER = "document"  # "document" (page order) or "relevance" (best passage first)
+
+# Precomputed Document Artifacts Configuration
+# Whole-document answers for these prompt types, built once per document by map-reduce over all chunks
+PRECOMPUTE_ARTIFACTS = False  # Build after ingestion (and rebuild when stale); costs one LLM call per ~3k tokens of text
+PRECOMPUTED_PROMPT_TYPES = ["contextual_case_summary", "identify_key_entities", "risk_analysis"]
+ARTIFACT_DIRECTORY = "./document_artifacts"
+ARTIFACT_BUILD_WORKERS = 1  # Background builds running at once
+ARTIFACT_MAP_WINDOW_TOKENS = 3000  # Document text per map-step LLM call
+ARTIFACT_REDUCE_TOKENS = 3000  # Notes are collapsed until they fit this before the final answer
+
+# Model Registry Configuration
+# Models loaded once at startup so the first request does not pay the load cost
+WARMUP_MODELS = ["embedder", "reranker"]
+WARMUP_IN_BACKGROUND = True  # Open the port first and warm up on a background thread (see /readyz)
+READY_REQUIRES_LLM = False  # Whether /readyz also waits for Ollama to answer
+
+# Semantic Answer Cache Configuration
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_PATH = "./answer_cache.sqlite3"
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95  # Cosine similarity for two questions to share an answer
+ANSWER_CACHE_MAX_ENTRIES = 2000
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600
 
 # ChromaDB Configuration
+# "persistent": local on-disk client (one per process)
+# "http": shared Chroma server (`chroma run --path ./chroma_db_legal`), used by all workers
+# "ephemeral": in-memory stand-in
+CHROMA_CLIENT_MODE = "persistent"
 CHROMA_PERSIST_DIRECTORY = "./chroma_db_legal"
-# The collection name will be generated dynamically based on the PDF filename
+CHROMA_SERVER_HOST = "localhost"
+CHROMA_SERVER_PORT = 8000
+CHROMA_MAX_OPEN_COLLECTIONS = 128  # Cached collection handles
+CHROMA_MEMORY_LIMIT_BYTES = 4 * 1024 ** 3  # Loaded HNSW segments beyond this are evicted (LRU)
+# The collection name will be generated dynamically from a hash of the PDF contents
+
+# Corpus Mode Configuration
+# Index every document into a few shared, sharded collections with per-document metadata
+# (court, year, case number) instead of one collection per document; also enables
+# cross-document search. Off by default (one collection per document); existing
+# deployments switch after copying their collections with migrate_to_corpus.py.
+CORPUS_MODE = False
+CORPUS_COLLECTION_PREFIX = "legal_corpus"
+CORPUS_NUM_SHARDS = 4
+CORPUS_METADATA_PAGES = 3  # Leading pages scanned for court / year / case number
+CORPUS_CHUNKS_PER_DOC_HIT = 10  # Over-fetch factor when grouping chunk hits into similar documents
 
 # Document Processing Configuration
 CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 100
\ No newline at end of file
+CHUNK_OVERLAP = 100
+EMBED_BATCH_SIZE = 64  # Chunks embedded and written to Chroma per batch during ingestion
+PARSE_WORKERS = 4  # Processes extracting PDF pages in parallel (None = one per CPU)
+PARSE_PAGES_PER_TASK = 16  # Pages per extraction task; smaller PDFs are parsed in-process
+INDEXED_DOCUMENTS_DIRECTORY = "./indexed_documents"  # Completion marker per fully ingested document
+
+# Embedding Cache Configuration
+# Chunk vectors are cached on disk per embedding model, keyed by the whitespace-normalized text,
+# so repeated boilerplate and re-chunking only embed new text.
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_DIRECTORY = "./embedding_cache"
+EMBEDDING_CACHE_MAX_MB = 512  # Disk budget per model; least recently used vectors are evicted beyond it
+
+# Ingestion Job Queue Configuration
+# Uploads are ingested in the background by a small pool so they cannot starve /api/ask_rag
+INGEST_MAX_WORKERS = 1
+INGEST_MAX_PENDING = 8  # Queued + running jobs before /api/upload answers 429
+INGEST_JOB_HISTORY = 500  # Finished jobs kept for status polling
+INGEST_JOB_DIRECTORY = "./ingest_jobs"  # Job status snapshots, readable by every server worker
+
+# Bulk Ingestion Configuration (bulk_ingest.py)
+BULK_PARSE_WORKERS = None  # Processes validating, extracting and splitting PDFs (None = one per CPU)
+BULK_EMBED_BATCH = 512  # Chunks, across documents, embedded together
+BULK_WRITE_BATCH = 5000  # Chunks per Chroma upsert, across documents (Chroma rejects batches above ~5461)
+BULK_MANIFEST_PATH = "./bulk_ingest_manifest.jsonl"  # Checkpoint of finished documents, for resuming
+
+# Production Server Configuration (asgi.py)
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 5001
+SERVER_WORKERS = 2  # Worker processes; each loads the models once
+CPU_EXECUTOR_WORKERS = 4  # Threads per worker for embedding / search / reranking
+MAX_ACTIVE_ASKS = 8  # Questions processed concurrently per worker
+MAX_QUEUED_ASKS = 32  # Questions waiting for a slot before new ones get HTTP 429
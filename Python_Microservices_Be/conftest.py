@@ -0,0 +1,3 @@
+# backend/conftest.py
+# Lets the tests under tests/ import the backend modules by their flat names
+# (config, llm_gateway, ...), as the modules import each other.
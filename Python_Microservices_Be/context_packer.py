@@ -0,0 +1,154 @@
+# backend/context_packer.py
+# Assembles the LLM context from the reranked chunks under a token budget per prompt_type:
+#   1. adjacent chunks of the same page are merged and their CHUNK_OVERLAP text dropped,
+#   2. sentences already present in a higher-ranked passage are removed (boilerplate),
+#   3. passages are taken best-first until the budget is spent (the last one cut at a sentence),
+#   4. the kept passages are ordered for the model (document order by default).
+
+import re
+
+from langchain_core.documents import Document
+
+import config
+from telemetry import estimate_tokens
+
+# Splits before the whitespace that follows a sentence end, so "".join(pieces) restores the text
+_SENTENCE_BREAK = re.compile(r"(?<=[.;:?!])(?=\s)")
+_CHUNK_INDEX = re.compile(r"_(\d+)$")
+# Shorter sentences ("Held:", "Ibid.") are too generic to count as repeats
+MIN_DEDUP_SENTENCE_CHARS = 40
+# A passage cut to fit the budget must keep at least this many tokens, or it is left out
+MIN_PARTIAL_PASSAGE_TOKENS = 60
+
+
+def token_budget(prompt_type):
+    budgets = config.CONTEXT_TOKEN_BUDGETS
+    return budgets.get(prompt_type or "default", budgets["default"])
+
+
+def _chunk_index(doc):
+    match = _CHUNK_INDEX.search(str(doc.metadata.get("chunk_id", "")))
+    return int(match.group(1)) if match else None
+
+
+def _position(doc):
+    page = doc.metadata.get("page")
+    index = _chunk_index(doc)
+    return (page if isinstance(page, int) else 1 << 30, index if index is not None else 1 << 30)
+
+
+def _score(doc):
+    metadata = doc.metadata
+    return metadata.get("rerank_score", metadata.get("fusion_score", 0.0))
+
+
+def _overlap(left, right, max_chars):
+    """Length of the longest suffix of `left` that `right` starts with (up to max_chars)."""
+    for size in range(min(len(left), len(right), max_chars), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_adjacent(docs):
+    """
+    Merges chunks that were consecutive in the source (chunk index n and n+1 on the
+    same page and document) into one passage, dropping the splitter's overlap.
+    Returns (passages, merges); each passage keeps the best score of its chunks.
+    """
+    groups = {}
+    for doc in docs:
+        key = (doc.metadata.get("doc_id") or doc.metadata.get("source"), doc.metadata.get("page"))
+        groups.setdefault(key, []).append(doc)
+
+    passages, merges = [], 0
+    for group in groups.values():
+        group.sort(key=_position)
+        current = None
+        for doc in group:
+            index = _chunk_index(doc)
+            if current is not None and index is not None and current["last_index"] == index - 1:
+                # The splitter repeats up to CHUNK_OVERLAP characters (more when snapping to separators)
+                cut = _overlap(current["text"], doc.page_content, 2 * config.CHUNK_OVERLAP)
+                current["text"] += ("" if cut else "\n") + doc.page_content[cut:]
+                current["last_index"] = index
+                current["score"] = max(current["score"], _score(doc))
+                merges += 1
+                continue
+            if current is not None:
+                passages.append(current)
+            current = {"doc": doc, "text": doc.page_content, "last_index": index, "score": _score(doc)}
+        if current is not None:
+            passages.append(current)
+    return passages, merges
+
+
+def _sentences(text):
+    return [s for s in _SENTENCE_BREAK.split(text) if s]
+
+
+def _normalize(sentence):
+    return re.sub(r"\s+", " ", sentence.lower()).strip()
+
+
+def pack_context(docs, prompt_type=None):
+    """
+    Returns (packed Documents, report). The packed documents replace the reranked
+    ones for both the prompt and the returned sources; the report holds the token
+    counts before and after packing.
+    """
+    budget = token_budget(prompt_type)
+    tokens_before = sum(estimate_tokens(doc.page_content) for doc in docs)
+    passages, merges = merge_adjacent(docs)
+    passages.sort(key=lambda p: p["score"], reverse=True)
+
+    seen, kept, used, removed_sentences = set(), [], 0, 0
+    for passage in passages:
+        sentences, own = [], set()
+        for sentence in _sentences(passage["text"]):
+            key = _normalize(sentence)
+            if len(key) >= MIN_DEDUP_SENTENCE_CHARS:
+                if key in seen or key in own:
+                    removed_sentences += 1
+                    continue
+                own.add(key)
+            sentences.append((sentence, key))
+        if not sentences:
+            continue
+
+        text = "".join(sentence for sentence, _ in sentences).strip()
+        if used + estimate_tokens(text) > budget:
+            # Fill the remaining budget with the passage's leading sentences
+            remaining, count = budget - used, 0
+            while count < len(sentences) and \
+                    estimate_tokens("".join(sentence for sentence, _ in sentences[:count + 1])) <= remaining:
+                count += 1
+            sentences = sentences[:count]
+            text = "".join(sentence for sentence, _ in sentences).strip()
+            if estimate_tokens(text) < MIN_PARTIAL_PASSAGE_TOKENS:
+                continue
+
+        seen.update(key for _, key in sentences if len(key) >= MIN_DEDUP_SENTENCE_CHARS)
+        kept.append((passage, text))
+        used += estimate_tokens(text)
+        if used >= budget:
+            break
+
+    if config.CONTEXT_ORDER == "document":
+        kept.sort(key=lambda item: _position(item[0]["doc"]))
+
+    packed = [
+        Document(page_content=text, metadata={**passage["doc"].metadata, "packed_score": passage["score"]})
+        for passage, text in kept
+    ]
+    report = {
+        "budget_tokens": budget,
+        "tokens_before": tokens_before,
+        "tokens_after": used,
+        "tokens_saved": max(0, tokens_before - used),
+        "chunks_in": len(docs),
+        "passages_out": len(packed),
+        "chunks_merged": merges,
+        "duplicate_sentences_removed": removed_sentences,
+    }
+    return packed, report
@@ -0,0 +1,201 @@
+# backend/corpus.py
+# Corpus mode: every judgment's chunks live in a small, fixed set of shared "shard"
+# collections instead of a collection per document, tagged with per-document metadata
+# (doc_id, court, year, case_number). Questions about one document search its shard
+# filtered by doc_id; one ANN search per shard covers the whole corpus.
+
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import config
+from chroma_client import get_client
+from inference_scheduler import embed_query
+
+_COURT_PATTERNS = [
+    re.compile(r"supreme court of india"),
+    re.compile(r"in the (high court of [a-z .&]+?)(?:\s+at\s+[a-z ]+)?(?:\n|,|$)"),
+    re.compile(r"(?:in the )?(court of (?:the )?[a-z .]*(?:district|sessions|civil|metropolitan)[a-z .]*?)(?:\n|,|$)"),
+    re.compile(r"([a-z ]+ district court)"),
+]
+_CASE_NUMBER = re.compile(
+    r"\b((?:civil|criminal|writ|special leave|s\.?l\.?p\.?|crl\.?|w\.?p\.?)?\s*"
+    r"(?:appeal|petition|application|case|suit|fir|o\.?s\.?|misc\.?)\s*(?:\([a-z.]+\)\s*)?"
+    r"no\.?\s*[:\-]?\s*[0-9][0-9a-z/\-.]*(?:\s+of\s+(?:19|20)\d{2})?)"
+)
+_YEAR = re.compile(r"\b(19[5-9]\d|20\d{2})\b")
+
+
+def extract_case_metadata(text):
+    """
+    Heuristically pulls court, case number and year from the first pages of a judgment.
+    Fields that cannot be found are left out (Chroma metadata cannot hold None).
+    """
+    text = text.lower()
+    metadata = {}
+
+    for pattern in _COURT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            court = match.group(match.lastindex or 0).strip(" .,")
+            metadata["court"] = re.sub(r"\s+", " ", court)
+            break
+
+    match = _CASE_NUMBER.search(text)
+    if match:
+        metadata["case_number"] = re.sub(r"\s+", " ", match.group(1)).strip(" .,")
+
+    # The year in the case number ("... of 2019") is the most reliable; otherwise the first year mentioned
+    year_match = _YEAR.search(metadata.get("case_number", "")) or _YEAR.search(text)
+    if year_match:
+        metadata["year"] = int(year_match.group(1))
+
+    return metadata
+
+
+def shard_name(index):
+    return f"{config.CORPUS_COLLECTION_PREFIX}_{index:02d}"
+
+
+def shard_for(doc_id):
+    """Stable shard assignment by document id."""
+    return int(hashlib.sha1(doc_id.encode("utf-8")).hexdigest(), 16) % config.CORPUS_NUM_SHARDS
+
+
+# Shard handles, opened once per process
+_shards = {}
+_shards_lock = threading.Lock()
+
+# Runs the per-shard queries of a search in parallel
+_query_pool = ThreadPoolExecutor(max_workers=config.CORPUS_NUM_SHARDS, thread_name_prefix="corpus")
+
+
+def _shard(index):
+    with _shards_lock:
+        shard = _shards.get(index)
+        if shard is None:
+            shard = _shards[index] = get_client().get_or_create_collection(shard_name(index))
+        return shard
+
+
+def _all_shards():
+    return [_shard(i) for i in range(config.CORPUS_NUM_SHARDS)]
+
+
+def shard_of(doc_id):
+    """The shard collection holding a document's chunks."""
+    return _shard(shard_for(doc_id))
+
+
+def chunk_metadatas(doc_id, case_metadata, metadatas):
+    """Chunk metadata as stored in the shard: tagged with the document id and its case metadata."""
+    return [{**metadata, **case_metadata, "doc_id": doc_id} for metadata in metadatas]
+
+
+def add_chunks(doc_id, case_metadata, ids, embeddings, documents, metadatas):
+    """Writes already-embedded chunks of one document into its corpus shard."""
+    shard_of(doc_id).upsert(
+        ids=ids,
+        embeddings=embeddings,
+        documents=documents,
+        metadatas=chunk_metadatas(doc_id, case_metadata, metadatas)
+    )
+
+
+def contains_document(doc_id):
+    stored = shard_of(doc_id).get(where={"doc_id": doc_id}, limit=1)
+    return bool(stored["ids"])
+
+
+def remove_document(doc_id):
+    shard_of(doc_id).delete(where={"doc_id": doc_id})
+
+
+def build_where(filters):
+    """
+    Turns request filters into a Chroma `where` clause.
+    Supported keys: court, case_number, year (exact), year_from / year_to (range), exclude_doc_id.
+    """
+    clauses = []
+    filters = filters or {}
+    # Court and case number are stored lowercased by extract_case_metadata
+    for key in ("court", "case_number"):
+        if filters.get(key):
+            clauses.append({key: str(filters[key]).lower()})
+    if filters.get("doc_id"):
+        clauses.append({"doc_id": filters["doc_id"]})
+    if filters.get("year"):
+        clauses.append({"year": int(filters["year"])})
+    if filters.get("year_from"):
+        clauses.append({"year": {"$gte": int(filters["year_from"])}})
+    if filters.get("year_to"):
+        clauses.append({"year": {"$lte": int(filters["year_to"])}})
+    if filters.get("exclude_doc_id"):
+        clauses.append({"doc_id": {"$ne": filters["exclude_doc_id"]}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _query_shards(query_embedding, n_results, where):
+    """Runs the same ANN query against every shard in parallel and returns the merged hits, nearest first."""
+    def query(shard):
+        count = shard.count()
+        if count == 0:
+            return []
+        result = shard.query(
+            query_embeddings=[query_embedding],
+            n_results=min(n_results, count),
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        return list(zip(result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0]))
+
+    hits = [hit for shard_hits in _query_pool.map(query, _all_shards()) for hit in shard_hits]
+    hits.sort(key=lambda hit: hit[3])
+    return hits
+
+
+def search(question, k=10, filters=None):
+    """Searches chunks across the whole corpus, optionally filtered by court/year/case number."""
+    query_embedding = embed_query(question)
+    hits = _query_shards(query_embedding, k, build_where(filters))[:k]
+    return [
+        {"chunk_id": chunk_id, "content": text, "distance": distance,
+         "doc_id": metadata.get("doc_id"), "page": metadata.get("page", "N/A"),
+         "court": metadata.get("court"), "year": metadata.get("year"), "case_number": metadata.get("case_number")}
+        for chunk_id, text, metadata, distance in hits
+    ]
+
+
+def find_similar_documents(doc_id, k=5, filters=None):
+    """
+    Finds the judgments closest to `doc_id`: the document's chunk embeddings are
+    averaged into one vector and searched once per shard, excluding the document itself.
+    """
+    stored = shard_of(doc_id).get(where={"doc_id": doc_id}, include=["embeddings"])
+    if not len(stored["ids"]):
+        raise KeyError(f"Document '{doc_id}' is not in the corpus.")
+
+    centroid = np.mean(np.asarray(stored["embeddings"], dtype=np.float32), axis=0)
+    centroid /= (np.linalg.norm(centroid) or 1.0)
+
+    where = build_where({**(filters or {}), "exclude_doc_id": doc_id})
+    # Several chunks per document come back, so over-fetch before grouping by document
+    hits = _query_shards(centroid.tolist(), k * config.CORPUS_CHUNKS_PER_DOC_HIT, where)
+
+    documents = {}
+    for _, text, metadata, distance in hits:
+        other = metadata.get("doc_id")
+        if other in documents:
+            documents[other]["matching_chunks"] += 1
+            continue
+        documents[other] = {
+            "doc_id": other, "distance": distance, "matching_chunks": 1,
+            "court": metadata.get("court"), "year": metadata.get("year"),
+            "case_number": metadata.get("case_number"), "best_passage": text,
+        }
+    return sorted(documents.values(), key=lambda d: d["distance"])[:k]
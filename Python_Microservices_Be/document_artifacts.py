@@ -0,0 +1,273 @@
+# backend/document_artifacts.py
+# Whole-document answers for the specialized prompt types (case summary, key
+# entities, risk analysis), computed once per document in the background by
+# map-reduce over all of its chunks and stored as JSON next to the collection.
+# Each artifact carries a fingerprint of its recipe (prompt template, map/reduce
+# prompts, LLM model); a stale or missing artifact is rebuilt in the background
+# while the request falls back to the normal RAG path.
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.prompts import ChatPromptTemplate
+
+import config
+import corpus
+from chain_handler import chunk_text, get_prompt_template
+from chroma_client import get_client
+from llm_gateway import BACKGROUND
+from llm_interface import get_llm
+from prompt_manager import load_prompt_templates
+from telemetry import trace, span, estimate_tokens, get_logger, EVENTS
+
+log = get_logger(__name__)
+
+# Bump when the build procedure changes in a way the prompts below do not show
+ARTIFACT_VERSION = 1
+
+MAP_PROMPT = ChatPromptTemplate.from_template(
+    "EXCERPT (pages {pages}) OF A COURT JUDGMENT:\n---\n{text}\n---\n\n"
+    "Write compact notes of this excerpt for later analysis, keeping only what the excerpt states:\n"
+    "- facts and procedural history\n"
+    "- legal issues and the provisions cited\n"
+    "- arguments of each party\n"
+    "- findings and holding of the court\n"
+    "- every named party, judge, counsel, court and institution, with their role\n"
+    "- weaknesses or risks for the petitioner / appellant\n"
+    "Leave out headings with nothing to report."
+)
+
+COLLAPSE_PROMPT = ChatPromptTemplate.from_template(
+    "NOTES FROM CONSECUTIVE PARTS OF A COURT JUDGMENT:\n---\n{text}\n---\n\n"
+    "Merge these notes into one set of compact notes under the same headings. Keep every named "
+    "entity, provision, argument and finding; drop repetition."
+)
+
+# The USER'S REQUEST slot of the specialized templates when answering for the whole document
+DOCUMENT_REQUEST = "Analyse the complete document."
+
+_CHUNK_INDEX = re.compile(r"_(\d+)$")
+
+
+def artifact_path(collection_name, prompt_type):
+    return os.path.join(config.ARTIFACT_DIRECTORY, collection_name, f"{prompt_type}.json")
+
+
+def recipe_fingerprint(prompt_type):
+    """Changes whenever the prompt template, the map/reduce prompts or the model change."""
+    template = load_prompt_templates()[prompt_type]["prompt_template"]
+    recipe = [ARTIFACT_VERSION, config.LLM_MODEL_NAME, template, DOCUMENT_REQUEST,
+              MAP_PROMPT.messages[0].prompt.template, COLLAPSE_PROMPT.messages[0].prompt.template,
+              config.ARTIFACT_MAP_WINDOW_TOKENS, config.ARTIFACT_REDUCE_TOKENS]
+    return hashlib.sha256(json.dumps(recipe).encode("utf-8")).hexdigest()[:16]
+
+
+def load_artifact(collection_name, prompt_type):
+    try:
+        with open(artifact_path(collection_name, prompt_type), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_artifact(collection_name, prompt_type, artifact):
+    path = artifact_path(collection_name, prompt_type)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def delete_artifacts(collection_name):
+    shutil.rmtree(os.path.join(config.ARTIFACT_DIRECTORY, collection_name), ignore_errors=True)
+
+
+def _load_chunks(collection_name):
+    """All chunks of the document in reading order, from its own collection or its corpus shard."""
+    try:
+        collection, where = get_client().get_collection(collection_name), None
+        if collection.count() == 0:
+            raise ValueError(collection_name)
+    except Exception:
+        if not (config.CORPUS_MODE and corpus.contains_document(collection_name)):
+            return []
+        collection = get_client().get_collection(corpus.shard_name(corpus.shard_for(collection_name)))
+        where = {"doc_id": collection_name}
+
+    stored = collection.get(where=where, include=["documents", "metadatas"])
+    chunks = []
+    for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+        match = _CHUNK_INDEX.search(chunk_id)
+        chunks.append((int(match.group(1)) if match else 0, (metadata or {}).get("page", "N/A"), text or ""))
+    chunks.sort(key=lambda chunk: chunk[0])
+    return chunks
+
+
+def _windows(items, max_tokens):
+    """Groups consecutive (pages, text) items into windows of at most ~max_tokens."""
+    windows, current, used = [], [], 0
+    for pages, text in items:
+        tokens = estimate_tokens(text)
+        if current and used + tokens > max_tokens:
+            windows.append(current)
+            current, used = [], 0
+        current.append((pages, text))
+        used += tokens
+    if current:
+        windows.append(current)
+    return windows
+
+
+def _page_span(pages):
+    numbers = [p for p in pages if isinstance(p, int)]
+    # Same page numbering as the other sources (PyMuPDF's, from 0)
+    return f"{min(numbers)}-{max(numbers)}" if numbers else "N/A"
+
+
+def build_notes(chunks):
+    """Map step over all chunks, then collapse the notes until they fit the reduce budget."""
+    # Background priority: interactive asks get the LLM first
+    llm = get_llm(priority=BACKGROUND)
+    items = [([page], text) for _, page, text in chunks]
+    notes = []
+    for window in _windows(items, config.ARTIFACT_MAP_WINDOW_TOKENS):
+        pages = [p for window_pages, _ in window for p in window_pages]
+        messages = MAP_PROMPT.format_messages(pages=_page_span(pages), text="\n".join(text for _, text in window))
+        notes.append((pages, chunk_text(llm.invoke(messages))))
+
+    while len(notes) > 1 and sum(estimate_tokens(text) for _, text in notes) > config.ARTIFACT_REDUCE_TOKENS:
+        windows = _windows(notes, config.ARTIFACT_REDUCE_TOKENS)
+        if len(windows) == len(notes):
+            # Every note fills a window on its own; merge pairwise so the loop terminates
+            windows = [notes[i:i + 2] for i in range(0, len(notes), 2)]
+        collapsed = []
+        for window in windows:
+            pages = [p for window_pages, _ in window for p in window_pages]
+            text = "\n\n".join(f"[pages {_page_span(p)}]\n{t}" for p, t in window)
+            collapsed.append((pages, chunk_text(llm.invoke(COLLAPSE_PROMPT.format_messages(text=text)))))
+        notes = collapsed
+    return "\n\n".join(f"[pages {_page_span(pages)}]\n{text}" for pages, text in notes)
+
+
+class ArtifactBuilder:
+    """Builds artifacts on a small background pool; at most one build per document at a time."""
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="artifacts")
+        self._lock = threading.Lock()
+        self._building = set()
+        self._rebuild = set()  # Forced rebuilds requested while a build of the document was running
+
+    def is_building(self, collection_name):
+        with self._lock:
+            return collection_name in self._building
+
+    def schedule(self, collection_name, force=False):
+        """
+        Queues a build of every stale or missing artifact of the document. Returns False if one is
+        running; a forced build then runs again once it finishes, since it may have read older chunks.
+        """
+        with self._lock:
+            if collection_name in self._building:
+                if force:
+                    self._rebuild.add(collection_name)
+                return False
+            self._building.add(collection_name)
+        self._executor.submit(self._build, collection_name, force)
+        return True
+
+    def _build(self, collection_name, force):
+        from document_processor import is_collection_indexed
+
+        try:
+            with trace("artifact_build", collection_name=collection_name):
+                if not is_collection_indexed(collection_name):
+                    # Still ingesting (or deleted): notes from part of the chunks would look complete
+                    return
+                pending = [
+                    prompt_type for prompt_type in config.PRECOMPUTED_PROMPT_TYPES
+                    if force or not is_current(load_artifact(collection_name, prompt_type), prompt_type)
+                ]
+                if not pending:
+                    return
+                chunks = _load_chunks(collection_name)
+                if not chunks:
+                    return
+
+                started = time.perf_counter()
+                with span("artifact_map"):
+                    notes = build_notes(chunks)
+                pages = [page for _, page, _ in chunks]
+                for prompt_type in pending:
+                    with span("artifact_reduce", prompt_type=prompt_type):
+                        messages = get_prompt_template(prompt_type).format_messages(context=notes, question=DOCUMENT_REQUEST)
+                        answer = chunk_text(get_llm(priority=BACKGROUND).invoke(messages))
+                    _save_artifact(collection_name, prompt_type, {
+                        "prompt_type": prompt_type,
+                        "answer": answer,
+                        "sources": [{"content": f"Generated from the whole document ({len(chunks)} chunks).",
+                                     "page": _page_span(pages)}],
+                        "fingerprint": recipe_fingerprint(prompt_type),
+                        "chunks": len(chunks),
+                        "built_at": time.time(),
+                        "build_seconds": round(time.perf_counter() - started, 2),
+                    })
+                    EVENTS.inc(event="artifact_built")
+        except Exception:
+            log.exception("Building the artifacts of '%s' failed.", collection_name)
+            EVENTS.inc(event="artifact_build_failed")
+        finally:
+            with self._lock:
+                rebuild = collection_name in self._rebuild
+                self._rebuild.discard(collection_name)
+                if not rebuild:
+                    self._building.discard(collection_name)
+            if rebuild:
+                self._executor.submit(self._build, collection_name, True)
+
+
+def is_current(artifact, prompt_type):
+    return artifact is not None and artifact.get("fingerprint") == recipe_fingerprint(prompt_type)
+
+
+def get_precomputed(collection_name, prompt_type):
+    """
+    The stored answer for a whole-document prompt_type, or None (caller falls back to RAG).
+    Missing or stale artifacts of indexed documents are (re)built in the background when
+    PRECOMPUTE_ARTIFACTS is on; ingestion schedules the build itself once the document is complete.
+    """
+    from document_processor import is_collection_indexed
+
+    if prompt_type not in config.PRECOMPUTED_PROMPT_TYPES:
+        return None
+    artifact = load_artifact(collection_name, prompt_type)
+    if is_current(artifact, prompt_type):
+        EVENTS.inc(event="artifact_hit")
+        return artifact
+    EVENTS.inc(event="artifact_stale" if artifact else "artifact_missing")
+    if config.PRECOMPUTE_ARTIFACTS and is_collection_indexed(collection_name):
+        artifact_builder.schedule(collection_name)
+    return None
+
+
+def artifact_status(collection_name):
+    """Per prompt type: 'ready', 'stale' or 'missing', plus whether a build is running."""
+    status = {}
+    for prompt_type in config.PRECOMPUTED_PROMPT_TYPES:
+        artifact = load_artifact(collection_name, prompt_type)
+        status[prompt_type] = {
+            "state": "ready" if is_current(artifact, prompt_type) else ("stale" if artifact else "missing"),
+            "built_at": artifact.get("built_at") if artifact else None,
+        }
+    return {"collection_name": collection_name, "building": artifact_builder.is_building(collection_name),
+            "artifacts": status}
+
+
+# The process-wide background builder
+artifact_builder = ArtifactBuilder(max_workers=config.ARTIFACT_BUILD_WORKERS)
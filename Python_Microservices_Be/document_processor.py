@@ -2,50 +2,193 @@
 
 import os
 import hashlib
-from langchain_community.document_loaders import PyMuPDFLoader
+import json
+import time
+from itertools import chain
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
-from langchain_community.vectorstores import Chroma
 
 import config
+from model_registry import model_registry, EMBEDDER
+from chroma_client import get_client, forget_vector_store
+from pdf_extraction import iter_pages, get_page_count, extract_page_range
+from lexical_index import BM25Index, save_index, delete_index
+from document_artifacts import delete_artifacts
+from answer_cache import answer_cache
+from embedding_cache import embed_documents
+import corpus
+from telemetry import get_logger
+
+log = get_logger(__name__)
+
+# Read size used when hashing uploaded files
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Where a document's chunks live, as recorded in its completion marker
+CORPUS_STORE = "corpus"  # Its corpus shard, tagged with doc_id (CORPUS_MODE)
+COLLECTION_STORE = "collection"  # A collection of its own (legacy layout)
 
 def generate_collection_name(filepath):
-    """Generates a collection name from the PDF file path."""
-    # We use a hash of the filename to create a unique and valid collection name
-    filename = os.path.basename(filepath)
-    hash_object = hashlib.sha256(filename.encode())
-    return f"legal_case_{hash_object.hexdigest()[:10]}"
+    """Generates a collection name from the contents of the PDF file."""
+    # We hash the file bytes (not the filename), so identical documents map to the
+    # same collection and different documents with the same name do not collide
+    hash_object = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            hash_object.update(block)
+    return f"legal_case_{hash_object.hexdigest()[:16]}"
+
+
+def _marker_path(collection_name):
+    return os.path.join(config.INDEXED_DOCUMENTS_DIRECTORY, f"{collection_name}.json")
+
+
+def current_store():
+    return CORPUS_STORE if config.CORPUS_MODE else COLLECTION_STORE
 
 
-def load_and_embed_pdf(filepath, collection_name):
+def mark_indexed(collection_name, chunks, store):
+    """Records that every chunk of the document is written to `store`. Each ingestion path calls this last."""
+    os.makedirs(config.INDEXED_DOCUMENTS_DIRECTORY, exist_ok=True)
+    path = _marker_path(collection_name)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"collection_name": collection_name, "chunks": chunks, "store": store,
+                   "indexed_at": time.time()}, f)
+    os.replace(path + ".tmp", path)
+
+
+def indexed_document(collection_name):
+    """The document's completion marker ({"chunks", "store", ...}), or None if it is not indexed."""
+    try:
+        with open(_marker_path(collection_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_collection_indexed(collection_name):
     """
-    Loads a PDF, splits it into chunks, and embeds them into a Chroma vector store.
+    True once ingestion of the document completed (its marker exists). A collection
+    left partially written by an interrupted ingestion does not count as indexed.
     """
-    # 1. Load the document
-    loader = PyMuPDFLoader(filepath)
-    documents = loader.load()
+    return os.path.exists(_marker_path(collection_name))
+
+
+def delete_collection(collection_name):
+    """Removes a collection and its vectors, ignoring collections that do not exist."""
+    # The marker goes first, so a half-deleted document is never reported as indexed
+    try:
+        os.remove(_marker_path(collection_name))
+    except FileNotFoundError:
+        pass
+    try:
+        get_client().delete_collection(collection_name)
+    except Exception:
+        pass
+    forget_vector_store(collection_name)
+    delete_index(collection_name)
+    delete_artifacts(collection_name)
+    answer_cache.invalidate_collection(collection_name)
+    if config.CORPUS_MODE:
+        corpus.remove_document(collection_name)
+
 
-    # 2. Split the document into chunks
+def _clean_metadata(metadata):
+    """Keeps only the scalar, non-null metadata values Chroma can store."""
+    return {k: v for k, v in metadata.items() if isinstance(v, (str, int, float, bool))}
+
+
+def _report(progress_callback, stage, done=0, total=0):
+    if progress_callback is not None:
+        progress_callback(stage, done, total)
+
+
+def load_and_embed_pdf(filepath, collection_name, progress_callback=None, prefetched_pages=None, page_count=None):
+    """
+    Loads a PDF, splits it into chunks, and embeds them into Chroma: into the document's
+    corpus shard in CORPUS_MODE, otherwise into a collection of its own. Returns the
+    number of chunks written; 0 if the document is already indexed, so the same content
+    is never parsed, embedded or appended twice.
+    progress_callback(stage, chunks_done, chunks_total) is called as ingestion moves
+    through the 'parsing', 'embedding' and 'persisting' stages.
+    prefetched_pages: leading [(page_number, text), ...] already extracted during
+    validation (see validator_pdf.extract_and_validate); they are not parsed again.
+    page_count: the document's page count when already known, also from validation.
+    """
+    if is_collection_indexed(collection_name):
+        log.info("Collection '%s' is already indexed, skipping '%s'.", collection_name, os.path.basename(filepath))
+        return 0
+
+    # 1. Stream pages from the parallel extractor and split each one as it arrives
+    _report(progress_callback, "parsing")
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=config.CHUNK_SIZE,
         chunk_overlap=config.CHUNK_OVERLAP
     )
-    docs = text_splitter.split_documents(documents)
+    total_pages = get_page_count(filepath) if page_count is None else page_count
 
-    # 3. Initialize the embedding model
-    embeddings = HuggingFaceBgeEmbeddings(
-        model_name=config.EMBEDDING_MODEL_NAME,
-        model_kwargs=config.EMBEDDING_MODEL_KWARGS,
-        encode_kwargs=config.EMBEDDING_ENCODE_KWARGS
-    )
+    # 2. Embed and persist fixed-size batches as soon as they fill up, so peak memory
+    # is bounded by the batch size and extraction overlaps with embedding.
+    # Deterministic ids make a retried ingestion overwrite instead of duplicate.
+    collection = None if config.CORPUS_MODE else get_client().get_or_create_collection(collection_name)
+    batch_size = config.EMBED_BATCH_SIZE
+    lexical_index = BM25Index()
+    prefetched_pages = prefetched_pages or []
+    case_metadata = {}
+    if config.CORPUS_MODE:
+        # Court / year / case number for the shared corpus index come from the first pages
+        if not prefetched_pages:
+            prefetched_pages = extract_page_range(filepath, 0, config.CORPUS_METADATA_PAGES)
+        case_metadata = corpus.extract_case_metadata("\n".join(text for _, text in prefetched_pages))
+    pending = []
+    chunks_done = 0
+    chunks_seen = 0
 
-    # 4. Create and persist the vector store
-    vector_store = Chroma.from_documents(
-        docs,
-        embeddings,
-        collection_name=collection_name,
-        persist_directory=config.CHROMA_PERSIST_DIRECTORY
-    )
-    
-    print(f"Successfully processed and embedded '{os.path.basename(filepath)}' into collection '{collection_name}'.")
-    return vector_store
\ No newline at end of file
+    with model_registry.use(EMBEDDER) as embeddings:
+        def flush(batch):
+            nonlocal chunks_done
+            _report(progress_callback, "embedding", chunks_done, chunks_seen)
+            # Only chunks missing from the embedding cache reach the encoder
+            vectors = embed_documents(embeddings, [doc.page_content for doc in batch])
+
+            _report(progress_callback, "persisting", chunks_done, chunks_seen)
+            ids = [f"{collection_name}_{i}" for i in range(chunks_done, chunks_done + len(batch))]
+            if config.CORPUS_MODE:
+                corpus.add_chunks(
+                    collection_name, case_metadata, ids, vectors,
+                    [doc.page_content for doc in batch],
+                    [_clean_metadata(doc.metadata) for doc in batch]
+                )
+            else:
+                collection.upsert(
+                    ids=ids,
+                    embeddings=vectors,
+                    documents=[doc.page_content for doc in batch],
+                    metadatas=[_clean_metadata(doc.metadata) for doc in batch]
+                )
+            for chunk_id, doc in zip(ids, batch):
+                lexical_index.add(chunk_id, doc.page_content)
+            chunks_done += len(batch)
+
+        pages = chain(prefetched_pages, iter_pages(filepath, start_page=len(prefetched_pages), page_count=total_pages))
+        for page_number, text in pages:
+            page = Document(
+                page_content=text,
+                metadata={"source": filepath, "file_path": filepath, "page": page_number, "total_pages": total_pages}
+            )
+            chunks = text_splitter.split_documents([page])
+            chunks_seen += len(chunks)
+            pending.extend(chunks)
+            while len(pending) >= batch_size:
+                flush(pending[:batch_size])
+                pending = pending[batch_size:]
+
+        if pending:
+            flush(pending)
+        # The BM25 index sits next to the collection for hybrid retrieval
+        save_index(collection_name, lexical_index)
+        mark_indexed(collection_name, chunks_done, current_store())
+        _report(progress_callback, "persisting", chunks_done, chunks_done)
+
+    log.info("Embedded '%s' into collection '%s' (%d chunks).", os.path.basename(filepath), collection_name, chunks_done)
+    return chunks_done
@@ -0,0 +1,241 @@
+# backend/embedding_cache.py
+# Disk-backed cache of chunk embeddings, keyed by the embedding model and the
+# whitespace-normalized chunk text. Judgments repeat a lot of boilerplate (cause
+# titles, counsel paragraphs, quoted statutes) and re-chunking the corpus yields
+# many identical chunks, so ingestion only sends cache misses to the encoder.
+#
+# Layout per model (EMBEDDING_CACHE_DIRECTORY/<model hash>/):
+#   vectors.f32  memory-mapped float32 [capacity, dim]
+#   keys.bin     memory-mapped 16-byte text hash per slot (all zeros = empty)
+#   used.i64     memory-mapped last-use tick per slot, for least-recently-used eviction
+#   header.i64   memory-mapped [generation, clock]; the generation changes with every write
+#   meta.json    model, dim and capacity; a different model starts a fresh cache
+# Several processes (server workers, bulk_ingest.py) share the cache: lookups take a
+# shared file lock, writes an exclusive one. Each process keeps a slot index in memory
+# and rebuilds it from keys.bin when another process has written since. An existing
+# cache keeps its capacity; delete its directory to apply a new EMBEDDING_CACHE_MAX_MB.
+
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+import config
+from telemetry import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single-process use only
+    fcntl = None
+SHARED = fcntl.LOCK_SH if fcntl is not None else None
+EXCLUSIVE = fcntl.LOCK_EX if fcntl is not None else None
+
+KEY_BYTES = 16
+# Share of the slots freed at once when the cache is full, so eviction is not run per chunk
+EVICTION_FRACTION = 0.05
+GENERATION, CLOCK = 0, 1
+
+LOOKUPS = metrics.counter(
+    "legalai_embedding_cache_lookups_total", "Chunk embedding cache lookups by result.", ["result"])
+EVICTIONS = metrics.counter(
+    "legalai_embedding_cache_evictions_total", "Chunk embeddings evicted from the disk cache.")
+
+
+def model_namespace():
+    """Identifies the vectors the current embedder produces (model, backend, quantization, normalization)."""
+    backend = config.EMBEDDER_BACKEND
+    if backend == "onnx":
+        backend += f"-{config.ONNX_QUANTIZATION or 'fp32'}"
+    normalize = config.EMBEDDING_ENCODE_KWARGS.get("normalize_embeddings", False)
+    return f"{config.EMBEDDING_MODEL_NAME}|{backend}|normalize={normalize}"
+
+
+def text_key(text):
+    normalized = re.sub(r"\s+", " ", text).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).digest()[:KEY_BYTES]
+
+
+class EmbeddingCache:
+    def __init__(self, directory, namespace, max_bytes):
+        self.namespace = namespace
+        self.directory = os.path.join(directory, hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:12])
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._vectors = self._keys = self._used = self._header = None
+        self._index = {}  # text key -> slot
+        self._free = []
+        self._generation = None  # Generation the index was built at
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path("meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @contextmanager
+    def _file_lock(self, mode):
+        """Holds the cross-process lock (SHARED or EXCLUSIVE) for the duration of the block."""
+        if self._lock_file is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _ensure_open(self, dim=None):
+        """Maps the cache files; with dim=None only an existing cache is opened. Caller holds the lock."""
+        if self._vectors is not None:
+            return True
+        meta = self._read_meta()
+        if (meta is None or meta.get("namespace") != self.namespace) and dim is None:
+            return False
+
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is not None and self._lock_file is None:
+            self._lock_file = open(self._path("lock"), "a")
+        with self._file_lock(EXCLUSIVE):
+            # Another process may have created the cache since the check above
+            meta = self._read_meta()
+            fresh = meta is None or meta.get("namespace") != self.namespace
+            if fresh:
+                capacity = max(1, self.max_bytes // (dim * 4 + KEY_BYTES + 8))
+                meta = {"namespace": self.namespace, "dim": dim, "capacity": capacity}
+            mode = "w+" if fresh else "r+"
+            shape = (meta["capacity"],)
+            self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode=mode, shape=shape + (meta["dim"],))
+            self._keys = np.memmap(self._path("keys.bin"), dtype=np.uint8, mode=mode, shape=shape + (KEY_BYTES,))
+            self._used = np.memmap(self._path("used.i64"), dtype=np.int64, mode=mode, shape=shape)
+            # Caches written before the header existed get a fresh one
+            header_mode = "r+" if os.path.exists(self._path("header.i64")) and not fresh else "w+"
+            self._header = np.memmap(self._path("header.i64"), dtype=np.int64, mode=header_mode, shape=(2,))
+            if header_mode == "w+" and not fresh:
+                self._header[CLOCK] = int(self._used.max())
+            if fresh:
+                with open(self._path("meta.json.tmp"), "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+                os.replace(self._path("meta.json.tmp"), self._path("meta.json"))
+        return True
+
+    def _sync(self):
+        """Rebuilds the slot index if another process wrote since it was built. Caller holds both locks."""
+        generation = int(self._header[GENERATION])
+        if generation == self._generation:
+            return
+        occupied = self._keys.any(axis=1)
+        self._index = {self._keys[slot].tobytes(): int(slot) for slot in np.flatnonzero(occupied)}
+        self._free = np.flatnonzero(~occupied)[::-1].tolist()
+        self._generation = generation
+
+    def _touch(self, slot):
+        # The shared clock is bumped without an exclusive lock; a lost tick only blurs the LRU order
+        self._header[CLOCK] += 1
+        self._used[slot] = self._header[CLOCK]
+
+    def _evict(self, count):
+        occupied = np.fromiter(self._index.values(), dtype=np.int64, count=len(self._index))
+        if len(occupied) > count:
+            occupied = occupied[np.argpartition(self._used[occupied], count)[:count]]
+        for slot in occupied.tolist():
+            del self._index[self._keys[slot].tobytes()]
+            self._keys[slot] = 0
+            self._free.append(slot)
+        EVICTIONS.inc(len(occupied))
+
+    def _store(self, keys, vectors):
+        with self._lock:
+            if not self._ensure_open(len(vectors[0])) or self._vectors.shape[1] != len(vectors[0]):
+                return
+            with self._file_lock(EXCLUSIVE):
+                self._sync()
+                for key, vector in zip(keys, vectors):
+                    if key in self._index:
+                        continue
+                    if not self._free:
+                        self._evict(max(1, int(len(self._vectors) * EVICTION_FRACTION)))
+                    slot = self._free.pop()
+                    # Vector before key: a slot only becomes visible once its vector is written
+                    self._vectors[slot] = vector
+                    self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                    self._index[key] = slot
+                    self._touch(slot)
+                for array in (self._vectors, self._keys, self._used):
+                    array.flush()
+                # Other processes rebuild their index on their next access
+                self._header[GENERATION] += 1
+                self._header.flush()
+                self._generation = int(self._header[GENERATION])
+
+    def embed_documents(self, embeddings, texts):
+        """embeddings.embed_documents(texts), computing only texts not cached (or repeated in this batch)."""
+        keys = [text_key(text) for text in texts]
+        vectors = [None] * len(texts)
+        with self._lock:
+            if self._ensure_open():
+                with self._file_lock(SHARED):
+                    self._sync()
+                    for i, key in enumerate(keys):
+                        slot = self._index.get(key)
+                        if slot is not None:
+                            vectors[i] = self._vectors[slot].tolist()
+                            self._touch(slot)
+
+        missing = {}  # key -> positions needing that vector
+        for i, key in enumerate(keys):
+            if vectors[i] is None:
+                missing.setdefault(key, []).append(i)
+        if missing:
+            computed = embeddings.embed_documents([texts[positions[0]] for positions in missing.values()])
+            for positions, vector in zip(missing.values(), computed):
+                for i in positions:
+                    vectors[i] = vector
+            self._store(list(missing), computed)
+
+        hits = len(texts) - len(missing)
+        LOOKUPS.inc(hits, result="hit")
+        LOOKUPS.inc(len(missing), result="miss")
+        with self._lock:
+            self.hits += hits
+            self.misses += len(missing)
+        return vectors
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": config.EMBEDDING_CACHE_ENABLED,
+                "namespace": self.namespace,
+                "entries": len(self._index),
+                "capacity": len(self._vectors) if self._vectors is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def embed_documents(embeddings, texts):
+    """Chunk embeddings through the disk cache (when enabled)."""
+    if not config.EMBEDDING_CACHE_ENABLED or not texts:
+        return embeddings.embed_documents(texts)
+    return embedding_cache.embed_documents(embeddings, texts)
+
+
+# The process-wide cache for the configured embedder
+embedding_cache = EmbeddingCache(
+    config.EMBEDDING_CACHE_DIRECTORY, model_namespace(), config.EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+)
+
+metrics.gauge_callback("legalai_embedding_cache_entries", "Chunk embeddings held in the disk cache.",
+                       lambda: embedding_cache.stats()["entries"])
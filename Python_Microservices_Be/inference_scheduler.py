@@ -0,0 +1,162 @@
+# backend/inference_scheduler.py
+# Micro-batching for request-time inference. Concurrent requests each hand their
+# few query embeddings / rerank pairs to a shared batcher; its worker thread waits
+# up to `max_wait_ms` for other requests, runs them as one batched model call and
+# hands each caller back its slice of the results.
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+from model_registry import model_registry, EMBEDDER
+
+
+class _Request:
+    __slots__ = ("model", "items", "future", "enqueued_at")
+
+    def __init__(self, model, items):
+        self.model = model
+        self.items = items
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Groups work from concurrent callers into batched calls of `batch_fn(model, items)`,
+    which must return one result per item. A group closes once it holds `max_batch`
+    items or the first request has waited `max_wait_ms`. Requests for different model
+    objects are never mixed. With `enabled=False` each call runs directly in the caller's thread.
+    """
+
+    def __init__(self, name, batch_fn, max_batch, max_wait_ms, enabled=True):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.enabled = enabled
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "items": 0, "batches": 0, "max_batch_items": 0,
+                       "queue_wait_ms_total": 0.0, "compute_ms_total": 0.0}
+
+    def submit(self, model, items):
+        """Blocks until the items have been processed and returns their results in order."""
+        items = list(items)
+        if not items:
+            return []
+        if not self.enabled:
+            return list(self.batch_fn(model, items))
+        self._ensure_worker()
+        request = _Request(model, items)
+        self._queue.put(request)
+        return request.future.result()
+
+    def _ensure_worker(self):
+        # Re-created after a fork: threads do not survive into the child process
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker is None or self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch, size = [first], len(first.items)
+        deadline = time.perf_counter() + self.max_wait_s
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _run(self):
+        while True:
+            groups = {}
+            for request in self._collect():
+                groups.setdefault(id(request.model), []).append(request)
+            for requests in groups.values():
+                self._execute(requests)
+
+    def _execute(self, requests):
+        items = [item for request in requests for item in request.items]
+        started = time.perf_counter()
+        try:
+            results = list(self.batch_fn(requests[0].model, items))
+            if len(results) != len(items):
+                raise RuntimeError(f"Batcher '{self.name}' got {len(results)} results for {len(items)} items.")
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        finished = time.perf_counter()
+
+        offset = 0
+        for request in requests:
+            request.future.set_result(results[offset:offset + len(request.items)])
+            offset += len(request.items)
+
+        with self._stats_lock:
+            self._stats["requests"] += len(requests)
+            self._stats["items"] += len(items)
+            self._stats["batches"] += 1
+            self._stats["max_batch_items"] = max(self._stats["max_batch_items"], len(items))
+            self._stats["queue_wait_ms_total"] += sum(started - r.enqueued_at for r in requests) * 1000
+            self._stats["compute_ms_total"] += (finished - started) * 1000
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        return {
+            "enabled": self.enabled,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "requests": s["requests"],
+            "items": s["items"],
+            "batches": s["batches"],
+            "avg_batch_items": round(s["items"] / s["batches"], 2) if s["batches"] else 0.0,
+            "avg_requests_per_batch": round(s["requests"] / s["batches"], 2) if s["batches"] else 0.0,
+            "max_batch_items": s["max_batch_items"],
+            "avg_queue_wait_ms": round(s["queue_wait_ms_total"] / s["requests"], 2) if s["requests"] else 0.0,
+            "avg_compute_ms": round(s["compute_ms_total"] / s["batches"], 2) if s["batches"] else 0.0,
+        }
+
+
+def _embed_texts(embeddings, texts):
+    return embeddings.embed_documents(texts)
+
+
+# Query-time embeddings (retrieval, answer cache, corpus search); ingestion embeds its own large batches
+embedding_batcher = MicroBatcher(
+    "embed",
+    _embed_texts,
+    max_batch=config.EMBED_MICRO_BATCH_MAX,
+    max_wait_ms=config.INFERENCE_MAX_WAIT_MS,
+    enabled=config.INFERENCE_MICRO_BATCHING
+)
+
+
+def embed_queries(queries, embeddings=None):
+    """Embeds search queries through the shared batcher (same vectors as embed_query)."""
+    embeddings = embeddings if embeddings is not None else model_registry.get(EMBEDDER)
+    instruction = getattr(embeddings, "query_instruction", "")
+    return embedding_batcher.submit(embeddings, [instruction + q for q in queries])
+
+
+def embed_query(query, embeddings=None):
+    return embed_queries([query], embeddings)[0]
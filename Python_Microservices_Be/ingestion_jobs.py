@@ -0,0 +1,266 @@
+# backend/ingestion_jobs.py
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from answer_cache import answer_cache
+from document_artifacts import artifact_builder
+from document_processor import load_and_embed_pdf, delete_collection, is_collection_indexed
+from validator_pdf import extract_and_validate
+from telemetry import span, get_logger, EVENTS
+
+log = get_logger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: jobs of other processes cannot be told apart from dead ones
+    fcntl = None
+
+# Job states, in the order a successful job goes through them
+QUEUED = "queued"
+VALIDATING = "validating"
+PARSING = "parsing"
+EMBEDDING = "embedding"
+PERSISTING = "persisting"
+DONE = "done"
+FAILED = "failed"
+
+INTERRUPTED_ERROR = "Ingestion was interrupted by a server restart. Please upload the file again."
+
+
+class QueueFullError(Exception):
+    """Raised when too many ingestion jobs are already queued or running."""
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class IngestionJobQueue:
+    """
+    Runs PDF ingestion (validate -> parse -> embed -> persist) on a bounded
+    background pool and keeps per-job progress for status polling.
+    """
+
+    def __init__(self, max_workers, max_pending, history, job_directory):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._job_directory = job_directory
+        self._max_pending = max_pending
+        self._history = history
+        self._lock = threading.Lock()
+        self._jobs = {}  # job_id -> job dict, in submission order
+        # Every job records the process that runs it. The process holds an exclusive
+        # lock on its owner file while it lives, so a job whose owner's lock can be
+        # taken was left unfinished by a process that died.
+        self._owner = uuid.uuid4().hex
+        self._owner_lock = None
+
+    def _active_jobs(self):
+        return [job for job in self._jobs.values() if job["status"] not in (DONE, FAILED)]
+
+    def _prune(self):
+        """Forgets the oldest finished jobs beyond the history limit."""
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self._history)]:
+            del self._jobs[job_id]
+            try:
+                os.remove(self._snapshot_path(job_id))
+            except OSError:
+                pass
+
+    # Snapshots on disk let any server worker answer a status poll, not just
+    # the worker that accepted the upload.
+    def _snapshot_path(self, job_id):
+        return os.path.join(self._job_directory, f"{job_id}.json")
+
+    def _write_snapshot(self, job):
+        os.makedirs(self._job_directory, exist_ok=True)
+        path = self._snapshot_path(job["job_id"])
+        with open(path + ".tmp", "w") as f:
+            json.dump(job, f)
+        os.replace(path + ".tmp", path)
+
+    def _read_snapshot(self, job_id):
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._snapshot_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _owner_path(self, owner):
+        return os.path.join(self._job_directory, "owners", f"{owner}.lock")
+
+    def _hold_owner_lock(self):
+        """Takes this process's owner lock, once. Caller holds self._lock."""
+        if self._owner_lock is not None or fcntl is None:
+            return
+        os.makedirs(os.path.dirname(self._owner_path(self._owner)), exist_ok=True)
+        self._owner_lock = open(self._owner_path(self._owner), "w")
+        fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+
+    def _owner_alive(self, owner):
+        if owner == self._owner:
+            return True
+        if fcntl is None or not owner or not owner.isalnum():
+            return False
+        try:
+            lock_file = open(self._owner_path(owner))
+        except OSError:
+            return False
+        with lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+        _remove_file(self._owner_path(owner))
+        return False
+
+    def recover_interrupted(self):
+        """
+        Fails the jobs a dead server process left unfinished and drops their partial
+        collections, so status polls end and the next upload ingests the document again.
+        Called at startup (see startup.py). Returns the number of jobs recovered.
+        """
+        try:
+            names = os.listdir(self._job_directory)
+        except FileNotFoundError:
+            return 0
+        snapshots = (self._read_snapshot(name[:-len(".json")]) for name in names if name.endswith(".json"))
+        unfinished = [job for job in snapshots if job and job["status"] not in (DONE, FAILED)]
+        orphaned = [job for job in unfinished if not self._owner_alive(job.get("owner"))]
+        # A live job may be ingesting the same document again; its collection stays
+        running = {job["collection_name"] for job in unfinished if job not in orphaned}
+
+        for job in orphaned:
+            collection_name = job["collection_name"]
+            if collection_name not in running and not is_collection_indexed(collection_name):
+                delete_collection(collection_name)
+            job.update(status=FAILED, error=INTERRUPTED_ERROR, finished_at=time.time())
+            self._write_snapshot(job)
+            EVENTS.inc(event="ingest_job_interrupted")
+        return len(orphaned)
+
+    def submit(self, filepath, filename, collection_name):
+        """
+        Queues a file for ingestion and returns its job dict. The queue takes ownership
+        of `filepath` (a path unique to this upload): it is removed when an identical
+        document that is already being ingested returns the existing job instead, or
+        when validation fails. Raises QueueFullError when the queue is at capacity.
+        """
+        with self._lock:
+            active = self._active_jobs()
+            for job in active:
+                if job["collection_name"] == collection_name:
+                    _remove_file(filepath)
+                    return dict(job)
+            if len(active) >= self._max_pending:
+                raise QueueFullError(f"{len(active)} ingestion jobs are already pending.")
+
+            self._hold_owner_lock()
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "owner": self._owner,
+                "filename": filename,
+                "collection_name": collection_name,
+                "status": QUEUED,
+                "chunks_done": 0,
+                "chunks_total": 0,
+                "error": None,
+                "details": None,
+                "created_at": time.time(),
+                "finished_at": None,
+            }
+            self._jobs[job_id] = job
+            self._write_snapshot(job)
+            self._prune()
+
+        self._executor.submit(self._run, job_id, filepath)
+        return dict(job)
+
+    def active_job_for(self, collection_name):
+        """Returns the queued or running job for a collection, or None."""
+        with self._lock:
+            for job in self._active_jobs():
+                if job["collection_name"] == collection_name:
+                    return dict(job)
+        return None
+
+    def get(self, job_id):
+        """Returns a snapshot of the job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        return self._read_snapshot(job_id)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+            self._write_snapshot(self._jobs[job_id])
+
+    def _run(self, job_id, filepath):
+        job = self.get(job_id)
+        ingest_started = False
+        try:
+            self._update(job_id, status=VALIDATING)
+            # The validated leading pages are handed to the splitter, not extracted twice
+            with span("validate"):
+                validation_result, pages, page_count = extract_and_validate(filepath)
+            if not validation_result["is_valid"]:
+                EVENTS.inc(event="validation_failed")
+                _remove_file(filepath)
+                self._update(
+                    job_id,
+                    status=FAILED,
+                    error="File does not appear to be a valid legal document. Please upload a court case, judgment, or similar file.",
+                    details={
+                        "confidence": validation_result['confidence'],
+                        "keywords_matched": validation_result['keywords_matched']
+                    },
+                    finished_at=time.time()
+                )
+                return
+            EVENTS.inc(event="validation_passed")
+
+            def on_progress(stage, done, total):
+                self._update(job_id, status=stage, chunks_done=done, chunks_total=total)
+
+            ingest_started = True
+            with span("ingest"):
+                load_and_embed_pdf(filepath, job["collection_name"], progress_callback=on_progress,
+                                   prefetched_pages=pages, page_count=page_count)
+
+            # Answers cached for an earlier version of this collection are stale now
+            answer_cache.invalidate_collection(job["collection_name"])
+
+            self._update(job_id, status=DONE, finished_at=time.time())
+
+            if config.PRECOMPUTE_ARTIFACTS:
+                # Whole-document answers are built after the job is reported done
+                artifact_builder.schedule(job["collection_name"], force=True)
+        except Exception as e:
+            log.exception("Ingestion job %s for '%s' failed.", job_id, job["collection_name"])
+            if ingest_started:
+                # Drop the partial collection so a retry is not mistaken for an indexed document
+                delete_collection(job["collection_name"])
+            self._update(job_id, status=FAILED, error=f"Failed to process file: {str(e)}", finished_at=time.time())
+
+
+# The process-wide ingestion queue
+ingestion_queue = IngestionJobQueue(
+    max_workers=config.INGEST_MAX_WORKERS,
+    max_pending=config.INGEST_MAX_PENDING,
+    history=config.INGEST_JOB_HISTORY,
+    job_directory=config.INGEST_JOB_DIRECTORY
+)
@@ -0,0 +1,152 @@
+# backend/lexical_index.py
+
+import gzip
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import config
+
+# Keeps citation-style tokens whole ("302", "117/2019", "s.302") in addition to their parts
+_TOKEN = re.compile(r"[a-z0-9]+(?:[/.\-][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with "
+    "what who whom when where why how does did do".split()
+)
+
+
+def tokenize(text):
+    """Lowercased terms for BM25; compound tokens like '117/2019' also yield '117' and '2019'."""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token not in _STOPWORDS:
+            terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in _PART.findall(token) if part not in _STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """A small in-memory inverted index with Okapi BM25 scoring, persisted as gzipped JSON."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunk_ids = []
+        self.doc_lens = []
+        self.postings = {}  # term -> [[doc_index, ...], [term_frequency, ...]]
+
+    def add(self, chunk_id, text):
+        doc_index = len(self.chunk_ids)
+        terms = tokenize(text)
+        self.chunk_ids.append(chunk_id)
+        self.doc_lens.append(len(terms))
+        for term, tf in Counter(terms).items():
+            docs, tfs = self.postings.setdefault(term, [[], []])
+            docs.append(doc_index)
+            tfs.append(tf)
+
+    def search(self, query, k):
+        """Returns up to k (chunk_id, score) pairs, best first."""
+        n = len(self.chunk_ids)
+        if n == 0:
+            return []
+        avgdl = sum(self.doc_lens) / n or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            docs, tfs = posting
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_index, tf in zip(docs, tfs):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_index] / avgdl)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [(self.chunk_ids[i], score) for i, score in best]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "chunk_ids": self.chunk_ids,
+                       "doc_lens": self.doc_lens, "postings": self.postings}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.chunk_ids = data["chunk_ids"]
+        index.doc_lens = data["doc_lens"]
+        index.postings = data["postings"]
+        return index
+
+
+def index_path(collection_name):
+    return os.path.join(config.LEXICAL_INDEX_DIRECTORY, f"{collection_name}.bm25.json.gz")
+
+
+# Recently used indexes, kept in memory
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _remember(collection_name, index):
+    with _cache_lock:
+        _cache[collection_name] = index
+        _cache.move_to_end(collection_name)
+        while len(_cache) > config.LEXICAL_INDEX_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def save_index(collection_name, index):
+    """Persists a freshly built index and makes it the cached one."""
+    index.save(index_path(collection_name))
+    _remember(collection_name, index)
+
+
+def delete_index(collection_name):
+    with _cache_lock:
+        _cache.pop(collection_name, None)
+    try:
+        os.remove(index_path(collection_name))
+    except FileNotFoundError:
+        pass
+
+
+def get_index(collection_name, chroma_collection=None):
+    """
+    Returns the collection's BM25 index. Collections ingested before lexical indexing
+    existed get one built from their stored chunks when `chroma_collection` is given;
+    otherwise None is returned and retrieval stays dense-only.
+    """
+    with _cache_lock:
+        index = _cache.get(collection_name)
+        if index is not None:
+            _cache.move_to_end(collection_name)
+            return index
+
+    path = index_path(collection_name)
+    if os.path.exists(path):
+        index = BM25Index.load(path)
+    elif chroma_collection is not None:
+        stored = chroma_collection.get(include=["documents"])
+        if not stored["ids"]:
+            # Nothing stored (yet): an empty index on disk would hide the chunks added later
+            return None
+        index = BM25Index()
+        for chunk_id, text in zip(stored["ids"], stored["documents"]):
+            index.add(chunk_id, text or "")
+        index.save(path)
+    else:
+        return None
+
+    _remember(collection_name, index)
+    return index
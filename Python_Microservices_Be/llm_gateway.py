@@ -0,0 +1,336 @@
+# backend/llm_gateway.py
+# Every call to Ollama goes through one gateway per process:
+#   - a pooled keep-alive requests.Session instead of a new connection per call,
+#   - single-flight: identical in-flight requests (same endpoint, model and prompt)
+#     share one generation; a caller joining late replays the chunks streamed so far,
+#   - at most LLM_MAX_CONCURRENT generations at once, granted by priority
+#     (INTERACTIVE asks before BACKGROUND work such as document artifact builds),
+#     run on a bounded pool of LLM_MAX_CONCURRENT + LLM_MAX_QUEUED threads,
+#   - retries with backoff for connection errors, timeouts and 429/5xx answers that
+#     happen before the first chunk arrived,
+#   - cancellation: once every caller of a flight has gone (closed stream, disconnected
+#     client) before the end, it leaves the queue or its upstream response is closed.
+# Upstream calls always stream; blocking callers simply wait for the last chunk.
+
+import asyncio
+import hashlib
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+from telemetry import metrics, EVENTS, SECONDS_BUCKETS
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Answers worth retrying (Ollama busy / restarting)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+LLM_QUEUE_SECONDS = metrics.histogram(
+    "legalai_llm_queue_seconds", "Time a generation waited for a gateway slot.", ["priority"], buckets=SECONDS_BUCKETS)
+LLM_REQUESTS = metrics.counter(
+    "legalai_llm_requests_total", "LLM calls by result (ok, error, cancelled, coalesced into an in-flight call).", ["result"])
+
+
+class LLMGatewayError(Exception):
+    """Raised when Ollama fails or keeps failing after the configured retries."""
+
+
+class _RetryableStatus(Exception):
+    pass
+
+
+class _Cancelled(Exception):
+    """Every consumer left the flight before it finished."""
+
+
+class Flight:
+    """One upstream generation and the chunks it produced, shared by every caller of the same request."""
+
+    def __init__(self, key, endpoint, payload, priority):
+        self.key = key
+        self.endpoint = endpoint
+        self.payload = payload
+        self.priority = priority
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.consumers = 0
+        self.cancelled = False
+        self._cond = threading.Condition()
+        self._async_waiters = []  # (loop, future) of async consumers waiting for the next chunk
+
+    def _notify(self):
+        self._cond.notify_all()
+        for loop, future in self._async_waiters:
+            # A consumer whose event loop has gone can no longer be woken
+            if loop.is_closed():
+                continue
+            try:
+                loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+            except RuntimeError:
+                pass  # Closed between the check and the call
+        self._async_waiters = []
+
+    def join(self):
+        """Registers a consumer; False if the flight was already cancelled."""
+        with self._cond:
+            if self.cancelled:
+                return False
+            self.consumers += 1
+            return True
+
+    def leave(self):
+        """Unregisters a consumer. Returns True if it was the last one and the flight is now cancelled."""
+        with self._cond:
+            self.consumers -= 1
+            if self.consumers > 0 or self.done or self.cancelled:
+                return False
+            self.cancelled = True
+            return True
+
+    def append(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._notify()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._notify()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index == len(self.chunks) and not self.done:
+                    self._cond.wait()
+                chunks, done, error = self.chunks[index:], self.done, self.error
+            yield from chunks
+            index += len(chunks)
+            if done and index == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        index = 0
+        while True:
+            with self._cond:
+                chunks, done, error = self.chunks[index:], self.done, self.error
+                waiter = None
+                if not chunks and not done:
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+            if waiter is not None:
+                await waiter
+                continue
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if done and index == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class PrioritySlots:
+    """A counting semaphore that hands free slots to the highest-priority (then oldest) waiter."""
+
+    def __init__(self, size):
+        self.size = size
+        self.active = 0
+        self._waiting = []  # [(seq, flight)]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _first(self):
+        return min(self._waiting, key=lambda entry: (entry[1].priority, entry[0]))
+
+    @contextmanager
+    def acquire(self, flight):
+        with self._cond:
+            entry = (next(self._seq), flight)
+            self._waiting.append(entry)
+            while self.active >= self.size or self._first() is not entry:
+                if flight.cancelled:
+                    self._waiting.remove(entry)
+                    self._cond.notify_all()
+                    raise _Cancelled()
+                self._cond.wait()
+            self._waiting.remove(entry)
+            self.active += 1
+            # The next waiter may be able to take another free slot
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify_all()
+
+    def reprioritize(self):
+        """Wakes waiters after a queued flight's priority was raised or it was cancelled."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def waiting(self):
+        with self._cond:
+            return len(self._waiting)
+
+
+class LLMGateway:
+    def __init__(self, base_url, max_concurrent, max_queued, max_retries, retry_backoff_s, connect_timeout_s,
+                 read_timeout_s):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.retry_backoff_s = retry_backoff_s
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.slots = PrioritySlots(max_concurrent)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(4, 2 * max_concurrent))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._flights = {}
+        self._lock = threading.Lock()
+        # A flight holds its thread while it waits for a slot; flights beyond max_queued wait
+        # for a thread in submission order before they join the priority queue
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent + max_queued, thread_name_prefix="llm-gateway")
+
+    @staticmethod
+    def _key(endpoint, payload):
+        body = json.dumps({"endpoint": endpoint, **payload}, sort_keys=True, default=str)
+        return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+    def submit(self, endpoint, payload, priority=INTERACTIVE):
+        """
+        Returns the Flight for this request as a registered consumer, joining an identical one
+        that is still running. Every submit must be paired with a _leave.
+        """
+        key = self._key(endpoint, payload)
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight.join():
+                LLM_REQUESTS.inc(result="coalesced")
+                if priority < flight.priority:
+                    flight.priority = priority
+                    self.slots.reprioritize()
+                return flight
+            # A cancelled flight still winding down is replaced, not joined
+            flight = self._flights[key] = Flight(key, endpoint, payload, priority)
+            flight.join()
+        self._executor.submit(self._run, flight)
+        return flight
+
+    def _run(self, flight):
+        queued = time.perf_counter()
+        try:
+            with self.slots.acquire(flight):
+                LLM_QUEUE_SECONDS.observe(time.perf_counter() - queued, priority=PRIORITY_NAMES[flight.priority])
+                self._generate(flight)
+            LLM_REQUESTS.inc(result="ok")
+            flight.finish()
+        except _Cancelled:
+            LLM_REQUESTS.inc(result="cancelled")
+            flight.finish(LLMGatewayError("Generation cancelled: every caller left."))
+        except Exception as e:
+            LLM_REQUESTS.inc(result="error")
+            flight.finish(e if isinstance(e, LLMGatewayError) else LLMGatewayError(f"Ollama request failed: {e}"))
+        finally:
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+
+    def _leave(self, flight):
+        if flight.leave():
+            # A cancelled flight may be waiting for a slot
+            self.slots.reprioritize()
+
+    def _generate(self, flight):
+        url = f"{self.base_url}/api/{flight.endpoint}"
+        for attempt in range(self.max_retries + 1):
+            if flight.cancelled:
+                raise _Cancelled()
+            try:
+                with self._session.post(url, json={**flight.payload, "stream": True}, stream=True,
+                                        timeout=self.timeout) as response:
+                    if response.status_code in RETRY_STATUSES:
+                        raise _RetryableStatus(f"HTTP {response.status_code}")
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if flight.cancelled:
+                            # Leaving the block closes the connection, which stops Ollama generating
+                            raise _Cancelled()
+                        if not line:
+                            continue
+                        data = json.loads(line)
+                        if data.get("error"):
+                            raise LLMGatewayError(data["error"])
+                        flight.append(data)
+                        if data.get("done"):
+                            break
+                return
+            except (requests.ConnectionError, requests.Timeout, _RetryableStatus):
+                # Chunks already handed to callers cannot be taken back
+                if flight.chunks or attempt == self.max_retries:
+                    raise
+                EVENTS.inc(event="llm_retry")
+                time.sleep(self.retry_backoff_s * (2 ** attempt))
+
+    # --- Caller API: one parsed Ollama JSON line per chunk ---
+    # Closing a stream early leaves its flight; the last consumer to leave cancels it
+    def stream(self, endpoint, payload, priority=INTERACTIVE):
+        flight = self.submit(endpoint, payload, priority)
+        try:
+            yield from flight
+        finally:
+            self._leave(flight)
+
+    async def astream(self, endpoint, payload, priority=INTERACTIVE):
+        flight = self.submit(endpoint, payload, priority)
+        try:
+            async for chunk in flight:
+                yield chunk
+        finally:
+            self._leave(flight)
+
+    def complete(self, endpoint, payload, priority=INTERACTIVE):
+        """Blocks until the generation is done; returns all chunks."""
+        return list(self.stream(endpoint, payload, priority))
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._flights)
+        return {"in_flight": in_flight, "active": self.slots.active, "waiting": self.slots.waiting(),
+                "max_concurrent": self.slots.size}
+
+
+def chunk_content(chunk):
+    """The text of one streamed /api/chat or /api/generate chunk."""
+    return (chunk.get("message") or {}).get("content") or chunk.get("response") or ""
+
+
+# The process-wide gateway to Ollama
+llm_gateway = LLMGateway(
+    config.OLLAMA_BASE_URL,
+    max_concurrent=config.LLM_MAX_CONCURRENT,
+    max_queued=config.LLM_MAX_QUEUED,
+    max_retries=config.LLM_MAX_RETRIES,
+    retry_backoff_s=config.LLM_RETRY_BACKOFF_SECONDS,
+    connect_timeout_s=config.LLM_CONNECT_TIMEOUT_SECONDS,
+    read_timeout_s=config.LLM_READ_TIMEOUT_SECONDS,
+)
+
+metrics.gauge_callback("legalai_llm_generations", "LLM generations running or waiting for a gateway slot.",
+                       lambda: {"active": llm_gateway.slots.active, "waiting": llm_gateway.slots.waiting()},
+                       labelname="state")
@@ -1,20 +1,107 @@
 # backend/llm_interface.py
 
-from langchain_ollama import ChatOllama
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
 import config
+from llm_gateway import llm_gateway, chunk_content, INTERACTIVE
+
+# LangChain message types -> Ollama chat roles
+_ROLES = {"human": "user", "ai": "assistant", "system": "system", "tool": "tool"}
+
+
+def _usage(chunk):
+    """Ollama's token counts (on the final chunk) as LangChain usage metadata."""
+    if "eval_count" not in chunk and "prompt_eval_count" not in chunk:
+        return None
+    input_tokens = chunk.get("prompt_eval_count", 0)
+    output_tokens = chunk.get("eval_count", 0)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
 
-# Initialize LLM once globally
-_llm_instance = None
 
-def get_llm():
+def _message_chunk(chunk):
+    final = bool(chunk.get("done"))
+    return ChatGenerationChunk(message=AIMessageChunk(
+        content=chunk_content(chunk),
+        response_metadata={k: v for k, v in chunk.items() if k != "message"} if final else {},
+        usage_metadata=_usage(chunk) if final else None,
+    ))
+
+
+class GatewayChatModel(BaseChatModel):
     """
-    Initializes and returns the ChatOllama instance.
-    Ensures the LLM is initialized only once.
+    Chat model for Ollama's /api/chat that sends every call through the LLM gateway
+    (pooled connections, coalescing of identical requests, priority slots, retries).
+    Used wherever ChatOllama was: invoke / stream / ainvoke / astream and LCEL chains.
     """
-    global _llm_instance
-    if _llm_instance is None:
-        _llm_instance = ChatOllama(
-            model=config.LLM_MODEL_NAME,
-            base_url=config.OLLAMA_BASE_URL
+    model: str
+    priority: int = INTERACTIVE
+    options: Dict[str, Any] = Field(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-gateway"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "options": self.options}
+
+    def _payload(self, messages, stop: Optional[List[str]]):
+        options = dict(self.options)
+        if stop:
+            options["stop"] = stop
+        payload = {
+            "model": self.model,
+            "messages": [{"role": _ROLES.get(m.type, getattr(m, "role", "user")), "content": str(m.content)}
+                         for m in messages],
+        }
+        if options:
+            payload["options"] = options
+        return payload
+
+    @staticmethod
+    def _result(chunks):
+        final = chunks[-1] if chunks else {}
+        message = AIMessage(
+            content="".join(chunk_content(chunk) for chunk in chunks),
+            response_metadata={k: v for k, v in final.items() if k != "message"},
+            usage_metadata=_usage(final),
         )
-    return _llm_instance
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self._result(llm_gateway.complete("chat", self._payload(messages, stop), self.priority))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self._result([chunk async for chunk in llm_gateway.astream("chat", self._payload(messages, stop), self.priority)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in llm_gateway.stream("chat", self._payload(messages, stop), self.priority):
+            generation = _message_chunk(chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async for chunk in llm_gateway.astream("chat", self._payload(messages, stop), self.priority):
+            generation = _message_chunk(chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+
+
+# One instance per priority, created on first use
+_llm_instances = {}
+
+def get_llm(priority=INTERACTIVE):
+    """
+    Returns the shared chat model. Background work (e.g. document artifact builds)
+    passes priority=BACKGROUND so it only gets gateway slots interactive asks are not waiting for.
+    """
+    if priority not in _llm_instances:
+        _llm_instances[priority] = GatewayChatModel(model=config.LLM_MODEL_NAME, priority=priority)
+    return _llm_instances[priority]
@@ -0,0 +1,55 @@
+# backend/migrate_qa_collection.py
+# qa_core's "pdf_qa_collection" used to live in its own PersistentClient at ./chroma_db.
+# It now lives in the shared Chroma client (CHROMA_PERSIST_DIRECTORY, or the Chroma server
+# with CHROMA_CLIENT_MODE = "http"). This copies the old collection over, reusing its
+# stored embeddings, so nothing is re-embedded. Chunks already in the target are overwritten.
+#
+# Usage: python migrate_qa_collection.py [--source ./chroma_db] [--batch-size 500]
+
+import argparse
+import os
+
+from chroma_client import get_client
+from qa_core import COLLECTION_NAME
+
+LEGACY_PERSIST_DIRECTORY = "./chroma_db"
+
+
+def copy_collection(source, target, batch_size):
+    """Copies every chunk of source into target. Returns the number of chunks copied."""
+    total = source.count()
+    copied = 0
+    for offset in range(0, total, batch_size):
+        batch = source.get(offset=offset, limit=batch_size, include=["embeddings", "documents", "metadatas"])
+        target.upsert(ids=batch["ids"], embeddings=batch["embeddings"],
+                      documents=batch["documents"], metadatas=batch["metadatas"])
+        copied += len(batch["ids"])
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy qa_core's collection from its old directory into the shared Chroma client.")
+    parser.add_argument("--source", default=LEGACY_PERSIST_DIRECTORY,
+                        help="Directory of the old qa_core PersistentClient.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.source):
+        print(f"Nothing to copy: {args.source} does not exist.")
+        return
+
+    import chromadb
+    legacy = chromadb.PersistentClient(path=args.source)
+    try:
+        source = legacy.get_collection(COLLECTION_NAME)
+    except Exception:
+        print(f"Nothing to copy: {args.source} has no '{COLLECTION_NAME}' collection.")
+        return
+
+    target = get_client().get_or_create_collection(name=COLLECTION_NAME)
+    copied = copy_collection(source, target, args.batch_size)
+    print(f"Copied {copied} chunks of '{COLLECTION_NAME}' from {args.source}.")
+
+
+if __name__ == "__main__":
+    main()
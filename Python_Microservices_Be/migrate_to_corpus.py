@@ -0,0 +1,79 @@
+# backend/migrate_to_corpus.py
+# Copies existing per-PDF "legal_case_*" collections into the shared corpus shards.
+# Stored embeddings are reused, so nothing is re-embedded. Every migrated document
+# also gets its completion marker (document_processor.mark_indexed), which documents
+# ingested before markers existed lack; --mark-only writes just the markers.
+#
+# Usage: python migrate_to_corpus.py [--delete-source] [--batch-size 500] [--mark-only]
+
+import argparse
+
+import corpus
+from chroma_client import get_client
+from document_processor import mark_indexed, CORPUS_STORE, COLLECTION_STORE
+
+SOURCE_PREFIX = "legal_case_"
+
+
+def _collection_names(client):
+    # list_collections() returns names in newer Chroma versions and Collection objects in older ones
+    return sorted(getattr(c, "name", c) for c in client.list_collections())
+
+
+def migrate_collection(client, name, batch_size):
+    """Copies one per-PDF collection into its corpus shard. Returns the number of chunks copied."""
+    source = client.get_collection(name)
+    total = source.count()
+    if total == 0:
+        return 0
+
+    # Case metadata comes from the first pages, as during ingestion
+    head = source.get(where={"page": {"$lt": 3}}, include=["documents"])
+    case_metadata = corpus.extract_case_metadata("\n".join(head["documents"]))
+
+    copied = 0
+    for offset in range(0, total, batch_size):
+        batch = source.get(offset=offset, limit=batch_size, include=["embeddings", "documents", "metadatas"])
+        corpus.add_chunks(
+            name, case_metadata, batch["ids"], batch["embeddings"],
+            batch["documents"], [m or {} for m in batch["metadatas"]]
+        )
+        copied += len(batch["ids"])
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy per-PDF collections into the shared corpus shards.")
+    parser.add_argument("--delete-source", action="store_true",
+                        help="Delete each per-PDF collection after it has been copied "
+                             "(questions about it are then answered from the corpus shard).")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--mark-only", action="store_true",
+                        help="Only record the existing per-PDF collections as indexed, without copying them.")
+    args = parser.parse_args()
+
+    client = get_client()
+    names = [n for n in _collection_names(client) if n.startswith(SOURCE_PREFIX)]
+    print(f"Found {len(names)} per-PDF collections.")
+
+    for i, name in enumerate(names, 1):
+        count = client.get_collection(name).count()
+        if args.mark_only:
+            if count:
+                mark_indexed(name, count, COLLECTION_STORE)
+            print(f"[{i}/{len(names)}] {name}: {'marked as indexed' if count else 'empty, skipped'}.")
+            continue
+        if corpus.contains_document(name):
+            print(f"[{i}/{len(names)}] {name}: already in the corpus, skipped.")
+        else:
+            copied = migrate_collection(client, name, args.batch_size)
+            print(f"[{i}/{len(names)}] {name}: copied {copied} chunks.")
+        if count:
+            # Questions about the document are answered from its shard from now on
+            mark_indexed(name, count, CORPUS_STORE)
+        if args.delete_source:
+            client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# backend/model_registry.py
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from telemetry import get_logger
+
+log = get_logger(__name__)
+
+# Names under which the shared models are registered
+EMBEDDER = "embedder"          # HuggingFaceBgeEmbeddings / OnnxEmbeddings used by Chroma (ingestion + retrieval)
+RERANKER = "reranker"          # FlagReranker / OnnxReranker used by CustomRerankerRetriever
+QA_EMBEDDER = "qa_embedder"    # SentenceTransformer used by qa_core
+QA_RERANKER = "qa_reranker"    # CrossEncoder used by qa_core
+
+
+def _current_rss_bytes():
+    """Returns the resident memory of this process in bytes, or 0 if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def _parameter_bytes(model):
+    """Best-effort size of the weights held by a model wrapper (torch parameters or the ONNX file)."""
+    if getattr(model, "model_bytes", None):
+        return model.model_bytes
+    # The wrappers keep the torch module under different attribute names:
+    # HuggingFaceBgeEmbeddings.client, FlagReranker.model, CrossEncoder.model
+    for _ in range(3):
+        if hasattr(model, "parameters"):
+            try:
+                return sum(p.numel() * p.element_size() for p in model.parameters())
+            except Exception:
+                return 0
+        model = getattr(model, "model", None) or getattr(model, "client", None)
+        if model is None:
+            break
+    return 0
+
+
+def _configure_torch_threads():
+    if config.TORCH_NUM_THREADS:
+        import torch
+        torch.set_num_threads(config.TORCH_NUM_THREADS)
+
+
+def load_embedder(backend=None):
+    """The retrieval embedder on the given backend (default: config.EMBEDDER_BACKEND)."""
+    if (backend or config.EMBEDDER_BACKEND) == "onnx":
+        from onnx_backend import OnnxEmbeddings
+        return OnnxEmbeddings(
+            config.EMBEDDING_MODEL_NAME,
+            normalize=config.EMBEDDING_ENCODE_KWARGS.get("normalize_embeddings", False)
+        )
+    from langchain_community.embeddings import HuggingFaceBgeEmbeddings
+    _configure_torch_threads()
+    return HuggingFaceBgeEmbeddings(
+        model_name=config.EMBEDDING_MODEL_NAME,
+        model_kwargs=config.EMBEDDING_MODEL_KWARGS,
+        encode_kwargs=config.EMBEDDING_ENCODE_KWARGS
+    )
+
+
+def load_reranker(backend=None):
+    """The cross-encoder reranker on the given backend (default: config.RERANKER_BACKEND)."""
+    if (backend or config.RERANKER_BACKEND) == "onnx":
+        from onnx_backend import OnnxReranker
+        return OnnxReranker(config.CROSS_ENCODER_MODEL_NAME, max_length=config.RERANK_MAX_LENGTH)
+    from FlagEmbedding import FlagReranker
+    _configure_torch_threads()
+    # fp16 only helps on GPU; on CPU it just adds conversions
+    use_fp16 = config.EMBEDDING_MODEL_KWARGS.get("device", "cpu") != "cpu"
+    return FlagReranker(config.CROSS_ENCODER_MODEL_NAME, use_fp16=use_fp16)
+
+
+def _load_qa_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(config.EMBEDDING_MODEL_NAME, device=config.EMBEDDING_MODEL_KWARGS.get("device"))
+
+
+def _load_qa_reranker():
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(config.CROSS_ENCODER_MODEL_NAME, device=config.EMBEDDING_MODEL_KWARGS.get("device"))
+
+
+class _ModelEntry:
+    """Book-keeping for one registered model."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.model = None
+        self.refs = 0
+        self.hits = 0
+        self.load_time_s = None
+        self.rss_delta_bytes = None
+        self.param_bytes = None
+        self.loaded_at = None
+
+
+class ModelRegistry:
+    """
+    Process-wide, thread-safe cache of heavy models.
+    Each model is loaded at most once; callers share the same instance and the
+    registry keeps a reference count of the callers currently using it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def register(self, name, loader):
+        """Registers a zero-argument loader under the given name."""
+        with self._lock:
+            self._entries[name] = _ModelEntry(name, loader)
+
+    def _entry(self, name):
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"No model registered under '{name}'. Known: {sorted(self._entries)}")
+
+    def _ensure_loaded(self, entry):
+        # Double-checked so concurrent first requests only load the model once
+        if entry.model is None:
+            with entry.lock:
+                if entry.model is None:
+                    rss_before = _current_rss_bytes()
+                    start = time.perf_counter()
+                    model = entry.loader()
+                    entry.load_time_s = round(time.perf_counter() - start, 3)
+                    entry.rss_delta_bytes = max(0, _current_rss_bytes() - rss_before)
+                    entry.param_bytes = _parameter_bytes(model)
+                    entry.loaded_at = time.time()
+                    entry.model = model
+                    log.info("Model '%s' loaded in %ss.", entry.name, entry.load_time_s)
+        return entry.model
+
+    def get(self, name):
+        """Returns the shared model, loading it on first use."""
+        entry = self._entry(name)
+        model = self._ensure_loaded(entry)
+        with entry.lock:
+            entry.hits += 1
+        return model
+
+    def acquire(self, name):
+        """Returns the shared model and increments its reference count."""
+        entry = self._entry(name)
+        model = self._ensure_loaded(entry)
+        with entry.lock:
+            entry.refs += 1
+            entry.hits += 1
+        return model
+
+    def release(self, name):
+        """Decrements the reference count taken by acquire()."""
+        entry = self._entry(name)
+        with entry.lock:
+            entry.refs = max(0, entry.refs - 1)
+
+    @contextmanager
+    def use(self, name):
+        """Context manager around acquire()/release()."""
+        model = self.acquire(name)
+        try:
+            yield model
+        finally:
+            self.release(name)
+
+    def unload(self, name):
+        """Drops a loaded model if nobody is using it. Returns True if it was unloaded."""
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.model is None or entry.refs > 0:
+                return False
+            entry.model = None
+            return True
+
+    def warm_up(self, names=None):
+        """Loads the given models (default: config.WARMUP_MODELS) ahead of the first request."""
+        for name in (names if names is not None else config.WARMUP_MODELS):
+            self._ensure_loaded(self._entry(name))
+
+    def metrics(self):
+        """Per-model load time, memory and usage counters."""
+        return {
+            "rss_bytes": _current_rss_bytes(),
+            "models": {
+                name: {
+                    "loaded": entry.model is not None,
+                    "load_time_s": entry.load_time_s,
+                    "rss_delta_bytes": entry.rss_delta_bytes,
+                    "param_bytes": entry.param_bytes,
+                    "active_refs": entry.refs,
+                    "hits": entry.hits,
+                    "loaded_at": entry.loaded_at,
+                }
+                for name, entry in self._entries.items()
+            },
+        }
+
+
+# The process-wide registry
+model_registry = ModelRegistry()
+model_registry.register(EMBEDDER, load_embedder)
+model_registry.register(RERANKER, load_reranker)
+model_registry.register(QA_EMBEDDER, _load_qa_embedder)
+model_registry.register(QA_RERANKER, _load_qa_reranker)
@@ -0,0 +1,126 @@
+# backend/onnx_backend.py
+# ONNX Runtime versions of the BGE embedder and the bge-reranker cross-encoder for
+# CPU-only deployments. On first load the Hugging Face model is exported to ONNX
+# and (by default) dynamically quantized to int8 under ONNX_MODEL_DIRECTORY; later
+# loads reuse the files. Both classes expose the same methods the rest of the code
+# calls on the PyTorch models, so they are drop-in replacements in the model registry.
+
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import config
+
+
+def bge_query_instruction(model_name):
+    """The instruction HuggingFaceBgeEmbeddings prepends to queries, so query vectors match the PyTorch backend."""
+    from langchain_community.embeddings.huggingface import (
+        DEFAULT_QUERY_BGE_INSTRUCTION_EN, DEFAULT_QUERY_BGE_INSTRUCTION_ZH
+    )
+    return DEFAULT_QUERY_BGE_INSTRUCTION_ZH if "-zh" in model_name else DEFAULT_QUERY_BGE_INSTRUCTION_EN
+
+
+def _session_options():
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = config.ONNX_INTER_OP_THREADS
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+def _model_dir(model_name, model_class):
+    variant = config.ONNX_QUANTIZATION or "fp32"
+    return os.path.join(config.ONNX_MODEL_DIRECTORY, f"{model_name.replace('/', '__')}-{model_class.__name__}-{variant}")
+
+
+def load_ort_model(model_name, model_class):
+    """
+    Returns (tokenizer, ORT model, model file size in bytes). The export and
+    quantization run once; the finished directory is only moved into place
+    when complete, so an interrupted export is redone instead of half-loaded.
+    """
+    from transformers import AutoTokenizer
+
+    target = _model_dir(model_name, model_class)
+    file_name = "model_quantized.onnx" if config.ONNX_QUANTIZATION else "model.onnx"
+    if not os.path.exists(os.path.join(target, file_name)):
+        export_dir = target + ".partial"
+        model = model_class.from_pretrained(model_name, export=True)
+        model.save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+        if config.ONNX_QUANTIZATION:
+            from optimum.onnxruntime import ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            preset = getattr(AutoQuantizationConfig, config.ONNX_QUANTIZATION)
+            ORTQuantizer.from_pretrained(export_dir).quantize(
+                save_dir=export_dir, quantization_config=preset(is_static=False, per_channel=False)
+            )
+        os.replace(export_dir, target)
+
+    tokenizer = AutoTokenizer.from_pretrained(target)
+    model = model_class.from_pretrained(
+        target, file_name=file_name, provider="CPUExecutionProvider", session_options=_session_options()
+    )
+    return tokenizer, model, os.path.getsize(os.path.join(target, file_name))
+
+
+def _length_sorted_batches(lengths, batch_size):
+    """Index batches of similar length, so little padding is computed."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class OnnxEmbeddings(Embeddings):
+    """ONNX Runtime counterpart of HuggingFaceBgeEmbeddings (CLS pooling, optional L2 normalization)."""
+
+    def __init__(self, model_name, normalize=True, batch_size=32, max_length=512,
+                 query_instruction=None):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        self.tokenizer, self.model, self.model_bytes = load_ort_model(model_name, ORTModelForFeatureExtraction)
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.query_instruction = bge_query_instruction(model_name) if query_instruction is None else query_instruction
+
+    def _encode(self, texts):
+        texts = [text.replace("\n", " ") for text in texts]
+        vectors = [None] * len(texts)
+        for batch in _length_sorted_batches([len(t) for t in texts], self.batch_size):
+            inputs = self.tokenizer([texts[i] for i in batch], padding=True, truncation=True,
+                                    max_length=self.max_length, return_tensors="np")
+            cls = np.asarray(self.model(**inputs).last_hidden_state)[:, 0].astype(np.float32)
+            if self.normalize:
+                cls /= np.clip(np.linalg.norm(cls, axis=1, keepdims=True), 1e-12, None)
+            for i, vector in zip(batch, cls.tolist()):
+                vectors[i] = vector
+        return vectors
+
+    def embed_documents(self, texts):
+        return self._encode(list(texts))
+
+    def embed_query(self, text):
+        return self._encode([self.query_instruction + text])[0]
+
+
+class OnnxReranker:
+    """ONNX Runtime counterpart of FlagReranker.compute_score (raw relevance logits)."""
+
+    def __init__(self, model_name, batch_size=16, max_length=512):
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        self.tokenizer, self.model, self.model_bytes = load_ort_model(model_name, ORTModelForSequenceClassification)
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def compute_score(self, sentence_pairs, batch_size=None, max_length=None, **kwargs):
+        pairs = [sentence_pairs] if isinstance(sentence_pairs[0], str) else list(sentence_pairs)
+        max_length = max_length or self.max_length
+        scores = [0.0] * len(pairs)
+        for batch in _length_sorted_batches([len(q) + len(p) for q, p in pairs], batch_size or self.batch_size):
+            inputs = self.tokenizer([pairs[i][0] for i in batch], [pairs[i][1] for i in batch], padding=True,
+                                    truncation=True, max_length=max_length, return_tensors="np")
+            logits = np.asarray(self.model(**inputs).logits).reshape(len(batch), -1)[:, 0]
+            for i, score in zip(batch, logits.tolist()):
+                scores[i] = float(score)
+        return scores
@@ -0,0 +1,108 @@
+# backend/pdf_extraction.py
+# Page extraction kept in a light module (only PyMuPDF) so the process-pool
+# workers that import it do not pull in langchain or the models.
+
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import fitz  # PyMuPDF
+
+import config
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+_worker_document = None  # (filepath, size, mtime_ns, open fitz document), per pool worker
+
+
+def get_page_count(filepath):
+    with fitz.open(filepath) as doc:
+        return doc.page_count
+
+
+def read_pages(doc, start, end):
+    """Returns [(page_number, text), ...] for pages [start, end) of an open fitz document."""
+    return [(i, doc.load_page(i).get_text("text")) for i in range(start, min(end, doc.page_count))]
+
+
+def extract_page_range(filepath, start, end):
+    """Returns [(page_number, text), ...] for pages [start, end)."""
+    with fitz.open(filepath) as doc:
+        return read_pages(doc, start, end)
+
+
+def _extract_range_in_worker(filepath, start, end):
+    """
+    Pool task: like extract_page_range, but the worker keeps the document open for
+    its next range of the same file instead of reopening it for every range.
+    """
+    global _worker_document
+    stat = os.stat(filepath)
+    key = (filepath, stat.st_size, stat.st_mtime_ns)
+    if _worker_document is None or _worker_document[:3] != key:
+        if _worker_document is not None:
+            _worker_document[3].close()
+        _worker_document = key + (fitz.open(filepath),)
+    doc = _worker_document[3]
+    pages = read_pages(doc, start, end)
+    if end >= doc.page_count:
+        # The last range: do not hold on to the file (uploads are deleted after ingestion)
+        doc.close()
+        _worker_document = None
+    return pages
+
+
+def _get_pool():
+    """The shared extraction pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 'spawn' so workers do not inherit the parent's model threads and locks
+            _pool = ProcessPoolExecutor(
+                max_workers=config.PARSE_WORKERS or os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def iter_pages(filepath, pages_per_task=None, start_page=0, page_count=None):
+    """
+    Yields (page_number, text) in page order, starting at `start_page`. Page ranges are extracted in parallel
+    by the process pool, so later pages are being parsed while the caller works on
+    the earlier ones. Only a small window of ranges is in flight at once, so a slow
+    consumer does not cause the whole document to pile up in memory.
+    Pass `page_count` when it is known (see validator_pdf.extract_and_validate) so
+    the file is not opened just to count its pages.
+    """
+    pages_per_task = pages_per_task or config.PARSE_PAGES_PER_TASK
+    if page_count is None:
+        page_count = get_page_count(filepath)
+    if start_page >= page_count:
+        return
+
+    if page_count - start_page <= pages_per_task:
+        # Not worth a round-trip to the pool
+        yield from extract_page_range(filepath, start_page, page_count)
+        return
+
+    pool = _get_pool()
+    window = 2 * (config.PARSE_WORKERS or os.cpu_count())
+    starts = iter(range(start_page, page_count, pages_per_task))
+    in_flight = deque()
+    try:
+        for start in islice(starts, window):
+            in_flight.append(pool.submit(_extract_range_in_worker, filepath, start, start + pages_per_task))
+        while in_flight:
+            pages = in_flight.popleft().result()
+            for start in islice(starts, 1):
+                in_flight.append(pool.submit(_extract_range_in_worker, filepath, start, start + pages_per_task))
+            yield from pages
+    finally:
+        # Stop outstanding extraction if the consumer gives up early
+        for future in in_flight:
+            future.cancel()
@@ -4,6 +4,10 @@ import json
 from functools import lru_cache
 from pathlib import Path
 
+from telemetry import get_logger
+
+log = get_logger(__name__)
+
 # --- Configuration ---
 PROMPT_TEMPLATES_PATH = Path(__file__).parent / "prompts/legal_prompts.json"
 
@@ -20,5 +24,5 @@ def load_prompt_templates() -> dict:
     with open(PROMPT_TEMPLATES_PATH, "r", encoding="utf-8") as f:
         templates = json.load(f)
     
-    print("Prompt templates loaded and cached successfully.")
+    log.info("Prompt templates loaded and cached.")
     return templates
\ No newline at end of file
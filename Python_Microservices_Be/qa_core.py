@@ -1,25 +1,22 @@
 # backend/qa_core.py
 
-import chromadb
-from sentence_transformers import SentenceTransformer, CrossEncoder
-import requests
-import json
+from model_registry import model_registry, QA_EMBEDDER, QA_RERANKER
+from chroma_client import get_client
+from llm_gateway import llm_gateway, chunk_content, LLMGatewayError
+from telemetry import get_logger
 
-# Initialize ChromaDB client
-# This will create a persistent database in the './chroma_db' directory
-client = chromadb.PersistentClient(path="./chroma_db")
+log = get_logger(__name__)
 
-# Initialize the embedding model
-# This model is used to convert text chunks into numerical vectors
-embedding_model = SentenceTransformer('BAAI/bge-base-en-v1.5')
+# The embedding model (text chunks -> vectors) and the reranker model are
+# shared through the model registry instead of being loaded here.
 
-# Initialize the reranker model
-# This model is used to improve the relevance of search results
-reranker_model = CrossEncoder('BAAI/bge-reranker-base')
+# The ChromaDB collection (like a table in a traditional database) lives in the
+# process-wide Chroma client and is opened on first use. It used to be stored in
+# ./chroma_db; migrate_qa_collection.py copies it from there.
+COLLECTION_NAME = "pdf_qa_collection"
 
-# Get or create the ChromaDB collection
-# A collection is like a table in a traditional database
-collection = client.get_or_create_collection(name="pdf_qa_collection")
+def get_collection():
+    return get_client().get_or_create_collection(name=COLLECTION_NAME)
 
 def store_chunks(chunks, metadata):
     """
@@ -29,7 +26,8 @@ def store_chunks(chunks, metadata):
         return
 
     # Generate embeddings for each chunk
-    embeddings = embedding_model.encode(chunks, convert_to_tensor=False).tolist()
+    with model_registry.use(QA_EMBEDDER) as embedding_model:
+        embeddings = embedding_model.encode(chunks, convert_to_tensor=False).tolist()
     
     # Create unique IDs for each chunk
     ids = [f"{metadata['filename']}_chunk_{i}" for i in range(len(chunks))]
@@ -42,21 +40,22 @@ def store_chunks(chunks, metadata):
     } for i in range(len(chunks))]
 
     # Add the embeddings, metadata, and IDs to the collection
-    collection.add(
+    get_collection().add(
         embeddings=embeddings,
         metadatas=metadatas,
         ids=ids
     )
-    print(f"Successfully stored {len(chunks)} chunks for {metadata['filename']}.")
+    log.info("Stored %d chunks for %s.", len(chunks), metadata['filename'])
 
 def retrieve_and_rerank(query, top_k=20, rerank_top_n=5):
     """
     Retrieves relevant chunks from ChromaDB and reranks them.
     """
     # 1. Retrieve initial results from ChromaDB
-    query_embedding = embedding_model.encode(query, convert_to_tensor=False).tolist()
+    with model_registry.use(QA_EMBEDDER) as embedding_model:
+        query_embedding = embedding_model.encode(query, convert_to_tensor=False).tolist()
     
-    results = collection.query(
+    results = get_collection().query(
         query_embeddings=[query_embedding],
         n_results=top_k
     )
@@ -71,7 +70,8 @@ def retrieve_and_rerank(query, top_k=20, rerank_top_n=5):
     rerank_pairs = [[query, doc] for doc in retrieved_docs]
     
     # Get scores from the reranker model
-    scores = reranker_model.predict(rerank_pairs)
+    with model_registry.use(QA_RERANKER) as reranker_model:
+        scores = reranker_model.predict(rerank_pairs)
 
     # 3. Combine documents with their scores and sort
     doc_scores = list(zip(results['metadatas'][0], scores))
@@ -82,15 +82,16 @@ def retrieve_and_rerank(query, top_k=20, rerank_top_n=5):
     
     return reranked_results
 
-def generate_answer(query, context):
-    """
-    Generates an answer using the LLM with the provided context.
-    """
+# Calls go to config.OLLAMA_BASE_URL's /api/generate through the LLM gateway
+OLLAMA_MODEL = "llama3"
+
+def _build_prompt(query, context):
+    """Formats the context and question into the LLM prompt."""
     # Format the context into a single string
     context_str = "\n\n".join([f"Source: {item['source']}, Page: {item['page_number']}\nContent: {item['text']}" for item in context])
 
     # Create the prompt for the LLM
-    prompt = f"""
+    return f"""
     You are a specialized AI assistant for answering questions based on the content of provided PDF documents.
     Your sole purpose is to answer the user's question accurately based ONLY on the context provided.
     Do not hallucinate or use any information outside of the context.
@@ -105,29 +106,48 @@ def generate_answer(query, context):
     ANSWER:
     """
 
-    # Ollama API endpoint
-    url = "http://localhost:11434/api/generate"
+def generate_answer(query, context):
+    """
+    Generates an answer using the LLM with the provided context.
+    """
+    prompt = _build_prompt(query, context)
     
     payload = {
-        "model": "llama3",
-        "prompt": prompt,
-        "stream": False # We'll wait for the full response
+        "model": OLLAMA_MODEL,
+        "prompt": prompt
     }
 
     try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status() # Raise an exception for bad status codes
-        
-        # Parse the JSON response
-        response_data = response.json()
-        
+        # Waits for the full response; identical concurrent prompts share one generation
+        chunks = llm_gateway.complete("generate", payload)
+        answer = "".join(chunk_content(chunk) for chunk in chunks)
+
         return {
-            "answer": response_data.get("response", "No response from model."),
+            "answer": answer or "No response from model.",
             "sources": context
         }
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling Ollama API: {e}")
+    except LLMGatewayError as e:
+        log.error("Error calling Ollama API: %s", e)
         return {
             "answer": "Failed to get a response from the language model.",
             "sources": []
-        }
\ No newline at end of file
+        }
+
+def stream_answer(query, context):
+    """
+    Streaming version of generate_answer: yields the answer text piece by piece
+    as Ollama generates it.
+    """
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": _build_prompt(query, context)
+    }
+
+    try:
+        for chunk in llm_gateway.stream("generate", payload):
+            text = chunk_content(chunk)
+            if text:
+                yield text
+    except LLMGatewayError as e:
+        log.error("Error calling Ollama API: %s", e)
+        yield "Failed to get a response from the language model."
@@ -0,0 +1,170 @@
+# backend/rerank_engine.py
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from inference_scheduler import MicroBatcher
+
+
+def normalize_query(query):
+    """Lowercases and collapses whitespace/trailing punctuation so trivially different phrasings share scores."""
+    return re.sub(r"\s+", " ", query.lower()).strip(" ?.!")
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class RerankEngine:
+    """
+    Cross-encoder reranking with:
+      - pre-truncation of the candidates to the top `candidate_top_m` by fusion/vector score,
+      - an LRU cache of (query hash, chunk id) -> score,
+      - length-bucketed batches (similar lengths together, so little padding) of at most `batch_size`,
+      - micro-batching: pairs from concurrent requests are pooled and scored together.
+    Per-stage timings are aggregated for /api/metrics/rerank.
+    """
+
+    STAGES = ("truncate", "cache_lookup", "score", "sort")
+
+    def __init__(self, batch_size, candidate_top_m, max_length, cache_size):
+        self.batch_size = batch_size
+        self.candidate_top_m = candidate_top_m
+        self.max_length = max_length
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._batcher = MicroBatcher(
+            "rerank",
+            self._score_pairs,
+            max_batch=config.RERANK_MICRO_BATCH_MAX,
+            max_wait_ms=config.INFERENCE_MAX_WAIT_MS,
+            enabled=config.INFERENCE_MICRO_BATCHING
+        )
+        self._stats = {
+            "requests": 0, "candidates_in": 0, "candidates_scored": 0,
+            "cache_hits": 0, "cache_misses": 0,
+            "stage_ms": {stage: {"total": 0.0, "max": 0.0} for stage in self.STAGES},
+        }
+
+    # --- Score cache ---
+    def _cache_get(self, key):
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, items):
+        with self._lock:
+            for key, score in items:
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- Scoring ---
+    def _score_pairs(self, reranker, pairs):
+        """Scores [query, text] pairs in length-sorted batches and returns scores in input order."""
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][1]))
+        scores = [0.0] * len(pairs)
+        for start in range(0, len(order), self.batch_size):
+            batch_idx = order[start:start + self.batch_size]
+            batch_scores = reranker.compute_score(
+                [pairs[i] for i in batch_idx],
+                batch_size=len(batch_idx),
+                max_length=self.max_length
+            )
+            if not isinstance(batch_scores, list):
+                batch_scores = [batch_scores]
+            for i, score in zip(batch_idx, batch_scores):
+                scores[i] = float(score)
+        return scores
+
+    def rerank(self, reranker, query, docs, top_n):
+        """Returns (top_n [(doc, score), ...] best first, {stage: ms})."""
+        timings = {}
+        t = time.perf_counter()
+
+        def lap(stage):
+            nonlocal t
+            now = time.perf_counter()
+            timings[stage] = (now - t) * 1000
+            t = now
+
+        # 1. Keep the best candidates by first-stage score (fusion score, else vector distance)
+        candidates = sorted(
+            docs,
+            key=lambda d: (-d.metadata.get("fusion_score", 0.0), d.metadata.get("vector_distance", 0.0))
+        )[:self.candidate_top_m]
+        lap("truncate")
+
+        # 2. Reuse cached scores for this (normalized) query
+        query_hash = _hash(normalize_query(query))
+        keys = [(query_hash, d.metadata.get("chunk_id") or _hash(d.page_content)) for d in candidates]
+        scores = [self._cache_get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        lap("cache_lookup")
+
+        # 3. Score the rest with the cross-encoder
+        if missing:
+            new_scores = self._batcher.submit(reranker, [[query, candidates[i].page_content] for i in missing])
+            for i, score in zip(missing, new_scores):
+                scores[i] = score
+            self._cache_put([(keys[i], scores[i]) for i in missing])
+        lap("score")
+
+        # 4. Order by reranker score
+        ranked = sorted(zip(candidates, scores), key=lambda x: x[1], reverse=True)[:top_n]
+        lap("sort")
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["candidates_in"] += len(docs)
+            self._stats["candidates_scored"] += len(missing)
+            self._stats["cache_hits"] += len(candidates) - len(missing)
+            self._stats["cache_misses"] += len(missing)
+            for stage, ms in timings.items():
+                self._stats["stage_ms"][stage]["total"] += ms
+                self._stats["stage_ms"][stage]["max"] = max(self._stats["stage_ms"][stage]["max"], ms)
+
+        return ranked, {stage: round(ms, 2) for stage, ms in timings.items()}
+
+    def stats(self):
+        with self._lock:
+            requests = self._stats["requests"]
+            return {
+                "requests": requests,
+                "candidates_in": self._stats["candidates_in"],
+                "candidates_scored": self._stats["candidates_scored"],
+                "cache_hits": self._stats["cache_hits"],
+                "cache_misses": self._stats["cache_misses"],
+                "cache_entries": len(self._cache),
+                "micro_batching": self._batcher.stats(),
+                "stage_ms": {
+                    stage: {
+                        "avg": round(v["total"] / requests, 2) if requests else 0.0,
+                        "max": round(v["max"], 2),
+                    }
+                    for stage, v in self._stats["stage_ms"].items()
+                },
+                "config": {
+                    "top_n": config.RERANK_TOP_N,
+                    "candidate_top_m": self.candidate_top_m,
+                    "batch_size": self.batch_size,
+                    "max_length": self.max_length,
+                },
+            }
+
+
+# The process-wide rerank engine
+rerank_engine = RerankEngine(
+    batch_size=config.RERANK_BATCH_SIZE,
+    candidate_top_m=config.RERANK_CANDIDATE_TOP_M,
+    max_length=config.RERANK_MAX_LENGTH,
+    cache_size=config.RERANK_SCORE_CACHE_SIZE
+)
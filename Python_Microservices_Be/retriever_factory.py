@@ -1,23 +1,35 @@
 # backend/retriever_factory.py
 
-from langchain_classic.retrievers import MultiQueryRetriever
-from langchain_chroma import Chroma
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
-# ---------------------------------------------------------
+import asyncio
+import contextvars
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
+from langchain_chroma import Chroma
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.prompts import ChatPromptTemplate
-from FlagEmbedding import FlagReranker
-from typing import List
+from langchain_core.output_parsers import StrOutputParser
+from typing import Any, List, Optional
 from pydantic import Field, ConfigDict
 from langchain_core.documents import Document
 
 from llm_interface import get_llm
+from model_registry import model_registry, EMBEDDER, RERANKER
+from rerank_engine import rerank_engine
+from inference_scheduler import embed_queries
+from telemetry import span, record_stage, debug_payload, set_attribute, RETRIEVAL_DOCS, EVENTS
+from lexical_index import get_index as get_lexical_index
+from document_processor import indexed_document, CORPUS_STORE
+from chroma_client import get_vector_store
+import corpus
 import config
 
-# A more powerful prompt for the MultiQueryRetriever to force diversity
+# A more powerful prompt for the query variant generation to force diversity
 QUERY_GENERATION_PROMPT = ChatPromptTemplate.from_messages([
-    ("system", "You are an AI language model assistant. Your task is to generate five "
+    ("system", "You are an AI language model assistant. Your task is to generate {num_variants} "
                "different versions of the given user question to retrieve relevant documents from "
                "a vector database. By generating multiple perspectives on the user question, "
                "your goal is to help the user overcome some of the limitations of distance-based "
@@ -25,23 +37,343 @@ QUERY_GENERATION_PROMPT = ChatPromptTemplate.from_messages([
     ("user", "Original question: {question}")
 ])
 
+# Leading "1." / "-" / "*" markers the LLM sometimes puts in front of each variant
+_LIST_MARKER = re.compile(r"^\s*(?:\d+[.)]|[-*\u2022])\s*")
+
+# Threads running query rewrites for the sync path, so a slow LLM can be abandoned after
+# MULTI_QUERY_TIMEOUT_SECONDS; an abandoned rewrite still finishes and fills the cache
+_variant_executor = ThreadPoolExecutor(max_workers=config.MULTI_QUERY_MAX_PENDING, thread_name_prefix="query-variants")
+# Rewrites running in this process (sync and async, abandoned ones included). When Ollama is
+# slow, new questions skip rewriting instead of queueing more LLM calls behind it.
+_rewrite_slots = threading.BoundedSemaphore(config.MULTI_QUERY_MAX_PENDING)
+
+
+class QueryVariantCache:
+    """LRU + TTL cache of LLM query rewrites, keyed by the normalized question (and LLM model)."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (stored_at, variants), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(question, num_variants):
+        normalized = re.sub(r"\s+", " ", question.lower()).strip().rstrip("?.! ")
+        return (config.LLM_MODEL_NAME, num_variants, normalized)
+
+    def get(self, question, num_variants):
+        key = self._key(question, num_variants)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, question, num_variants, variants):
+        key = self._key(question, num_variants)
+        with self._lock:
+            self._entries[key] = (time.time(), list(variants))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Shared by every retriever in the process
+query_variant_cache = QueryVariantCache(config.QUERY_VARIANT_CACHE_SIZE, config.QUERY_VARIANT_CACHE_TTL_SECONDS)
+
+class FusedMultiQueryRetriever(BaseRetriever):
+    """
+    Multi-query retriever that generates `num_variants` rewrites of the question,
+    embeds the question and all variants in one batched encoder call, searches them
+    in one multi-vector Chroma query and merges the ranked lists with reciprocal-rank
+    fusion. num_variants=0 searches the original question only (no LLM call).
+    With a `lexical_index`, each query's BM25 ranking is fused in as well, which
+    catches exact tokens ("Section 302", "FIR No. 117/2019") dense search misses.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: Chroma = Field(exclude=True)
+    embeddings: Any = Field(exclude=True)
+    llm: Any = Field(default=None, exclude=True)
+    prompt: ChatPromptTemplate = Field(default=QUERY_GENERATION_PROMPT, exclude=True)
+    lexical_index: Any = Field(default=None, exclude=True)
+    where: Optional[dict] = None  # Metadata filter, e.g. {"doc_id": ...} when searching a corpus shard
+    num_variants: int = 5
+    k: int = 50
+    lexical_k: int = 20
+    rrf_k: int = 60
+
+    def _parse_variants(self, query: str, output: str) -> List[str]:
+        variants = []
+        for line in output.splitlines():
+            line = _LIST_MARKER.sub("", line).strip()
+            if line and line != query and line not in variants:
+                variants.append(line)
+        return variants[:self.num_variants]
+
+    @property
+    def rewrites_enabled(self) -> bool:
+        return self.num_variants > 0 and self.llm is not None
+
+    def cached_variants(self, query: str) -> Optional[List[str]]:
+        """Variants generated earlier for the same (normalized) question, or None."""
+        if not self.rewrites_enabled:
+            return []
+        variants = query_variant_cache.get(query, self.num_variants)
+        if variants is not None:
+            EVENTS.inc(event="multi_query_cache_hit")
+        return variants
+
+    def _store_variants(self, query: str, output: str) -> List[str]:
+        debug_payload("query_variants", output)
+        variants = self._parse_variants(query, output)
+        if variants:
+            query_variant_cache.put(query, self.num_variants, variants)
+        return variants
+
+    def generate_variants(self, query: str) -> List[str]:
+        """Asks the LLM for alternative phrasings of the question and caches them."""
+        if not self.rewrites_enabled:
+            return []
+        with span("multi_query"):
+            output = (self.prompt | self.llm | StrOutputParser()).invoke(
+                {"question": query, "num_variants": self.num_variants}
+            )
+        return self._store_variants(query, output)
+
+    async def agenerate_variants(self, query: str) -> List[str]:
+        """Async generate_variants(), so the LLM round-trip does not hold a thread."""
+        if not self.rewrites_enabled:
+            return []
+        with span("multi_query"):
+            output = await (self.prompt | self.llm | StrOutputParser()).ainvoke(
+                {"question": query, "num_variants": self.num_variants}
+            )
+        return self._store_variants(query, output)
+
+    def dense_confident(self, docs: List[Document], top_n: int) -> bool:
+        """True when the question alone already finds top_n close chunks (MULTI_QUERY_SKIP_DENSE_SIMILARITY)."""
+        threshold = config.MULTI_QUERY_SKIP_DENSE_SIMILARITY
+        if threshold is None:
+            return False
+        # Squared L2 between normalized vectors: cosine similarity = 1 - distance / 2
+        similarities = sorted((1 - d.metadata["vector_distance"] / 2 for d in docs
+                               if d.metadata.get("vector_distance", float("inf")) != float("inf")), reverse=True)
+        return len(similarities) >= top_n and similarities[top_n - 1] >= threshold
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeds all queries in one encoder call, shared with concurrent requests (same vectors as embed_query)."""
+        return embed_queries(queries, self.embeddings)
+
+    def _get_relevant_documents(self, query: str, **kwargs) -> List[Document]:
+        variants = self.cached_variants(query)
+        if variants is None:
+            variants = self.generate_variants(query)
+        return self.search([query] + variants)
+
+    def search(self, queries: List[str], fuse_with: Optional[List[Document]] = None) -> List[Document]:
+        """
+        Dense + lexical search for the question and/or its variants. fuse_with takes the results
+        of an earlier search() (the question alone) and fuses them in, so those queries are not
+        searched again.
+        """
+        with span("vector_search", queries=len(queries)):
+            docs = self._search(queries)
+            if fuse_with:
+                docs = self._merge(fuse_with, docs)
+        RETRIEVAL_DOCS.observe(len(docs), kind="retrieved")
+        return docs
+
+    @staticmethod
+    def _merge(*result_lists: List[Document]) -> List[Document]:
+        """Fuses search() results: RRF scores add up, the best vector distance is kept."""
+        fused = {}
+        for docs in result_lists:
+            for doc in docs:
+                chunk_id = doc.metadata["chunk_id"]
+                entry = fused.get(chunk_id)
+                if entry is None:
+                    metadata = {key: value for key, value in doc.metadata.items() if key != "rerank_score"}
+                    fused[chunk_id] = Document(page_content=doc.page_content, metadata=metadata)
+                    continue
+                entry.metadata["fusion_score"] += doc.metadata["fusion_score"]
+                entry.metadata["vector_distance"] = min(entry.metadata["vector_distance"], doc.metadata["vector_distance"])
+        return sorted(fused.values(), key=lambda d: d.metadata["fusion_score"], reverse=True)
+
+    def _search(self, queries: List[str]) -> List[Document]:
+        collection = self.vector_store._collection
+        # Chroma caps n_results at the collection size itself (no count() round-trip per search)
+        results = collection.query(
+            query_embeddings=self.embed_queries(queries),
+            n_results=self.k,
+            where=self.where,
+            include=["documents", "metadatas", "distances"]
+        )
+
+        # Reciprocal-rank fusion across the per-query dense and lexical result lists
+        fused = {}
+        for ids, texts, metadatas, distances in zip(
+            results["ids"], results["documents"], results["metadatas"], results["distances"]
+        ):
+            for rank, (chunk_id, text, metadata, distance) in enumerate(zip(ids, texts, metadatas, distances)):
+                entry = fused.setdefault(chunk_id, {"text": text, "metadata": metadata or {}, "score": 0.0, "distance": distance})
+                entry["score"] += 1.0 / (self.rrf_k + rank + 1)
+                entry["distance"] = min(entry["distance"], distance)
+
+        if self.lexical_index is not None:
+            lexical_scores = {}
+            for q in queries:
+                for rank, (chunk_id, _) in enumerate(self.lexical_index.search(q, self.lexical_k)):
+                    lexical_scores[chunk_id] = lexical_scores.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            lexical_only = [chunk_id for chunk_id in lexical_scores if chunk_id not in fused]
+            if lexical_only:
+                # One round-trip for the chunks only the lexical index found
+                stored = collection.get(ids=lexical_only, include=["documents", "metadatas"])
+                for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                    fused[chunk_id] = {"text": text, "metadata": metadata or {}, "score": 0.0, "distance": float("inf")}
+            for chunk_id, score in lexical_scores.items():
+                if chunk_id in fused:
+                    fused[chunk_id]["score"] += score
+
+        ranked = sorted(fused.items(), key=lambda item: item[1]["score"], reverse=True)
+        return [
+            Document(
+                page_content=entry["text"],
+                metadata={**entry["metadata"], "chunk_id": chunk_id,
+                          "fusion_score": entry["score"], "vector_distance": entry["distance"]}
+            )
+            for chunk_id, entry in ranked
+        ]
+
 class CustomRerankerRetriever(BaseRetriever):
     """Custom retriever that inherits from BaseRetriever, uses a reranker, and handles deduplication."""
     model_config = ConfigDict(arbitrary_types_allowed=True)
     
     base_retriever: BaseRetriever = Field(exclude=True)
-    reranker_model_name: str
+    reranker_key: str = RERANKER  # Name of the shared reranker in the model registry
     top_n: int = 5
     
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        object.__setattr__(self, '_reranker', FlagReranker(self.reranker_model_name, use_fp16=True))
-    
-    # --- 2. CORRECT THE TYPE HINT HERE ---
     def _get_relevant_documents(self, query: str, **kwargs) -> List[Document]:
-    # -------------------------------------
-        """The required method for BaseRetriever, handles the full RAG pipeline."""
-        docs = self.base_retriever.invoke(query)
+        """
+        The required method for BaseRetriever, handles the full RAG pipeline.
+        Query rewriting is skipped when the question alone retrieves well (dense_confident,
+        rerank_confident), reuses cached variants, and is bounded by
+        MULTI_QUERY_TIMEOUT_SECONDS; on timeout the question-only results are used.
+        """
+        base = self.base_retriever
+        if not isinstance(base, FusedMultiQueryRetriever):
+            return self.rerank(query, base.invoke(query))
+        variants = base.cached_variants(query)
+        if variants is not None:
+            return self.rerank(query, base.search([query] + variants))
+
+        docs = base.search([query])
+        if base.dense_confident(docs, self.top_n):
+            return self._skip_rewrite(query, docs, "dense")
+        # The rewrite overlaps the question-only rerank only when that rerank cannot skip it;
+        # otherwise it starts once the rerank decided it is needed
+        overlap = config.MULTI_QUERY_SKIP_RERANK_SCORE is None
+        deadline = time.monotonic() + config.MULTI_QUERY_TIMEOUT_SECONDS
+        pending = self._submit_rewrite(query) if overlap else None
+        # The question-only rerank scores are cached by the rerank engine for the fused pass below
+        ranked = self.rerank(query, docs)
+        if self.rerank_confident(ranked):
+            return self._skip_rewrite(query, ranked, "rerank", rerank=False)
+        if not overlap:
+            deadline = time.monotonic() + config.MULTI_QUERY_TIMEOUT_SECONDS
+            pending = self._submit_rewrite(query)
+        if pending is None:
+            return self._rewrite_fallback(ranked, "busy")
+        try:
+            variants = pending.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            return self._rewrite_fallback(ranked, "timeout")
+        except Exception:
+            return self._rewrite_fallback(ranked, "failed")
+        return self.rerank(query, base.search(variants, fuse_with=docs)) if variants else ranked
+
+    async def aretrieve(self, query: str, run_cpu) -> List[Document]:
+        """Async counterpart of invoke(): the rewrite is awaited, search and rerank go through run_cpu."""
+        base = self.base_retriever
+        variants = base.cached_variants(query)
+        if variants is not None:
+            return await run_cpu(lambda: self.rerank(query, base.search([query] + variants)))
+
+        docs = await run_cpu(base.search, [query])
+        if base.dense_confident(docs, self.top_n):
+            return await run_cpu(self._skip_rewrite, query, docs, "dense")
+        overlap = config.MULTI_QUERY_SKIP_RERANK_SCORE is None
+        pending = self._start_arewrite(query) if overlap else None
+        ranked = await run_cpu(self.rerank, query, docs)
+        if self.rerank_confident(ranked):
+            return self._skip_rewrite(query, ranked, "rerank", rerank=False)
+        if not overlap:
+            pending = self._start_arewrite(query)
+        if pending is None:
+            return self._rewrite_fallback(ranked, "busy")
+        try:
+            # shield(): a timed-out rewrite keeps running and still fills the cache
+            variants = await asyncio.wait_for(asyncio.shield(pending), timeout=config.MULTI_QUERY_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return self._rewrite_fallback(ranked, "timeout")
+        except Exception:
+            return self._rewrite_fallback(ranked, "failed")
+        if not variants:
+            return ranked
+        return await run_cpu(lambda: self.rerank(query, base.search(variants, fuse_with=docs)))
+
+    def _submit_rewrite(self, query: str):
+        """Starts the LLM rewrite on _variant_executor; None when MULTI_QUERY_MAX_PENDING are running."""
+        if not _rewrite_slots.acquire(blocking=False):
+            return None
+        pending = _variant_executor.submit(contextvars.copy_context().run, self.base_retriever.generate_variants, query)
+        pending.add_done_callback(lambda _: _rewrite_slots.release())
+        return pending
+
+    def _start_arewrite(self, query: str):
+        """Async _submit_rewrite(): the rewrite runs as a task on the event loop."""
+        if not _rewrite_slots.acquire(blocking=False):
+            return None
+        pending = asyncio.ensure_future(self.base_retriever.agenerate_variants(query))
+
+        def done(task):
+            _rewrite_slots.release()
+            # Retrieve the exception of an abandoned rewrite so it is not reported as unhandled
+            task.cancelled() or task.exception()
+        pending.add_done_callback(done)
+        return pending
+
+    def rerank_confident(self, ranked: List[Document]) -> bool:
+        """True when all top_n reranked question-only chunks score at least MULTI_QUERY_SKIP_RERANK_SCORE."""
+        threshold = config.MULTI_QUERY_SKIP_RERANK_SCORE
+        return threshold is not None and len(ranked) >= self.top_n and \
+            all(d.metadata.get("rerank_score", float("-inf")) >= threshold for d in ranked)
+
+    def _skip_rewrite(self, query: str, docs: List[Document], reason: str, rerank: bool = True) -> List[Document]:
+        EVENTS.inc(event=f"multi_query_skipped_{reason}")
+        set_attribute("multi_query", f"skipped_{reason}")
+        return self.rerank(query, docs) if rerank else docs
+
+    def _rewrite_fallback(self, ranked: List[Document], reason: str) -> List[Document]:
+        EVENTS.inc(event=f"multi_query_{reason}")
+        set_attribute("multi_query", reason)
+        return ranked
+
+    def rerank(self, query: str, docs: List[Document]) -> List[Document]:
+        """Deduplicates the candidates and keeps the top_n by cross-encoder score."""
         if not docs: return []
         
         seen_content = set()
@@ -51,47 +383,61 @@ class CustomRerankerRetriever(BaseRetriever):
                 seen_content.add(doc.page_content)
                 unique_docs.append(doc)
         
+        RETRIEVAL_DOCS.observe(len(unique_docs), kind="unique")
         if not unique_docs: return []
         
-        pairs = [[query, doc.page_content] for doc in unique_docs]
-        scores = self._reranker.compute_score(pairs)
-        
-        if not isinstance(scores, list): scores = [scores]
-        
-        doc_score_pairs = list(zip(unique_docs, scores))
-        doc_score_pairs.sort(key=lambda x: x[1], reverse=True)
+        with span("rerank", candidates=len(unique_docs)), model_registry.use(self.reranker_key) as reranker:
+            ranked, timings = rerank_engine.rerank(reranker, query, unique_docs, self.top_n)
+        for stage, ms in timings.items():
+            record_stage(f"rerank_{stage}", ms / 1000)
         
-        reranked_docs = [doc for doc, score in doc_score_pairs[:self.top_n]]
-        print(f"DEBUG: Reranked from {len(unique_docs)} unique docs down to {len(reranked_docs)}.")
+        reranked_docs = []
+        for doc, score in ranked:
+            doc.metadata["rerank_score"] = score
+            reranked_docs.append(doc)
+        RETRIEVAL_DOCS.observe(len(reranked_docs), kind="reranked")
+        debug_payload("rerank_timings_ms", timings)
         return reranked_docs
 
-def get_retriever(collection_name: str) -> BaseRetriever:
-    """Creates a robust retriever using MultiQuery for diversity and a Custom Reranker for relevance."""
-    embeddings = HuggingFaceBgeEmbeddings(
-        model_name=config.EMBEDDING_MODEL_NAME,
-        model_kwargs=config.EMBEDDING_MODEL_KWARGS,
-        encode_kwargs=config.EMBEDDING_ENCODE_KWARGS
-    )
+def get_retriever(collection_name: str, num_variants: Optional[int] = None) -> BaseRetriever:
+    """
+    Creates a robust retriever using fused multi-query (dense + BM25) search for
+    diversity and a Custom Reranker for relevance. num_variants overrides config.MULTI_QUERY_VARIANTS
+    (0 skips the LLM query rewriting for latency-sensitive callers). Raises UnknownCollectionError
+    for a collection that was never ingested; nothing is created for it.
+    """
+    # Shared across requests; loaded once by the model registry
+    embeddings = model_registry.get(EMBEDDER)
     
-    vector_store = Chroma(
-        persist_directory=config.CHROMA_PERSIST_DIRECTORY,
-        embedding_function=embeddings,
-        collection_name=collection_name
-    )
+    # Documents ingested in corpus mode are searched in their corpus shard, restricted
+    # to their chunks; others (legacy layout) in their own collection
+    where = None
+    store_name = collection_name
+    marker = indexed_document(collection_name)
+    if marker is not None and marker.get("store") == CORPUS_STORE:
+        store_name = corpus.shard_name(corpus.shard_for(collection_name))
+        where = {"doc_id": collection_name}
 
-    base_retriever = vector_store.as_retriever(search_kwargs={"k": 50})
-    llm = get_llm()
+    # Open handles are shared across requests
+    vector_store = get_vector_store(store_name, create=False)
 
-    multi_query_retriever = MultiQueryRetriever.from_llm(
-        retriever=base_retriever,
-        llm=llm,
-        prompt=QUERY_GENERATION_PROMPT
+    multi_query_retriever = FusedMultiQueryRetriever(
+        vector_store=vector_store,
+        embeddings=embeddings,
+        llm=get_llm(),
+        # A missing BM25 index is rebuilt from the document's own collection, never from a whole shard
+        lexical_index=get_lexical_index(collection_name, vector_store._collection if where is None else None)
+            if config.HYBRID_RETRIEVAL else None,
+        where=where,
+        num_variants=config.MULTI_QUERY_VARIANTS if num_variants is None else int(num_variants),
+        k=config.RETRIEVAL_K,
+        lexical_k=config.LEXICAL_K,
+        rrf_k=config.RRF_K
     )
 
     final_retriever = CustomRerankerRetriever(
         base_retriever=multi_query_retriever,
-        reranker_model_name=config.CROSS_ENCODER_MODEL_NAME,
         top_n=config.RERANK_TOP_N
     )
     
-    return final_retriever
\ No newline at end of file
+    return final_retriever
@@ -0,0 +1,149 @@
+# backend/startup.py
+# Cold-start support. The web modules (app.py, asgi.py) only import light modules
+# at load time and import the pipeline (langchain, Chroma, numpy, the models) inside
+# their handlers. After the port is open, warm_up() imports the pipeline, opens
+# Chroma and loads the models on a background thread, component by component.
+# /healthz answers as soon as the process serves; /readyz answers 200 once every
+# required component is ready. Import and warm-up timings are kept for /readyz and
+# exported as legalai_startup_seconds{phase}.
+
+import importlib
+import threading
+import time
+
+import config
+from telemetry import metrics, get_logger
+
+log = get_logger(__name__)
+
+# Measured from the first import of this module (the web modules import it first)
+PROCESS_STARTED = time.perf_counter()
+
+# Modules the request handlers import lazily, imported up front during warm-up
+PIPELINE_MODULES = (
+    "chain_handler", "retriever_factory", "document_processor", "ingestion_jobs",
+    "answer_cache", "document_artifacts", "corpus", "embedding_cache", "llm_gateway",
+)
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+_lock = threading.Lock()
+_components = {}  # name -> {"state", "seconds", "error", "required"}
+_timings = {}  # phase -> seconds
+_warm_up_thread = None
+
+
+def record_timing(phase, seconds):
+    with _lock:
+        _timings[phase] = round(seconds, 3)
+
+
+def timed_import(name):
+    """Imports a module and records how long it took (0 when it was already imported)."""
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        _timings.setdefault(f"import:{name}", round(time.perf_counter() - started, 3))
+    return module
+
+
+def _set(name, state, **fields):
+    with _lock:
+        _components.setdefault(name, {"state": PENDING, "seconds": None, "error": None, "required": True})
+        _components[name].update(state=state, **fields)
+
+
+def _component(name, fn, required=True):
+    """Runs one warm-up step, tracking its state and duration. Returns True on success."""
+    _set(name, LOADING, required=required)
+    started = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        _set(name, FAILED, seconds=round(time.perf_counter() - started, 3), error=f"{type(e).__name__}: {e}")
+        return False
+    _set(name, READY, seconds=round(time.perf_counter() - started, 3))
+    record_timing(f"warm_up:{name}", time.perf_counter() - started)
+    return True
+
+
+def _import_pipeline():
+    for name in PIPELINE_MODULES:
+        timed_import(name)
+
+
+def _open_chroma():
+    from chroma_client import get_client
+    get_client().heartbeat()
+
+
+def _load_model(name):
+    from model_registry import model_registry
+    model_registry.warm_up([name])
+
+
+def _recover_ingest_jobs():
+    from ingestion_jobs import ingestion_queue
+    ingestion_queue.recover_interrupted()
+
+
+def _check_llm():
+    import requests
+    requests.get(f"{config.OLLAMA_BASE_URL}/api/version", timeout=config.LLM_CONNECT_TIMEOUT_SECONDS).raise_for_status()
+
+
+def _components_plan():
+    plan = [("imports", _import_pipeline, True), ("chroma", _open_chroma, True),
+            ("ingest_recovery", _recover_ingest_jobs, False)]
+    plan += [(f"model:{name}", lambda n=name: _load_model(n), True) for name in config.WARMUP_MODELS]
+    # Ollama is a separate service the gateway retries against; by default it does not gate readiness
+    plan.append(("llm", _check_llm, config.READY_REQUIRES_LLM))
+    return plan
+
+
+def warm_up():
+    """Runs every warm-up step in order (blocking). Failed steps are reported, not raised."""
+    started = time.perf_counter()
+    for name, fn, required in _components_plan():
+        _component(name, fn, required)
+    record_timing("warm_up_total", time.perf_counter() - started)
+    record_timing("ready_after_start", time.perf_counter() - PROCESS_STARTED)
+    state = "ready" if is_ready() else "not ready"
+    log.info("Warm-up finished in %.1fs (%s).", time.perf_counter() - started, state)
+
+
+def start_warm_up():
+    """Starts warm_up() on a background thread, once per process."""
+    global _warm_up_thread
+    with _lock:
+        if _warm_up_thread is not None:
+            return
+        for name, _, required in _components_plan():
+            _components.setdefault(name, {"state": PENDING, "seconds": None, "error": None, "required": required})
+        _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    _warm_up_thread.start()
+
+
+def is_ready():
+    with _lock:
+        return bool(_components) and all(c["state"] == READY for c in _components.values() if c["required"])
+
+
+def status():
+    """Per-component readiness plus the recorded import / warm-up timings."""
+    ready = is_ready()
+    with _lock:
+        return {
+            "ready": ready,
+            "uptime_s": round(time.perf_counter() - PROCESS_STARTED, 3),
+            "components": {name: dict(c) for name, c in _components.items()},
+            "timings_s": dict(_timings),
+        }
+
+
+metrics.gauge_callback("legalai_startup_seconds", "Import and warm-up durations of this process by phase.",
+                       lambda: dict(_timings), labelname="phase")
+metrics.gauge_callback("legalai_ready", "1 once every required component is warmed up.", lambda: int(is_ready()))
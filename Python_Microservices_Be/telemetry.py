@@ -0,0 +1,265 @@
+# backend/telemetry.py
+# Request tracing and metrics without per-request stdout I/O.
+#   - trace(name): one per request; spans opened inside it are attached to it.
+#   - span(name): times a pipeline stage into legalai_stage_duration_seconds.
+#   - Counter / Histogram / gauge callbacks, rendered for Prometheus at GET /metrics.
+# A sampled fraction of traces (config.TRACE_SAMPLE_RATE) is logged as one JSON
+# line with its spans and debug payloads (prompt, LLM output); logging runs on a
+# background thread so request threads never block on the log sink.
+# Operational messages go through get_logger(__name__) to stderr at config.LOG_LEVEL.
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import config
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 30, 50, 100, 200)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _label_string(labelnames, values):
+    if not labelnames:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labelnames, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_string(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets + ("+Inf",), series[:len(self.buckets)] + [series[-1]]):
+                    labels = _label_string(self.labelnames + ("le",), key + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_string(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {round(series[-2], 6)}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric of this process and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._gauges = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=SECONDS_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, name, help_text, fn, labelname=None):
+        """fn() returns a number, or {label value: number} when `labelname` is given; read at scrape time."""
+        self._gauges.append((name, help_text, fn, labelname))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help_text, fn, labelname in self._gauges:
+            try:
+                values = fn()
+            except Exception:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            if labelname is None:
+                lines.append(f"{name} {values}")
+            else:
+                lines.extend(f"{name}{_label_string((labelname,), (label,))} {value}" for label, value in values.items())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_DURATION = metrics.histogram(
+    "legalai_stage_duration_seconds", "Duration of a pipeline stage.", ["stage"])
+REQUEST_DURATION = metrics.histogram(
+    "legalai_request_duration_seconds", "End-to-end duration of a traced request.", ["trace", "outcome"])
+RETRIEVAL_DOCS = metrics.histogram(
+    "legalai_retrieval_docs", "Documents per request after each retrieval step (retrieved, unique, reranked).",
+    ["kind"], buckets=COUNT_BUCKETS)
+PROMPT_TOKENS = metrics.histogram(
+    "legalai_prompt_tokens", "Prompt tokens sent to the LLM (estimated when Ollama does not report them).",
+    ["prompt_type"], buckets=TOKEN_BUCKETS)
+GENERATED_TOKENS = metrics.histogram(
+    "legalai_generated_tokens", "Tokens generated per LLM answer.", ["prompt_type"], buckets=TOKEN_BUCKETS)
+GENERATION_SECONDS = metrics.histogram(
+    "legalai_generation_seconds", "Wall time of one LLM answer generation.", ["prompt_type"])
+CONTEXT_TOKENS = metrics.histogram(
+    "legalai_context_tokens", "Context tokens per request before and after packing.", ["stage"], buckets=TOKEN_BUCKETS)
+CONTEXT_TOKENS_SAVED = metrics.histogram(
+    "legalai_context_tokens_saved", "Context tokens removed by packing per request.", ["prompt_type"],
+    buckets=(0,) + TOKEN_BUCKETS)
+EVENTS = metrics.counter(
+    "legalai_events_total", "Notable events (uploads by outcome, empty contexts, validation results, ...).", ["event"])
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English legal text)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+# --- Sampled trace log ---
+_trace_logger = logging.getLogger("legalai.trace")
+_trace_logger.propagate = False
+_trace_logger.setLevel(logging.INFO)
+_log_queue = queue.SimpleQueue()
+_trace_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_sink = logging.FileHandler(config.TRACE_LOG_PATH) if config.TRACE_LOG_PATH else logging.StreamHandler(sys.stderr)
+_listener = logging.handlers.QueueListener(_log_queue, _sink)
+_listener.start()
+atexit.register(_listener.stop)
+
+# --- Operational log ---
+_app_logger = logging.getLogger("legalai")
+_app_logger.propagate = False
+_app_logger.setLevel(config.LOG_LEVEL)
+_app_handler = logging.StreamHandler(sys.stderr)
+_app_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_app_logger.addHandler(_app_handler)
+
+
+def get_logger(module_name):
+    """The logger for a module's operational messages."""
+    return logging.getLogger(f"legalai.{module_name}")
+
+
+class Trace:
+    def __init__(self, name, sampled, attributes):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.attributes = dict(attributes)
+        self.spans = []
+        self.debug = {}
+
+    def to_dict(self, duration_s):
+        return {"trace_id": self.trace_id, "name": self.name, "duration_ms": round(duration_s * 1000, 2),
+                "attributes": self.attributes, "spans": self.spans, "debug": self.debug}
+
+
+_current_trace = contextvars.ContextVar("legalai_trace", default=None)
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Traces one request. Code running inside (including copied contexts on other threads) adds spans to it."""
+    current = Trace(name, random.random() < config.TRACE_SAMPLE_RATE, attributes)
+    token = _current_trace.set(current)
+    outcome = "ok"
+    try:
+        yield current
+    except BaseException as e:
+        outcome = "error"
+        current.attributes["error"] = repr(e)
+        raise
+    finally:
+        _current_trace.reset(token)
+        duration = time.perf_counter() - current.started
+        REQUEST_DURATION.observe(duration, trace=name, outcome=current.attributes.get("outcome", outcome))
+        if current.sampled:
+            _trace_logger.info(json.dumps(current.to_dict(duration), default=str))
+
+
+@contextmanager
+def span(name, **attributes):
+    """Times a stage; recorded in the stage histogram and, inside a trace, as one of its spans."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_DURATION.observe(duration, stage=name)
+        current = _current_trace.get()
+        if current is not None:
+            current.spans.append({"name": name, "start_ms": round((started - current.started) * 1000, 2),
+                                  "duration_ms": round(duration * 1000, 2), **attributes})
+
+
+def record_stage(name, seconds):
+    """Records an already measured stage duration (e.g. the rerank engine's own timings)."""
+    STAGE_DURATION.observe(seconds, stage=name)
+
+
+def set_attribute(key, value):
+    current = _current_trace.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def is_sampled():
+    current = _current_trace.get()
+    return current is not None and current.sampled
+
+
+def debug_payload(key, value):
+    """
+    Attaches a debug payload to a sampled trace. `value` may be a callable so the
+    payload is only built for sampled requests; text is cut to TRACE_DEBUG_PAYLOAD_CHARS.
+    """
+    current = _current_trace.get()
+    if current is None or not current.sampled:
+        return
+    if callable(value):
+        value = value()
+    if isinstance(value, str):
+        value = value[:config.TRACE_DEBUG_PAYLOAD_CHARS]
+    current.debug[key] = value
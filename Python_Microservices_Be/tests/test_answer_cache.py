@@ -0,0 +1,84 @@
+# backend/tests/test_answer_cache.py
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+answer_cache = pytest.importorskip("answer_cache")
+
+QUESTIONS = {
+    "who is the petitioner": [1.0, 0.0, 0.0],
+    "who is the petitioner?": [0.99, 0.141, 0.0],
+    "what was the holding": [0.0, 1.0, 0.0],
+}
+
+
+def open_cache(tmp_path, ttl_seconds=3600, model="model-a"):
+    # One instance per simulated worker process, sharing the SQLite file
+    cache = answer_cache.SemanticAnswerCache(str(tmp_path / "answers.sqlite3"), 0.95, 10, ttl_seconds)
+    cache.embed = lambda question: np.asarray(QUESTIONS[question], dtype=np.float32)
+    cache.recipe = lambda prompt_type: f"{model}/{prompt_type}"
+    return cache
+
+
+def ask(cache, question, collection_name="legal_case_a"):
+    entry, embedding = cache.lookup(collection_name, None, question)
+    if entry is None:
+        cache.store(collection_name, None, question, embedding, f"answer to {question}", [])
+    return entry
+
+
+def test_similar_question_in_the_same_collection_hits(tmp_path):
+    cache = open_cache(tmp_path)
+    ask(cache, "who is the petitioner")
+
+    assert ask(cache, "who is the petitioner?")["answer"] == "answer to who is the petitioner"
+    assert ask(cache, "what was the holding") is None
+    assert ask(cache, "who is the petitioner", collection_name="legal_case_b") is None
+
+
+def test_expired_entries_miss(tmp_path, monkeypatch):
+    cache = open_cache(tmp_path, ttl_seconds=60)
+    ask(cache, "who is the petitioner")
+
+    now = answer_cache.time.time()
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now + 61)
+
+    assert ask(cache, "who is the petitioner") is None
+
+
+def test_invalidation_reaches_other_processes(tmp_path):
+    worker, ingester = open_cache(tmp_path), open_cache(tmp_path)
+    ask(worker, "who is the petitioner")
+    ask(worker, "who is the petitioner", collection_name="legal_case_b")
+    ask(ingester, "what was the holding")  # Loads the worker's rows
+
+    ingester.invalidate_collection("legal_case_a")
+
+    assert ask(worker, "who is the petitioner") is None
+    assert ask(worker, "who is the petitioner", collection_name="legal_case_b") is not None
+    rows = sqlite3.connect(str(tmp_path / "answers.sqlite3")).execute(
+        "SELECT collection_name, question FROM answers ORDER BY collection_name").fetchall()
+    assert rows == [("legal_case_a", "who is the petitioner"), ("legal_case_b", "who is the petitioner")]
+
+
+def test_answers_from_another_model_or_prompt_recipe_miss(tmp_path):
+    ask(open_cache(tmp_path, model="model-a"), "who is the petitioner")
+
+    assert ask(open_cache(tmp_path, model="model-b"), "who is the petitioner") is None
+    assert ask(open_cache(tmp_path, model="model-a"), "who is the petitioner") is not None
+
+
+def test_a_cache_file_from_before_recipes_is_upgraded(tmp_path):
+    db = sqlite3.connect(str(tmp_path / "answers.sqlite3"))
+    db.execute("CREATE TABLE answers (id TEXT PRIMARY KEY, collection_name TEXT, prompt_type TEXT, question TEXT, "
+               "embedding BLOB, answer TEXT, sources TEXT, created_at REAL, last_used REAL)")
+    db.execute("INSERT INTO answers VALUES ('old', 'legal_case_a', 'default_fallback', 'who is the petitioner', ?, "
+               "'old answer', '[]', ?, ?)", (np.asarray([1.0, 0.0, 0.0], dtype=np.float32).tobytes(),
+                                            answer_cache.time.time(), answer_cache.time.time()))
+    db.commit()
+    cache = open_cache(tmp_path)
+
+    assert ask(cache, "who is the petitioner") is None  # Unknown recipe
+    assert ask(cache, "who is the petitioner")["answer"] == "answer to who is the petitioner"
@@ -0,0 +1,44 @@
+# backend/tests/test_app.py
+
+import pytest
+
+pytest.importorskip("flask")
+
+import app as app_module
+from chroma_client import UnknownCollectionError
+
+
+@pytest.mark.parametrize("value, expected", [(None, None), (0, 0), (2, 2), ("3", 3), (-4, 0), (99, 5)])
+def test_num_variants_is_clamped_to_the_configured_range(monkeypatch, value, expected):
+    monkeypatch.setattr(app_module.config, "MULTI_QUERY_VARIANTS", 5)
+
+    assert app_module.parse_num_variants(value) == expected
+
+
+@pytest.mark.parametrize("value", ["many", 2.5, True, [3]])
+def test_num_variants_that_is_not_an_integer_is_rejected(value):
+    with pytest.raises(ValueError):
+        app_module.parse_num_variants(value)
+
+
+def test_ask_rag_answers_400_for_a_bad_num_variants_and_clamps_a_large_one(monkeypatch):
+    retriever_factory = pytest.importorskip("retriever_factory")
+    document_artifacts = pytest.importorskip("document_artifacts")
+    requested = []
+
+    def get_retriever(collection_name, num_variants=None):
+        requested.append(num_variants)
+        raise UnknownCollectionError(collection_name)
+
+    monkeypatch.setattr(app_module.config, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(app_module.config, "MULTI_QUERY_VARIANTS", 5)
+    monkeypatch.setattr(document_artifacts, "get_precomputed", lambda collection_name, prompt_type: None)
+    monkeypatch.setattr(retriever_factory, "get_retriever", get_retriever)
+    client = app_module.app.test_client()
+    payload = {"question": "Was bail granted?", "collection_name": "legal_case_a"}
+
+    bad = client.post("/api/ask_rag", json={**payload, "num_variants": "several"})
+    large = client.post("/api/ask_rag", json={**payload, "num_variants": 1000})
+
+    assert bad.status_code == 400 and "num_variants" in bad.get_json()["error"]
+    assert large.status_code == 404 and requested == [5]
@@ -0,0 +1,84 @@
+# backend/tests/test_asgi.py
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("starlette")
+asgi = pytest.importorskip("asgi")
+
+SCOPE = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "method": "POST", "path": "/"}
+
+
+async def never_disconnects():
+    await asyncio.sleep(3600)
+
+
+def test_limiter_rejects_beyond_the_waiting_room():
+    async def scenario():
+        limiter = asgi.ConcurrencyLimiter(max_active=1, max_waiting=0)
+        await limiter.acquire()
+        with pytest.raises(asgi.Overloaded):
+            await limiter.acquire()
+        limiter.release()
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+
+    asyncio.run(scenario())
+
+
+def test_stream_permit_is_returned_after_the_body_is_sent():
+    async def scenario():
+        limiter = asgi.ConcurrencyLimiter(max_active=1, max_waiting=0)
+        await limiter.acquire()
+        sent = []
+
+        async def events():
+            yield "event: done\ndata: {}\n\n"
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi.PermitStreamingResponse(limiter, events())(SCOPE, never_disconnects, send)
+        assert sent[-1]["type"] == "http.response.body"
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+
+    asyncio.run(scenario())
+
+
+def test_stream_permit_is_returned_when_the_body_never_starts():
+    async def scenario():
+        limiter = asgi.ConcurrencyLimiter(max_active=1, max_waiting=0)
+        await limiter.acquire()
+        started = []
+
+        async def events():
+            started.append(True)
+            yield "event: done\ndata: {}\n\n"
+
+        async def send(message):
+            raise OSError("client disconnected")
+
+        with pytest.raises(Exception):
+            await asgi.PermitStreamingResponse(limiter, events())(SCOPE, never_disconnects, send)
+        assert started == []
+        # Raises Overloaded if the permit was lost
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+
+    asyncio.run(scenario())
+
+
+def test_ask_payload_rejects_a_non_integer_num_variants():
+    class Request:
+        def __init__(self, data):
+            self.data = data
+
+        async def json(self):
+            return self.data
+
+    async def scenario():
+        payload = {"question": "q", "collection_name": "legal_case_a"}
+        with pytest.raises(ValueError):
+            await asgi.read_ask_payload(Request({**payload, "num_variants": "lots"}))
+        return await asgi.read_ask_payload(Request({**payload, "num_variants": -2}))
+
+    assert asyncio.run(scenario()) == ("q", "legal_case_a", None, 0)
@@ -0,0 +1,173 @@
+# backend/tests/test_bulk_ingest.py
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+bulk_ingest = pytest.importorskip("bulk_ingest")
+document_processor = pytest.importorskip("document_processor")
+model_registry = pytest.importorskip("model_registry")
+embedding_cache = pytest.importorskip("embedding_cache")
+corpus = pytest.importorskip("corpus")
+chroma_client = pytest.importorskip("chroma_client")
+answer_cache = pytest.importorskip("answer_cache")
+
+
+def make_pdf(directory, name, body):
+    path = directory / name
+    path.write_bytes(b"%PDF-1.4 " + body)
+    return str(path)
+
+
+def test_manifest_keeps_the_last_entry_per_path_and_ignores_a_cut_line(tmp_path):
+    pdf = make_pdf(tmp_path, "a.pdf", b"judgment")
+    manifest = bulk_ingest.Manifest(str(tmp_path / "manifest.jsonl"))
+    manifest.record(pdf, bulk_ingest.WRITING, collection_name="doc_a")
+    manifest.record(pdf, bulk_ingest.DONE, collection_name="doc_a", chunks=3)
+    manifest.close()
+    with open(tmp_path / "manifest.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"path": "' + pdf + '", "status": "fai')
+
+    reopened = bulk_ingest.Manifest(str(tmp_path / "manifest.jsonl"))
+
+    assert reopened.status(pdf) == bulk_ingest.DONE
+    assert reopened.entries[pdf]["chunks"] == 3
+    reopened.close()
+
+
+def test_manifest_forgets_a_file_that_changed_since(tmp_path):
+    pdf = make_pdf(tmp_path, "a.pdf", b"judgment")
+    manifest = bulk_ingest.Manifest(str(tmp_path / "manifest.jsonl"))
+    manifest.record(pdf, bulk_ingest.DONE)
+
+    with open(pdf, "ab") as f:
+        f.write(b" amended")
+
+    assert manifest.status(pdf) is None
+    manifest.close()
+
+
+@pytest.fixture
+def offline_run(monkeypatch):
+    """run() with a thread pool, a fake parser and the embedding/writing step recorded."""
+    parsed, written = [], []
+
+    def parse_document(path):
+        parsed.append(path)
+        return {"valid": True, "chunks": [("Bail was granted.", {"source": path})], "head": ""}
+
+    def embed_and_write(self, ready):
+        for path, collection_name, _, _ in ready:
+            written.append(path)
+            self.finish(path, bulk_ingest.DONE, collection_name=collection_name, chunks=1)
+
+    monkeypatch.setattr(bulk_ingest, "ProcessPoolExecutor",
+                        lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+    monkeypatch.setattr(bulk_ingest, "parse_document", parse_document)
+    monkeypatch.setattr(bulk_ingest.BulkIngester, "embed_and_write", embed_and_write)
+    monkeypatch.setattr(model_registry.model_registry, "get", lambda name: object())
+    return parsed, written
+
+
+def test_a_resumed_run_skips_finished_and_already_indexed_documents(tmp_path, monkeypatch, offline_run):
+    parsed, written = offline_run
+    corpus_dir = tmp_path / "pdfs"
+    corpus_dir.mkdir()
+    finished = make_pdf(corpus_dir, "finished.pdf", b"first")
+    indexed = make_pdf(corpus_dir, "indexed.pdf", b"second")
+    new = make_pdf(corpus_dir, "new.pdf", b"third")
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    manifest = bulk_ingest.Manifest(manifest_path)
+    manifest.record(finished, bulk_ingest.DONE)
+    manifest.close()
+
+    indexed_name = document_processor.generate_collection_name(indexed)
+    monkeypatch.setattr(document_processor, "is_collection_indexed", lambda name: name == indexed_name)
+
+    bulk_ingest.run([str(corpus_dir)], workers=2, manifest_path=manifest_path, retry_failed=False, report_every=60)
+
+    assert parsed == [new] and written == [new]
+    with open(manifest_path, encoding="utf-8") as f:
+        statuses = {entry["path"]: entry["status"] for entry in map(json.loads, f)}
+    assert statuses == {finished: bulk_ingest.DONE, indexed: bulk_ingest.SKIPPED, new: bulk_ingest.DONE}
+
+
+class FakeCollection:
+    def __init__(self, fail_on_call=None):
+        self.upserts = []
+        self.fail_on_call = fail_on_call
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if len(self.upserts) + 1 == self.fail_on_call:
+            raise RuntimeError("Chroma is unavailable")
+        self.upserts.append({"ids": ids, "metadatas": metadatas})
+
+
+@pytest.fixture
+def ingester(tmp_path, monkeypatch):
+    """A BulkIngester writing to fake collections; records embedding calls and dropped documents."""
+    calls, dropped = [], []
+
+    def embed_documents(embeddings, texts):
+        calls.append(list(texts))
+        if any("unreadable" in text for text in texts):
+            raise RuntimeError("embedder crashed")
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(model_registry.model_registry, "get", lambda name: object())
+    monkeypatch.setattr(embedding_cache, "embed_documents", embed_documents)
+    monkeypatch.setattr(answer_cache.answer_cache, "invalidate_collection", lambda name: None)
+    monkeypatch.setattr(document_processor, "delete_collection", dropped.append)
+    monkeypatch.setattr(bulk_ingest.config, "INDEXED_DOCUMENTS_DIRECTORY", str(tmp_path / "indexed"))
+    monkeypatch.setattr(bulk_ingest.config, "LEXICAL_INDEX_DIRECTORY", str(tmp_path / "bm25"))
+    manifest = bulk_ingest.Manifest(str(tmp_path / "manifest.jsonl"))
+    yield bulk_ingest.BulkIngester(manifest, embed_batch=2, write_batch=3), calls, dropped
+    manifest.close()
+
+
+def parsed_document(tmp_path, name, texts):
+    path = make_pdf(tmp_path, f"{name}.pdf", name.encode())
+    parsed = {"valid": True, "chunks": [(text, {"page": 0}) for text in texts], "head": "IN THE HIGH COURT OF DELHI AT NEW DELHI"}
+    return (path, f"legal_case_{name}", parsed, 0.0)
+
+
+def test_a_failed_embedding_call_fails_only_its_documents(tmp_path, monkeypatch, ingester):
+    ingester, calls, dropped = ingester
+    collections = {}
+    client = type("Client", (), {"get_or_create_collection":
+                                 lambda self, name: collections.setdefault(name, FakeCollection())})()
+    monkeypatch.setattr(bulk_ingest.config, "CORPUS_MODE", False)
+    monkeypatch.setattr(chroma_client, "get_client", lambda: client)
+    ready = [parsed_document(tmp_path, "a", ["a0", "a1"]),
+             parsed_document(tmp_path, "b", ["b0", "unreadable b1", "b2"]),
+             parsed_document(tmp_path, "c", ["c0"])]
+
+    ingester.embed_and_write(ready)
+
+    assert calls == [["a0", "a1"], ["b0", "unreadable b1"], ["c0"]]  # b2 is not embedded after b failed
+    assert sorted(collections) == ["legal_case_a", "legal_case_c"] and dropped == []
+    assert ingester.manifest.status(ready[1][0]) == bulk_ingest.FAILED
+    assert "embedder crashed" in ingester.manifest.entries[ready[1][0]]["error"]
+    assert [ingester.manifest.status(doc[0]) for doc in (ready[0], ready[2])] == [bulk_ingest.DONE] * 2
+    assert document_processor.is_collection_indexed("legal_case_a")
+    assert not document_processor.is_collection_indexed("legal_case_b")
+
+
+def test_corpus_upserts_span_documents_and_a_failed_one_fails_its_documents(tmp_path, monkeypatch, ingester):
+    ingester, _, dropped = ingester
+    shard = FakeCollection(fail_on_call=2)
+    monkeypatch.setattr(bulk_ingest.config, "CORPUS_MODE", True)
+    monkeypatch.setattr(corpus, "shard_of", lambda doc_id: shard)
+    monkeypatch.setattr(corpus, "shard_for", lambda doc_id: 0)
+    ready = [parsed_document(tmp_path, "a", ["a0", "a1"]), parsed_document(tmp_path, "b", ["b0", "b1"])]
+
+    ingester.embed_and_write(ready)
+
+    (upsert,) = shard.upserts  # The second upsert (b1) failed
+    assert upsert["ids"] == ["legal_case_a_0", "legal_case_a_1", "legal_case_b_0"]
+    assert [metadata["doc_id"] for metadata in upsert["metadatas"]] == ["legal_case_a"] * 2 + ["legal_case_b"]
+    assert upsert["metadatas"][0]["court"]
+    assert ingester.manifest.status(ready[0][0]) == bulk_ingest.DONE
+    assert ingester.manifest.status(ready[1][0]) == bulk_ingest.FAILED
+    assert dropped == ["legal_case_b"]  # Its partly written chunks are removed
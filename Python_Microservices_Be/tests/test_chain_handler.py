@@ -0,0 +1,75 @@
+# backend/tests/test_chain_handler.py
+
+import pytest
+
+chain_handler = pytest.importorskip("chain_handler")
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+DOCS = [
+    Document(page_content="Bail was granted on 3 May 2021 subject to conditions.", metadata={"page": 2}),
+    Document(page_content="The appeal against conviction was dismissed on merits.", metadata={"page": 9}),
+]
+
+
+class RecordingRetriever:
+    """Runnable-like retriever counting how often it is asked."""
+
+    def __init__(self):
+        self.questions = []
+
+    def __call__(self, question):
+        self.questions.append(question)
+        return list(DOCS)
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    prompts = []
+
+    def answer(prompt):
+        # A formatted prompt value or the list of messages, depending on how the chain calls the LLM
+        messages = prompt.to_messages() if hasattr(prompt, "to_messages") else prompt
+        prompts.append("\n".join(str(message.content) for message in messages))
+        return AIMessage(content="Bail was granted.")
+
+    monkeypatch.setattr(chain_handler, "get_llm", lambda *args, **kwargs: RunnableLambda(answer))
+    return prompts
+
+
+def test_rag_chain_returns_the_answer_with_the_documents_it_used(prompts):
+    retriever = RecordingRetriever()
+    chain = chain_handler.get_rag_chain(RunnableLambda(retriever), return_sources=True)
+
+    result = chain.invoke({"question": "Was bail granted?", "prompt_type": None})
+
+    assert retriever.questions == ["Was bail granted?"]  # Retrieved once
+    assert result["answer"] == "Bail was granted."
+    assert [doc.page_content for doc in result["docs"]] == [doc.page_content for doc in DOCS]
+    assert all(doc.page_content in prompts[0] for doc in result["docs"])
+
+
+def test_rag_chain_without_sources_returns_the_answer_only(prompts):
+    chain = chain_handler.get_rag_chain(RunnableLambda(RecordingRetriever()))
+
+    assert chain.invoke({"question": "Was bail granted?", "prompt_type": None}) == "Bail was granted."
+
+
+def test_streamed_answer_sends_the_sources_before_the_tokens(monkeypatch):
+    chunks = [AIMessage(content="Bail "), AIMessage(content=""), AIMessage(content="was granted.")]
+    streamed = []
+
+    class StreamingLLM:
+        def stream(self, messages):
+            streamed.append(messages)
+            yield from chunks
+
+    monkeypatch.setattr(chain_handler, "get_llm", lambda *args, **kwargs: StreamingLLM())
+
+    events = chain_handler.stream_rag_answer(RunnableLambda(RecordingRetriever()), "Was bail granted?")
+
+    kind, docs = next(events)
+    assert kind == "sources" and len(docs) == 2
+    assert streamed == []  # The sources go out before the LLM is called
+    assert list(events) == [("token", "Bail "), ("token", "was granted.")]
@@ -0,0 +1,66 @@
+# backend/tests/test_context_packer.py
+
+import pytest
+
+context_packer = pytest.importorskip("context_packer")
+from langchain_core.documents import Document
+
+BOILERPLATE = "The learned counsel for the respondent supported the impugned order in full."
+
+
+def chunk(text, index, page=1, score=0.0, doc_id="legal_case_a"):
+    return Document(page_content=text, metadata={"chunk_id": f"{doc_id}_{index}", "page": page,
+                                                 "doc_id": doc_id, "rerank_score": score})
+
+
+def sentences(count, word):
+    return " ".join(f"Sentence {i} of the {word} passage states a distinct finding." for i in range(count))
+
+
+@pytest.fixture(autouse=True)
+def packing_config(monkeypatch):
+    monkeypatch.setattr(context_packer.config, "CONTEXT_TOKEN_BUDGETS", {"default": 1000, "short": 220})
+    monkeypatch.setattr(context_packer.config, "CONTEXT_ORDER", "document")
+
+
+def test_adjacent_chunks_merge_without_the_splitter_overlap():
+    first = chunk("The appeal was filed in 2019. The High Court", 0, score=2.0)
+    second = chunk("The High Court dismissed it on merits.", 1, score=5.0)
+
+    passages, merges = context_packer.merge_adjacent([second, first])
+
+    assert merges == 1
+    assert passages[0]["text"] == "The appeal was filed in 2019. The High Court dismissed it on merits."
+    assert passages[0]["score"] == 5.0
+
+
+def test_sentences_repeated_in_a_lower_ranked_passage_are_dropped():
+    best = chunk(f"{BOILERPLATE} The bail was granted.", 0, page=1, score=9.0)
+    other = chunk(f"{BOILERPLATE} The appeal was allowed.", 4, page=7, score=1.0)
+
+    packed, report = context_packer.pack_context([other, best])
+
+    assert [doc.page_content for doc in packed] == [f"{BOILERPLATE} The bail was granted.", "The appeal was allowed."]
+    assert report["duplicate_sentences_removed"] == 1
+
+
+def test_budget_keeps_the_best_passages_and_cuts_the_last_at_a_sentence():
+    best = chunk(sentences(8, "best"), 0, page=9, score=9.0)
+    second = chunk(sentences(8, "second"), 0, page=2, score=5.0)
+    worst = chunk(sentences(8, "worst"), 0, page=1, score=1.0)
+
+    packed, report = context_packer.pack_context([worst, second, best], prompt_type="short")
+
+    assert report["tokens_after"] <= 220
+    assert [doc.metadata["page"] for doc in packed] == [2, 9]  # Document order
+    assert packed[1].page_content == sentences(8, "best")
+    assert packed[0].page_content.endswith("finding.") and len(packed[0].page_content) < len(sentences(8, "second"))
+
+
+def test_relevance_order_puts_the_best_passage_first(monkeypatch):
+    monkeypatch.setattr(context_packer.config, "CONTEXT_ORDER", "relevance")
+    docs = [chunk("Facts on page one.", 0, page=1, score=1.0), chunk("Holding on page nine.", 0, page=9, score=8.0)]
+
+    packed, _ = context_packer.pack_context(docs)
+
+    assert [doc.page_content for doc in packed] == ["Holding on page nine.", "Facts on page one."]
@@ -0,0 +1,67 @@
+# backend/tests/test_corpus.py
+
+import pytest
+
+corpus = pytest.importorskip("corpus")
+
+
+class FakeShard:
+    def __init__(self, name, hits):
+        self.name = name
+        self.hits = hits
+
+    def count(self):
+        return len(self.hits)
+
+    def query(self, query_embeddings, n_results, where, include):
+        hits = self.hits[:n_results]
+        return {"ids": [[h[0] for h in hits]], "documents": [[h[1] for h in hits]],
+                "metadatas": [[h[2] for h in hits]], "distances": [[h[3] for h in hits]]}
+
+
+class FakeClient:
+    def __init__(self, hits_by_shard):
+        self.hits_by_shard = hits_by_shard
+        self.opened = []
+
+    def get_or_create_collection(self, name):
+        self.opened.append(name)
+        return FakeShard(name, self.hits_by_shard.get(name, []))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient({
+        corpus.shard_name(0): [("a_0", "a", {"doc_id": "a"}, 0.4)],
+        corpus.shard_name(1): [("b_0", "b", {"doc_id": "b"}, 0.1), ("b_1", "b1", {"doc_id": "b"}, 0.7)],
+    })
+    monkeypatch.setattr(corpus, "get_client", lambda: client)
+    monkeypatch.setattr(corpus, "_shards", {})
+    return client
+
+
+def test_shard_handles_are_opened_once(client):
+    corpus._query_shards([0.0], 5, None)
+    corpus._query_shards([0.0], 5, None)
+
+    assert sorted(client.opened) == sorted(corpus.shard_name(i) for i in range(corpus.config.CORPUS_NUM_SHARDS))
+
+
+def test_shard_hits_are_merged_nearest_first(client):
+    hits = corpus._query_shards([0.0], 5, None)
+
+    assert [hit[0] for hit in hits] == ["b_0", "a_0", "b_1"]
+
+
+def test_build_where_combines_filters():
+    assert corpus.build_where({}) is None
+    assert corpus.build_where({"court": "High Court of Delhi"}) == {"court": "high court of delhi"}
+    assert corpus.build_where({"year_from": "2015", "year_to": 2020}) == {
+        "$and": [{"year": {"$gte": 2015}}, {"year": {"$lte": 2020}}]}
+
+
+def test_case_metadata_is_read_from_the_first_pages():
+    metadata = corpus.extract_case_metadata(
+        "IN THE HIGH COURT OF DELHI AT NEW DELHI\nCriminal Appeal No. 117 of 2019\nJudgment dated 2021")
+
+    assert metadata == {"court": "high court of delhi", "case_number": "criminal appeal no. 117 of 2019", "year": 2019}
@@ -0,0 +1,71 @@
+# backend/tests/test_document_artifacts.py
+
+import threading
+
+import pytest
+
+document_artifacts = pytest.importorskip("document_artifacts")
+document_processor = pytest.importorskip("document_processor")
+
+
+@pytest.fixture
+def indexed(monkeypatch, tmp_path):
+    indexed = set()
+    monkeypatch.setattr(document_processor, "is_collection_indexed", lambda name: name in indexed)
+    monkeypatch.setattr(document_artifacts.config, "ARTIFACT_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(document_artifacts.config, "PRECOMPUTE_ARTIFACTS", True)
+    return indexed
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Records each build reaching the chunk load; the first one waits for `release`."""
+    builds, release = [], threading.Event()
+    started, finished = threading.Event(), threading.Semaphore(0)
+
+    def load_chunks(collection_name):
+        builds.append(collection_name)
+        started.set()
+        release.wait(5)
+        finished.release()
+        return []
+
+    monkeypatch.setattr(document_artifacts, "_load_chunks", load_chunks)
+    return builds, started, release, finished
+
+
+def test_ask_during_ingestion_schedules_no_build(monkeypatch, indexed):
+    scheduled = []
+    monkeypatch.setattr(document_artifacts.artifact_builder, "schedule", scheduled.append)
+
+    assert document_artifacts.get_precomputed("legal_case_a", "contextual_case_summary") is None
+    indexed.add("legal_case_a")
+    document_artifacts.get_precomputed("legal_case_a", "contextual_case_summary")
+
+    assert scheduled == ["legal_case_a"]
+
+
+def test_build_of_an_unindexed_document_reads_nothing(indexed, builds):
+    loaded = builds[0]
+    builder = document_artifacts.ArtifactBuilder(max_workers=1)
+    builder.schedule("legal_case_a", force=True)
+    builder._executor.shutdown(wait=True)
+
+    assert loaded == []
+
+
+def test_forced_rebuild_during_a_build_runs_after_it(indexed, builds):
+    loaded, started, release, finished = builds
+    indexed.add("legal_case_a")
+    builder = document_artifacts.ArtifactBuilder(max_workers=1)
+
+    assert builder.schedule("legal_case_a")
+    started.wait(5)  # The first build is reading the chunks
+    assert not builder.schedule("legal_case_a", force=True)
+    assert not builder.schedule("legal_case_a")
+    release.set()
+
+    assert finished.acquire(timeout=5) and finished.acquire(timeout=5)
+    builder._executor.shutdown(wait=True)
+    assert loaded == ["legal_case_a", "legal_case_a"]
+    assert not builder.is_building("legal_case_a")
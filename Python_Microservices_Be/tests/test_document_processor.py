@@ -0,0 +1,51 @@
+# backend/tests/test_document_processor.py
+
+import pytest
+
+document_processor = pytest.importorskip("document_processor")
+
+
+def write(path, body):
+    path.write_bytes(body)
+    return str(path)
+
+
+def test_collection_name_follows_the_content_not_the_filename(tmp_path):
+    first = write(tmp_path / "judgment.pdf", b"%PDF-1.4 judgment A")
+    renamed = write(tmp_path / "copy of judgment.pdf", b"%PDF-1.4 judgment A")
+    other = write(tmp_path / "other.pdf", b"%PDF-1.4 judgment B")
+
+    name = document_processor.generate_collection_name(first)
+
+    assert name.startswith("legal_case_")
+    assert document_processor.generate_collection_name(renamed) == name
+    assert document_processor.generate_collection_name(other) != name
+
+
+def test_indexed_document_is_not_parsed_or_embedded_again(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("re-parsed an indexed document")
+
+    monkeypatch.setattr(document_processor, "is_collection_indexed", lambda collection_name: True)
+    monkeypatch.setattr(document_processor, "iter_pages", fail)
+    monkeypatch.setattr(document_processor, "embed_documents", fail)
+
+    assert document_processor.load_and_embed_pdf(write(tmp_path / "a.pdf", b"%PDF"), "legal_case_a") == 0
+
+
+
+def test_deleting_a_document_drops_its_marker_and_cached_answers(tmp_path, monkeypatch):
+    deleted, invalidated = [], []
+    client = type("Client", (), {"delete_collection": lambda self, name: deleted.append(name)})()
+    monkeypatch.setattr(document_processor.config, "INDEXED_DOCUMENTS_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(document_processor.config, "CORPUS_MODE", False)
+    monkeypatch.setattr(document_processor, "get_client", lambda: client)
+    monkeypatch.setattr(document_processor, "delete_index", lambda collection_name: None)
+    monkeypatch.setattr(document_processor, "delete_artifacts", lambda collection_name: None)
+    monkeypatch.setattr(document_processor.answer_cache, "invalidate_collection", invalidated.append)
+    document_processor.mark_indexed("legal_case_a", 3, document_processor.COLLECTION_STORE)
+
+    document_processor.delete_collection("legal_case_a")
+
+    assert not document_processor.is_collection_indexed("legal_case_a")
+    assert deleted == invalidated == ["legal_case_a"]
@@ -0,0 +1,57 @@
+# backend/tests/test_embedding_cache.py
+
+import pytest
+
+embedding_cache = pytest.importorskip("embedding_cache")
+
+DIM = 4
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text))] * DIM for text in texts]
+
+
+def open_cache(tmp_path, slots=100):
+    # One instance per simulated process: separate file descriptors, indexes and locks
+    return embedding_cache.EmbeddingCache(str(tmp_path), "test-model", slots * (DIM * 4 + embedding_cache.KEY_BYTES + 8))
+
+
+def test_only_missing_texts_are_embedded(tmp_path):
+    cache, embeddings = open_cache(tmp_path), CountingEmbeddings()
+
+    cache.embed_documents(embeddings, ["cause title", "counsel  for the\npetitioner"])
+    vectors = cache.embed_documents(embeddings, ["counsel for the petitioner", "new text", "new text"])
+
+    assert embeddings.embedded == ["cause title", "counsel  for the\npetitioner", "new text"]
+    assert vectors[0] == [27.0] * DIM
+    assert cache.stats()["hits"] == 2  # The cached text and the repeat within the batch
+
+
+def test_a_second_process_reads_and_writes_the_same_cache(tmp_path):
+    server, bulk = open_cache(tmp_path), open_cache(tmp_path)
+    server_embeddings, bulk_embeddings = CountingEmbeddings(), CountingEmbeddings()
+    server.embed_documents(server_embeddings, ["boilerplate"])  # Server opens the cache first
+
+    bulk.embed_documents(bulk_embeddings, ["boilerplate", "statute"])
+    server.embed_documents(server_embeddings, ["statute"])
+
+    assert bulk_embeddings.embedded == ["statute"]
+    assert server_embeddings.embedded == ["boilerplate"]
+    assert server.stats()["enabled"] and bulk.stats()["entries"] == 2
+
+
+def test_least_recently_used_entries_are_evicted_when_full(tmp_path):
+    cache, embeddings = open_cache(tmp_path, slots=20), CountingEmbeddings()
+    cache.embed_documents(embeddings, [f"chunk {i}" for i in range(20)])
+    cache.embed_documents(embeddings, ["chunk 0"])  # Recently used again
+
+    cache.embed_documents(embeddings, ["chunk 20"])
+    embeddings.embedded.clear()
+    cache.embed_documents(embeddings, ["chunk 0", "chunk 1"])
+
+    assert embeddings.embedded == ["chunk 1"]
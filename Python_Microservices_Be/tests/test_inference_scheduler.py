@@ -0,0 +1,83 @@
+# backend/tests/test_inference_scheduler.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+inference_scheduler = pytest.importorskip("inference_scheduler")
+
+
+class Recorder:
+    """batch_fn that doubles numbers and records each batched call."""
+
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+
+    def __call__(self, model, items):
+        self.calls.append((model, list(items)))
+        self.threads.add(threading.current_thread().name)
+        return [model * item for item in items]
+
+
+def submit_concurrently(batcher, requests):
+    barrier = threading.Barrier(len(requests))
+
+    def submit(request):
+        barrier.wait()
+        return batcher.submit(*request)
+
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        return list(pool.map(submit, requests))
+
+
+def test_concurrent_requests_share_one_call_and_get_their_own_slice():
+    recorder = Recorder()
+    batcher = inference_scheduler.MicroBatcher("test", recorder, max_batch=64, max_wait_ms=200)
+
+    results = submit_concurrently(batcher, [(2, [i, i + 100]) for i in range(4)])
+
+    assert results == [[2 * i, 2 * (i + 100)] for i in range(4)]
+    assert len(recorder.calls) == 1
+    assert batcher.stats()["avg_requests_per_batch"] == 4
+
+
+def test_a_full_batch_is_not_held_for_the_wait():
+    recorder = Recorder()
+    batcher = inference_scheduler.MicroBatcher("test", recorder, max_batch=2, max_wait_ms=10_000)
+
+    started = time.perf_counter()
+
+    assert batcher.submit(1, [1, 2]) == [1, 2]
+    assert time.perf_counter() - started < 5
+
+
+def test_requests_for_different_models_are_not_mixed():
+    recorder = Recorder()
+    batcher = inference_scheduler.MicroBatcher("test", recorder, max_batch=64, max_wait_ms=200)
+
+    results = submit_concurrently(batcher, [(2, [1]), (3, [1]), (2, [5])])
+
+    assert results == [[2], [3], [10]]
+    assert sorted(model for model, _ in recorder.calls) == [2, 3]
+
+
+def test_a_failed_batch_fails_every_request_in_it():
+    def broken(model, items):
+        return items[:-1]  # One result short
+
+    batcher = inference_scheduler.MicroBatcher("test", broken, max_batch=64, max_wait_ms=50)
+
+    with pytest.raises(RuntimeError, match="got 1 results for 2 items"):
+        batcher.submit(1, ["a", "b"])
+
+
+def test_disabled_batcher_runs_in_the_callers_thread():
+    recorder = Recorder()
+    batcher = inference_scheduler.MicroBatcher("test", recorder, max_batch=64, max_wait_ms=200, enabled=False)
+
+    assert batcher.submit(3, [1, 2]) == [3, 6]
+    assert batcher.submit(3, []) == []
+    assert recorder.threads == {threading.current_thread().name}
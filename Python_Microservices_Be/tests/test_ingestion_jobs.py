@@ -0,0 +1,60 @@
+# backend/tests/test_ingestion_jobs.py
+
+import pytest
+
+ingestion_jobs = pytest.importorskip("ingestion_jobs")
+document_processor = pytest.importorskip("document_processor")
+
+
+@pytest.fixture
+def deleted(monkeypatch):
+    deleted = []
+    monkeypatch.setattr(ingestion_jobs, "delete_collection", deleted.append)
+    monkeypatch.setattr(ingestion_jobs, "is_collection_indexed", lambda collection_name: False)
+    return deleted
+
+
+def write_job(queue, job_id, owner, collection_name, status):
+    queue._write_snapshot({"job_id": job_id, "owner": owner, "collection_name": collection_name,
+                           "status": status, "error": None, "finished_at": None})
+
+
+def test_recovery_fails_jobs_of_dead_processes(tmp_path, deleted):
+    queue = ingestion_jobs.IngestionJobQueue(1, 8, 10, str(tmp_path))
+    write_job(queue, "a1", "deadowner", "legal_case_a", ingestion_jobs.EMBEDDING)
+    write_job(queue, "b2", None, "legal_case_b", ingestion_jobs.QUEUED)
+    write_job(queue, "c3", "deadowner", "legal_case_c", ingestion_jobs.DONE)
+
+    assert queue.recover_interrupted() == 2
+
+    assert queue.get("a1")["status"] == ingestion_jobs.FAILED
+    assert queue.get("a1")["error"] == ingestion_jobs.INTERRUPTED_ERROR
+    assert queue.get("b2")["status"] == ingestion_jobs.FAILED
+    assert queue.get("c3")["status"] == ingestion_jobs.DONE
+    assert sorted(deleted) == ["legal_case_a", "legal_case_b"]
+
+
+@pytest.mark.skipif(ingestion_jobs.fcntl is None, reason="owner locks need fcntl")
+def test_recovery_keeps_jobs_of_live_processes(tmp_path, deleted):
+    queue = ingestion_jobs.IngestionJobQueue(1, 8, 10, str(tmp_path))
+    other_worker = ingestion_jobs.IngestionJobQueue(1, 8, 10, str(tmp_path))
+    with other_worker._lock:
+        other_worker._hold_owner_lock()
+    write_job(queue, "a1", other_worker._owner, "legal_case_a", ingestion_jobs.PARSING)
+    # Same document, left behind by a dead process: the live job's collection is kept
+    write_job(queue, "b2", "deadowner", "legal_case_a", ingestion_jobs.EMBEDDING)
+
+    assert queue.recover_interrupted() == 1
+
+    assert queue.get("a1")["status"] == ingestion_jobs.PARSING
+    assert queue.get("b2")["status"] == ingestion_jobs.FAILED
+    assert deleted == []
+
+
+def test_partial_collection_is_not_indexed_until_marked(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_processor.config, "INDEXED_DOCUMENTS_DIRECTORY", str(tmp_path))
+
+    assert not document_processor.is_collection_indexed("legal_case_a")
+    document_processor.mark_indexed("legal_case_a", 12, document_processor.CORPUS_STORE)
+    assert document_processor.is_collection_indexed("legal_case_a")
+    assert document_processor.indexed_document("legal_case_a")["store"] == document_processor.CORPUS_STORE
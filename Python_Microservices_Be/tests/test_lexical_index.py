@@ -0,0 +1,71 @@
+# backend/tests/test_lexical_index.py
+
+import pytest
+
+lexical_index = pytest.importorskip("lexical_index")
+
+CHUNKS = {
+    "legal_case_a_0": "The accused was convicted under Section 302 IPC in Crl.A. 117/2019.",
+    "legal_case_a_1": "Bail was granted because the trial had been pending for years.",
+    "legal_case_a_2": "The court examined the evidence of the witnesses and the trial record.",
+}
+
+
+class FakeCollection:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def get(self, include):
+        return {"ids": list(self.chunks), "documents": list(self.chunks.values())}
+
+
+@pytest.fixture
+def index():
+    index = lexical_index.BM25Index()
+    for chunk_id, text in CHUNKS.items():
+        index.add(chunk_id, text)
+    return index
+
+
+@pytest.fixture(autouse=True)
+def index_directory(monkeypatch, tmp_path):
+    monkeypatch.setattr(lexical_index.config, "LEXICAL_INDEX_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(lexical_index, "_cache", lexical_index.OrderedDict())
+    return tmp_path
+
+
+def test_citations_stay_whole_and_yield_their_parts():
+    assert lexical_index.tokenize("What is Crl.A. 117/2019?") == ["crl.a", "crl", "117/2019", "117", "2019"]
+
+
+def test_exact_citation_ranks_its_chunk_first(index):
+    results = index.search("appeal 117/2019 under section 302", k=2)
+
+    assert results[0][0] == "legal_case_a_0"
+    assert len(results) == 1  # No other chunk shares a term
+
+
+def test_rarer_terms_outweigh_common_ones(index):
+    results = dict(index.search("bail trial", k=3))
+
+    assert results["legal_case_a_1"] > results["legal_case_a_2"]
+
+
+def test_saved_index_loads_with_the_same_scores(index, index_directory):
+    path = str(index_directory / "a.bm25.json.gz")
+    index.save(path)
+
+    assert lexical_index.BM25Index.load(path).search("trial bail", k=3) == index.search("trial bail", k=3)
+
+
+def test_missing_index_is_rebuilt_from_the_collection_and_persisted(index_directory):
+    rebuilt = lexical_index.get_index("legal_case_a", FakeCollection(CHUNKS))
+
+    assert rebuilt.search("witnesses", k=1)[0][0] == "legal_case_a_2"
+    assert (index_directory / "legal_case_a.bm25.json.gz").exists()
+
+
+def test_empty_collection_writes_no_index(index_directory):
+    assert lexical_index.get_index("legal_case_b", FakeCollection({})) is None
+    assert lexical_index.get_index("legal_case_b") is None
+    assert list(index_directory.iterdir()) == []
@@ -0,0 +1,190 @@
+# backend/tests/test_llm_gateway.py
+
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import pytest
+
+llm_gateway = pytest.importorskip("llm_gateway")
+
+
+class FakeResponse:
+    """A streamed Ollama response whose lines the test feeds through a queue."""
+    status_code = 200
+
+    def __init__(self):
+        self.lines = queue.Queue()
+        self.closed = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed.set()
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        while True:
+            line = self.lines.get(timeout=5)
+            if line is None:
+                return
+            yield line
+
+    def send(self, text, done=False):
+        self.lines.put(json.dumps({"response": text, "done": done}).encode())
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    gateway = llm_gateway.LLMGateway("http://ollama", max_concurrent=1, max_queued=1, max_retries=0,
+                                     retry_backoff_s=0, connect_timeout_s=1, read_timeout_s=1)
+    gateway.responses = []
+
+    def post(url, **kwargs):
+        response = FakeResponse()
+        gateway.responses.append(response)
+        return response
+
+    monkeypatch.setattr(gateway._session, "post", post)
+    return gateway
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_late_joiner_replays_chunks_and_shares_the_generation(gateway):
+    first = gateway.stream("generate", {"prompt": "holding?"})
+    reader = threading.Thread(target=lambda: first.__next__())
+    reader.start()
+    wait_for(lambda: gateway.responses)
+    gateway.responses[0].send("The ")
+    reader.join(5)
+
+    second = gateway.stream("generate", {"prompt": "holding?"})
+    gateway.responses[0].send("appeal fails.", done=True)
+
+    assert [chunk["response"] for chunk in second] == ["The ", "appeal fails."]
+    assert [chunk["response"] for chunk in first] == ["appeal fails."]
+    assert len(gateway.responses) == 1
+
+
+def test_last_consumer_leaving_closes_the_upstream_response(gateway):
+    abandoned = gateway.stream("generate", {"prompt": "summary"})
+    reader = threading.Thread(target=lambda: abandoned.__next__())
+    reader.start()
+    wait_for(lambda: gateway.responses)
+    response = gateway.responses[0]
+    response.send("The ")
+    reader.join(5)
+
+    abandoned.close()  # e.g. the client disconnected
+    response.send("petitioner")
+
+    assert response.closed.wait(5)
+    wait_for(lambda: gateway.stats()["in_flight"] == 0)
+    # The same request afterwards starts a new generation
+    fresh = gateway.stream("generate", {"prompt": "summary"})
+    threading.Thread(target=lambda: list(fresh)).start()
+    wait_for(lambda: len(gateway.responses) == 2)
+    gateway.responses[1].send("done", done=True)
+
+
+def test_generation_continues_while_a_consumer_remains(gateway):
+    leaving = gateway.stream("generate", {"prompt": "facts"})
+    staying = gateway.stream("generate", {"prompt": "facts"})
+    reader = threading.Thread(target=lambda: leaving.__next__())
+    reader.start()
+    wait_for(lambda: gateway.responses)
+    gateway.responses[0].send("A ")
+    reader.join(5)
+    assert next(staying)["response"] == "A "  # Both have now joined
+
+    leaving.close()
+    gateway.responses[0].send("B", done=True)
+
+    assert [chunk["response"] for chunk in staying] == ["B"]
+
+
+def test_cancelled_flight_leaves_the_slot_queue(gateway):
+    running = gateway.submit("generate", {"prompt": "busy"})
+    wait_for(lambda: gateway.responses)
+    queued = gateway.submit("generate", {"prompt": "queued"})
+    wait_for(lambda: gateway.slots.waiting() == 1)
+
+    gateway._leave(queued)
+
+    wait_for(lambda: gateway.slots.waiting() == 0)
+    assert queued.done and queued.cancelled
+    gateway.responses[0].send("ok", done=True)
+    assert [chunk["response"] for chunk in running] == ["ok"]
+    assert len(gateway.responses) == 1
+
+
+def test_free_slot_goes_to_interactive_before_background():
+    slots = llm_gateway.PrioritySlots(1)
+    order = []
+
+    def take(name, priority):
+        flight = llm_gateway.Flight(name, "chat", {}, priority)
+        with slots.acquire(flight):
+            order.append(name)
+
+    with slots.acquire(llm_gateway.Flight("holder", "chat", {}, llm_gateway.BACKGROUND)):
+        background = threading.Thread(target=take, args=("artifact", llm_gateway.BACKGROUND))
+        background.start()
+        wait_for(lambda: slots.waiting() == 1)
+        interactive = threading.Thread(target=take, args=("ask", llm_gateway.INTERACTIVE))
+        interactive.start()
+        wait_for(lambda: slots.waiting() == 2)
+
+    background.join(5)
+    interactive.join(5)
+    assert order == ["ask", "artifact"]
+
+
+def test_flights_beyond_the_queue_wait_for_a_gateway_thread(gateway):
+    first = gateway.submit("generate", {"prompt": "one"})
+    wait_for(lambda: gateway.responses)
+    second = gateway.submit("generate", {"prompt": "two"})
+    third = gateway.submit("generate", {"prompt": "three"})
+    wait_for(lambda: gateway.slots.waiting() == 1)
+
+    time.sleep(0.05)
+    assert gateway.slots.waiting() == 1  # Both gateway threads are taken; "three" has none yet
+    for flight in (first, second, third):
+        wait_for(lambda: len(gateway.responses) == [first, second, third].index(flight) + 1)
+        gateway.responses[-1].send("ok", done=True)
+        assert [chunk["response"] for chunk in flight] == ["ok"]
+
+
+def test_waiters_on_closed_event_loops_are_skipped():
+    class Loop:
+        def __init__(self, closed=False, fails=False):
+            self.closed, self.fails, self.calls = closed, fails, []
+
+        def is_closed(self):
+            return self.closed
+
+        def call_soon_threadsafe(self, callback):
+            if self.fails:
+                raise RuntimeError("Event loop is closed")
+            self.calls.append(callback)
+
+    closed_loop = asyncio.new_event_loop()
+    closed_loop.close()
+    alive = Loop()
+    flight = llm_gateway.Flight("key", "chat", {}, llm_gateway.INTERACTIVE)
+    flight._async_waiters = [(closed_loop, None), (Loop(fails=True), None), (alive, None)]
+
+    flight.append({"response": "A"})
+
+    assert len(alive.calls) == 1 and flight._async_waiters == []
@@ -0,0 +1,20 @@
+# backend/tests/test_migrate_qa_collection.py
+
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+migrate_qa_collection = pytest.importorskip("migrate_qa_collection")
+
+
+def test_old_collection_is_copied_with_its_embeddings(tmp_path):
+    source = chromadb.PersistentClient(path=str(tmp_path)).get_or_create_collection("pdf_qa_collection")
+    source.add(ids=[f"judgment.pdf_chunk_{i}" for i in range(5)], embeddings=[[float(i), 1.0] for i in range(5)],
+               metadatas=[{"filename": "judgment.pdf", "chunk_index": i} for i in range(5)])
+    target = chromadb.EphemeralClient().get_or_create_collection("pdf_qa_collection")
+
+    copied = migrate_qa_collection.copy_collection(source, target, batch_size=2)
+
+    stored = target.get(ids=["judgment.pdf_chunk_3"], include=["embeddings", "metadatas"])
+    assert copied == 5 and target.count() == 5
+    assert list(stored["embeddings"][0]) == [3.0, 1.0]
+    assert stored["metadatas"][0] == {"filename": "judgment.pdf", "chunk_index": 3}
@@ -0,0 +1,62 @@
+# backend/tests/test_model_registry.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+model_registry = pytest.importorskip("model_registry")
+
+
+@pytest.fixture
+def registry():
+    registry = model_registry.ModelRegistry()
+    registry.loads = []
+    gate = threading.Event()
+
+    def load():
+        gate.wait(5)  # Lets concurrent first requests pile up on the load
+        registry.loads.append(object())
+        return registry.loads[-1]
+
+    registry.register("embedder", load)
+    registry.gate = gate
+    return registry
+
+
+def test_concurrent_first_requests_load_the_model_once(registry):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(registry.get, "embedder") for _ in range(8)]
+        registry.gate.set()
+        models = [future.result() for future in futures]
+
+    assert len(registry.loads) == 1
+    assert all(model is registry.loads[0] for model in models)
+    assert registry.metrics()["models"]["embedder"]["hits"] == 8
+
+
+def test_model_in_use_is_not_unloaded(registry):
+    registry.gate.set()
+    with registry.use("embedder") as model:
+        assert registry.metrics()["models"]["embedder"]["active_refs"] == 1
+        assert not registry.unload("embedder")
+        assert registry.get("embedder") is model
+
+    assert registry.metrics()["models"]["embedder"]["active_refs"] == 0
+    assert registry.unload("embedder")
+    assert registry.get("embedder") is not model  # Loaded again on the next use
+    assert len(registry.loads) == 2
+
+
+def test_release_never_goes_below_zero(registry):
+    registry.gate.set()
+    registry.release("embedder")
+    registry.acquire("embedder")
+    registry.release("embedder")
+
+    assert registry.metrics()["models"]["embedder"]["active_refs"] == 0
+
+
+def test_unknown_model_names_the_registered_ones(registry):
+    with pytest.raises(KeyError, match="embedder"):
+        registry.get("reranker")
@@ -0,0 +1,16 @@
+# backend/tests/test_onnx_backend.py
+
+import pytest
+
+onnx_backend = pytest.importorskip("onnx_backend")
+huggingface = pytest.importorskip("langchain_community.embeddings.huggingface")
+
+
+@pytest.mark.parametrize("model_name", ["BAAI/bge-base-en-v1.5", "BAAI/bge-large-zh-v1.5"])
+def test_query_instruction_matches_the_pytorch_embedder(model_name):
+    # HuggingFaceBgeEmbeddings picks its instruction in __init__; constructing one loads the model,
+    # so its documented defaults are compared instead
+    expected = (huggingface.DEFAULT_QUERY_BGE_INSTRUCTION_ZH if "-zh" in model_name
+                else huggingface.HuggingFaceBgeEmbeddings.model_fields["query_instruction"].default)
+
+    assert onnx_backend.bge_query_instruction(model_name) == expected
@@ -0,0 +1,60 @@
+# backend/tests/test_pdf_extraction.py
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pdf_extraction = pytest.importorskip("pdf_extraction")
+
+
+@pytest.fixture
+def judgment(tmp_path):
+    path = str(tmp_path / "judgment.pdf")
+    with fitz.open() as doc:
+        for number in range(7):
+            doc.new_page().insert_text((72, 72), f"Page {number} of the judgment.")
+        doc.save(path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def small_pool(monkeypatch):
+    monkeypatch.setattr(pdf_extraction.config, "PARSE_WORKERS", 2)
+
+
+def test_pages_come_back_in_order_from_the_parallel_workers(judgment):
+    pages = list(pdf_extraction.iter_pages(judgment, pages_per_task=2))
+
+    assert [number for number, _ in pages] == list(range(7))
+    assert all(f"Page {number} of" in text for number, text in pages)
+
+
+def test_extraction_resumes_at_the_start_page(judgment):
+    pages = list(pdf_extraction.iter_pages(judgment, pages_per_task=2, start_page=3))
+
+    assert [number for number, _ in pages] == [3, 4, 5, 6]
+
+
+def test_short_documents_are_read_without_the_pool(judgment, monkeypatch):
+    monkeypatch.setattr(pdf_extraction, "_get_pool", lambda: pytest.fail("used the pool"))
+
+    assert len(list(pdf_extraction.iter_pages(judgment, pages_per_task=10))) == 7
+
+
+def test_a_known_page_count_is_not_read_from_the_file_again(judgment, monkeypatch):
+    monkeypatch.setattr(pdf_extraction, "get_page_count", lambda filepath: pytest.fail("reopened to count pages"))
+
+    assert [number for number, _ in pdf_extraction.iter_pages(judgment, pages_per_task=10, page_count=7)] == list(range(7))
+    assert list(pdf_extraction.iter_pages(judgment, start_page=7, page_count=7)) == []
+
+
+def test_a_worker_keeps_the_document_open_between_its_ranges(judgment, monkeypatch):
+    opened = []
+    real_open = fitz.open
+    monkeypatch.setattr(pdf_extraction.fitz, "open", lambda *args: opened.append(args) or real_open(*args))
+
+    first = pdf_extraction._extract_range_in_worker(judgment, 0, 3)
+    second = pdf_extraction._extract_range_in_worker(judgment, 3, 7)
+
+    assert [number for number, _ in first + second] == list(range(7))
+    assert len(opened) == 1
+    assert pdf_extraction._worker_document is None  # Closed after the last range
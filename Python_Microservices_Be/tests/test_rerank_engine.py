@@ -0,0 +1,61 @@
+# backend/tests/test_rerank_engine.py
+
+import pytest
+
+rerank_engine = pytest.importorskip("rerank_engine")
+from langchain_core.documents import Document
+
+
+class FakeReranker:
+    """Scores a pair by how often the query's first word occurs in the text; records each batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    def compute_score(self, pairs, batch_size, max_length):
+        self.batches.append([text for _, text in pairs])
+        scores = [float(text.count(query.split()[0].lower())) for query, text in pairs]
+        return scores if len(scores) > 1 else scores[0]
+
+
+def candidate(chunk_id, text, fusion_score):
+    return Document(page_content=text, metadata={"chunk_id": chunk_id, "fusion_score": fusion_score})
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(rerank_engine.config, "INFERENCE_MICRO_BATCHING", False)
+    return rerank_engine.RerankEngine(batch_size=2, candidate_top_m=3, max_length=512, cache_size=100)
+
+
+def test_only_the_top_m_candidates_by_first_stage_score_are_scored(engine):
+    reranker = FakeReranker()
+    docs = [candidate(f"c{i}", "bail " * i, fusion_score=i) for i in range(5)]
+
+    ranked, _ = engine.rerank(reranker, "bail conditions", docs, top_n=2)
+
+    assert sorted(text for batch in reranker.batches for text in batch) == sorted("bail " * i for i in (2, 3, 4))
+    assert [doc.metadata["chunk_id"] for doc, _ in ranked] == ["c4", "c3"]
+    assert [score for _, score in ranked] == [4.0, 3.0]
+
+
+def test_scores_are_cached_per_normalized_query_and_chunk(engine):
+    reranker = FakeReranker()
+    docs = [candidate("c1", "bail granted", 1.0), candidate("c2", "bail bail refused", 0.5)]
+    engine.rerank(reranker, "Bail conditions?", docs, top_n=2)
+
+    ranked, _ = engine.rerank(reranker, "  bail   conditions ", docs + [candidate("c3", "no bail", 0.1)], top_n=3)
+
+    assert len(reranker.batches) == 2 and reranker.batches[1] == ["no bail"]
+    assert engine.stats()["cache_hits"] == 2
+    assert [doc.metadata["chunk_id"] for doc, _ in ranked] == ["c2", "c1", "c3"]
+
+
+def test_batches_group_similar_lengths_and_scores_return_in_input_order(engine):
+    reranker = FakeReranker()
+    pairs = [["bail", "bail " * 40], ["bail", "bail"], ["bail", "bail " * 20], ["bail", "bail bail"]]
+
+    scores = engine._score_pairs(reranker, pairs)
+
+    assert reranker.batches == [["bail", "bail bail"], ["bail " * 20, "bail " * 40]]
+    assert scores == [40.0, 1.0, 20.0, 2.0]
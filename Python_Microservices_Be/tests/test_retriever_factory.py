@@ -0,0 +1,177 @@
+# backend/tests/test_retriever_factory.py
+
+import threading
+
+import pytest
+
+retriever_factory = pytest.importorskip("retriever_factory")
+from langchain_core.documents import Document
+
+
+class StubBase(retriever_factory.FusedMultiQueryRetriever):
+    """Question-only and fused searches without Chroma; records the searches and LLM rewrites it was asked for."""
+    rewrites: list = []
+    searches: list = []
+
+    def search(self, queries, fuse_with=None):
+        self.searches.append(list(queries))
+        found = [Document(page_content=f"{q} chunk {i}", metadata={}) for q in queries for i in range(3)]
+        return list(fuse_with or []) + found
+
+    def generate_variants(self, query):
+        self.rewrites.append(query)
+        return ["variant"]
+
+
+class StubReranker(retriever_factory.CustomRerankerRetriever):
+    """Gives every candidate the same cross-encoder score."""
+    score: float = 0.0
+
+    def rerank(self, query, docs):
+        for doc in docs:
+            doc.metadata["rerank_score"] = self.score
+        return docs[:self.top_n]
+
+
+@pytest.fixture(autouse=True)
+def rewrite_config(monkeypatch):
+    monkeypatch.setattr(retriever_factory.config, "MULTI_QUERY_SKIP_DENSE_SIMILARITY", None)
+    monkeypatch.setattr(retriever_factory.config, "MULTI_QUERY_SKIP_RERANK_SCORE", 4.0)
+    monkeypatch.setattr(retriever_factory, "query_variant_cache", retriever_factory.QueryVariantCache(16, 60))
+
+
+def retriever(score):
+    base = StubBase.model_construct(llm=object(), num_variants=2, rewrites=[], searches=[])
+    return StubReranker.model_construct(base_retriever=base, top_n=2, score=score)
+
+
+def test_confident_rerank_skips_the_rewrite_without_calling_the_llm():
+    confident = retriever(score=9.0)
+
+    docs = confident._get_relevant_documents("section 302 ipc")
+
+    assert [d.page_content for d in docs] == ["section 302 ipc chunk 0", "section 302 ipc chunk 1"]
+    assert confident.base_retriever.rewrites == []
+
+
+def test_unconfident_rerank_searches_the_rewrites():
+    unsure = retriever(score=0.0)
+
+    docs = unsure._get_relevant_documents("bail conditions")
+
+    assert unsure.base_retriever.rewrites == ["bail conditions"]
+    # The question is searched once; the variants' results are fused with it
+    assert unsure.base_retriever.searches == [["bail conditions"], ["variant"]]
+    assert len(docs) == 2
+
+
+def test_rewrites_beyond_the_pending_cap_are_dropped(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(retriever_factory, "_rewrite_slots", slots)
+    slots.acquire()  # One abandoned rewrite is still running
+    unsure = retriever(score=0.0)
+
+    docs = unsure._get_relevant_documents("limitation period")
+
+    assert unsure.base_retriever.rewrites == []
+    assert [d.page_content for d in docs] == ["limitation period chunk 0", "limitation period chunk 1"]
+
+
+def test_unknown_collection_is_rejected_without_creating_anything(monkeypatch, tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    import chroma_client
+
+    client = chromadb.EphemeralClient()
+    monkeypatch.setattr(chroma_client, "_client", client)
+    monkeypatch.setattr(retriever_factory.config, "LEXICAL_INDEX_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(retriever_factory, "model_registry", type("Registry", (), {"get": lambda self, name: None})())
+
+    with pytest.raises(chroma_client.UnknownCollectionError):
+        retriever_factory.get_retriever("legal_case_typo", num_variants=0)
+
+    assert "legal_case_typo" not in [c.name for c in client.list_collections()]
+    assert list(tmp_path.iterdir()) == []
+
+
+class FakeCollection:
+    """Chroma collection answering query() with fixed per-query rankings."""
+
+    def __init__(self, rankings, stored):
+        self.rankings = rankings  # One list of chunk ids per query
+        self.stored = stored  # chunk id -> text
+        self.queries, self.gets = [], []
+
+    def query(self, query_embeddings, n_results, where, include):
+        self.queries.append({"queries": len(query_embeddings), "n_results": n_results, "where": where})
+        ids = [ranking[:n_results] for ranking in self.rankings]
+        return {"ids": ids,
+                "documents": [[self.stored[i] for i in row] for row in ids],
+                "metadatas": [[{"page": 1} for _ in row] for row in ids],
+                "distances": [[0.1 * (rank + 1) for rank in range(len(row))] for row in ids]}
+
+    def get(self, ids, include):
+        self.gets.append(list(ids))
+        return {"ids": ids, "documents": [self.stored[i] for i in ids], "metadatas": [{"page": 2} for _ in ids]}
+
+
+class FakeLexicalIndex:
+    def __init__(self, ranking):
+        self.ranking = ranking
+
+    def search(self, query, k):
+        return [(chunk_id, 1.0) for chunk_id in self.ranking[:k]]
+
+
+def fused_retriever(monkeypatch, collection, lexical_index=None, where=None):
+    monkeypatch.setattr(retriever_factory, "embed_queries", lambda queries, embeddings: [[0.0]] * len(queries))
+    store = type("Store", (), {"_collection": collection})()
+    return retriever_factory.FusedMultiQueryRetriever.model_construct(
+        vector_store=store, embeddings=None, lexical_index=lexical_index, where=where,
+        num_variants=0, k=3, lexical_k=2, rrf_k=60)
+
+
+def test_rrf_ranks_chunks_found_by_several_queries_first(monkeypatch):
+    stored = {c: f"text {c}" for c in "abcd"}
+    collection = FakeCollection([["a", "b", "c"], ["c", "d", "b"]], stored)
+    fused = fused_retriever(monkeypatch, collection, where={"doc_id": "legal_case_a"})
+
+    docs = fused.search(["question", "variant"])
+
+    assert [d.metadata["chunk_id"] for d in docs] == ["c", "b", "a", "d"]
+    assert docs[0].metadata["fusion_score"] == pytest.approx(1 / 63 + 1 / 61)
+    assert docs[0].metadata["vector_distance"] == pytest.approx(0.1)  # Best distance over the queries
+    assert collection.queries == [{"queries": 2, "n_results": 3, "where": {"doc_id": "legal_case_a"}}]
+
+
+def test_lexical_only_chunks_are_fetched_once_and_fused(monkeypatch):
+    stored = {c: f"text {c}" for c in "abcx"}
+    collection = FakeCollection([["a", "b", "c"]], stored)
+    fused = fused_retriever(monkeypatch, collection, lexical_index=FakeLexicalIndex(["x", "c"]))
+
+    docs = {d.metadata["chunk_id"]: d for d in fused.search(["section 302"])}
+
+    assert collection.gets == [["x"]]
+    assert docs["x"].page_content == "text x" and docs["x"].metadata["vector_distance"] == float("inf")
+    assert docs["x"].metadata["fusion_score"] == pytest.approx(1 / 61)
+    assert docs["c"].metadata["fusion_score"] == pytest.approx(1 / 63 + 1 / 62)
+
+
+def test_variants_fused_with_earlier_question_results_match_one_search(monkeypatch):
+    stored = {c: f"text {c}" for c in "abcdx"}
+    lexical_index = FakeLexicalIndex(["x"])
+    together = fused_retriever(monkeypatch, FakeCollection([["a", "b", "c"], ["c", "d", "b"]], stored), lexical_index)
+    question = fused_retriever(monkeypatch, FakeCollection([["a", "b", "c"]], stored), lexical_index)
+    variant = fused_retriever(monkeypatch, FakeCollection([["c", "d", "b"]], stored), lexical_index)
+
+    expected = together.search(["question", "variant"])
+    docs = variant.search(["variant"], fuse_with=question.search(["question"]))
+
+    assert [(d.metadata["chunk_id"], d.metadata["vector_distance"]) for d in docs] == \
+        [(d.metadata["chunk_id"], d.metadata["vector_distance"]) for d in expected]
+    assert [d.metadata["fusion_score"] for d in docs] == pytest.approx([d.metadata["fusion_score"] for d in expected])
+
+
+def test_empty_collection_finds_nothing(monkeypatch):
+    collection = FakeCollection([[]], {})
+
+    assert fused_retriever(monkeypatch, collection).search(["question"]) == []
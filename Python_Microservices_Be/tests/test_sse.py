@@ -0,0 +1,59 @@
+# backend/tests/test_sse.py
+
+import json
+
+import pytest
+
+pytest.importorskip("flask")
+chain_handler = pytest.importorskip("chain_handler")
+
+import app as app_module
+
+
+class FakeDirectChain:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    def stream(self, question):
+        yield from self.chunks
+        if self.error is not None:
+            raise self.error
+
+
+def events(response):
+    """[(event, data), ...] parsed from a text/event-stream body."""
+    parsed = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((lines["event"], json.loads(lines["data"])))
+    return parsed
+
+
+def ask_direct(monkeypatch, chain):
+    monkeypatch.setattr(chain_handler, "get_direct_llm_chain", lambda: chain)
+    return app_module.app.test_client().post("/api/ask_direct_stream", json={"question": "What is res judicata?"})
+
+
+def test_tokens_are_streamed_then_done(monkeypatch):
+    response = ask_direct(monkeypatch, FakeDirectChain(["Res ", "", "judicata bars relitigation."]))
+
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert events(response) == [("token", {"text": "Res "}), ("token", {"text": "judicata bars relitigation."}),
+                                ("done", {})]
+
+
+def test_a_failure_mid_stream_ends_with_an_error_event(monkeypatch):
+    response = ask_direct(monkeypatch, FakeDirectChain(["Res "], error=RuntimeError("Ollama is down")))
+
+    sent = events(response)
+    assert sent[0] == ("token", {"text": "Res "})
+    assert sent[-1][0] == "error" and "Ollama is down" in sent[-1][1]["error"]
+    assert "done" not in [event for event, _ in sent]
+
+
+def test_missing_question_is_rejected_before_streaming():
+    response = app_module.app.test_client().post("/api/ask_direct_stream", json={})
+
+    assert response.status_code == 400
@@ -0,0 +1,53 @@
+# backend/tests/test_startup.py
+
+import pytest
+
+pytest.importorskip("flask")
+
+import app as app_module
+import startup
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(startup, "_components", {})
+    monkeypatch.setattr(startup, "_timings", {})
+    return app_module.app.test_client()
+
+
+def test_healthz_answers_while_readyz_waits_for_warm_up(client, monkeypatch):
+    loaded = []
+    monkeypatch.setattr(startup, "_components_plan", lambda: [
+        ("chroma", lambda: loaded.append("chroma"), True),
+        ("model:embedder", lambda: loaded.append("embedder"), True),
+    ])
+
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/readyz").status_code == 503
+
+    startup.warm_up()
+
+    assert loaded == ["chroma", "embedder"]
+    assert client.get("/healthz").get_json()["status"] == "ok"
+    ready = client.get("/readyz")
+    assert ready.status_code == 200
+    assert ready.get_json()["components"]["model:embedder"]["state"] == startup.READY
+
+
+def test_a_failed_optional_component_does_not_block_readiness(client, monkeypatch):
+    def unreachable():
+        raise ConnectionError("Ollama is down")
+
+    monkeypatch.setattr(startup, "_components_plan", lambda: [
+        ("chroma", lambda: None, True),
+        ("llm", unreachable, False),
+    ])
+    startup.warm_up()
+
+    ready = client.get("/readyz")
+    assert ready.status_code == 200
+    assert ready.get_json()["components"]["llm"]["error"] == "ConnectionError: Ollama is down"
+
+    monkeypatch.setitem(startup._components, "chroma", dict(startup._components["chroma"], state=startup.FAILED))
+    assert client.get("/readyz").status_code == 503
+    assert client.get("/healthz").status_code == 200
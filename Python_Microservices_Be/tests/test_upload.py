@@ -0,0 +1,68 @@
+# backend/tests/test_upload.py
+
+import io
+import os
+
+import pytest
+
+pytest.importorskip("flask")
+ingestion_jobs = pytest.importorskip("ingestion_jobs")
+document_processor = pytest.importorskip("document_processor")
+
+import app as app_module
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(document_processor, "is_collection_indexed", lambda collection_name: False)
+    return app_module.app.test_client()
+
+
+def upload(client, body, filename="judgment.pdf"):
+    return client.post("/api/upload", data={"file": (io.BytesIO(body), filename)},
+                       content_type="multipart/form-data")
+
+
+def test_uploads_with_the_same_filename_are_saved_separately(client, monkeypatch):
+    submitted = []
+
+    def submit(filepath, filename, collection_name):
+        submitted.append((filepath, collection_name))
+        return {"job_id": collection_name, "status": ingestion_jobs.QUEUED}
+
+    monkeypatch.setattr(ingestion_jobs.ingestion_queue, "active_job_for", lambda collection_name: None)
+    monkeypatch.setattr(ingestion_jobs.ingestion_queue, "submit", submit)
+
+    assert upload(client, b"%PDF-1.4 first judgment").status_code == 202
+    assert upload(client, b"%PDF-1.4 second judgment").status_code == 202
+
+    (path_a, collection_a), (path_b, collection_b) = submitted
+    assert path_a != path_b
+    assert collection_a != collection_b
+    # The first job still reads its own bytes after the second upload
+    with open(path_a, "rb") as f:
+        assert f.read() == b"%PDF-1.4 first judgment"
+
+
+def test_upload_joining_an_active_job_removes_its_copy(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingestion_jobs.ingestion_queue, "active_job_for",
+                        lambda collection_name: {"job_id": "running", "status": ingestion_jobs.EMBEDDING})
+
+    response = upload(client, b"%PDF-1.4 same judgment")
+
+    assert response.status_code == 202
+    assert response.get_json()["job_id"] == "running"
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_upload_removes_its_copy(client, tmp_path, monkeypatch):
+    def active_job_for(collection_name):
+        raise OSError("job registry unavailable")
+
+    monkeypatch.setattr(ingestion_jobs.ingestion_queue, "active_job_for", active_job_for)
+
+    response = upload(client, b"%PDF-1.4 judgment")
+
+    assert response.status_code == 500
+    assert os.listdir(tmp_path) == []
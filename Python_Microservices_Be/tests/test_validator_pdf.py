@@ -0,0 +1,96 @@
+# backend/tests/test_validator_pdf.py
+
+import pytest
+
+validator_pdf = pytest.importorskip("validator_pdf")
+
+JUDGMENT = (
+    "IN THE HIGH COURT OF DELHI\nCrl. Appeal No. 117/2019\nCORAM: HON'BLE MR. JUSTICE A\n"
+    "Advocate for the petitioner: Mr. B. The appellant was convicted under Section 302 of "
+    "the Indian Penal Code. JUDGMENT"
+)
+
+
+@pytest.mark.parametrize("text", [
+    JUDGMENT.lower(),
+    "case number 4 of the district court; fir no. 12 under section 379",
+    "a recipe for mango chutney",
+    "",
+])
+def test_single_pass_matcher_finds_the_same_keywords_as_substring_checks(text):
+    expected = {keyword for keyword in validator_pdf.LEGAL_KEYWORDS if keyword in text}
+
+    assert set(validator_pdf.find_keyword_hits(text)) == expected
+
+
+def test_keyword_that_prefixes_a_longer_one_is_credited_at_the_same_position(monkeypatch):
+    pattern, prefixes = validator_pdf._build_keyword_matcher(["section", "section 302", "under section"])
+    monkeypatch.setattr(validator_pdf, "_KEYWORD_PATTERN", pattern)
+    monkeypatch.setattr(validator_pdf, "_KEYWORD_PREFIXES", prefixes)
+
+    hits = validator_pdf.find_keyword_hits("convicted under section 302")
+
+    assert hits == {"under section": [10], "section 302": [16], "section": [16]}
+
+
+def test_judgment_is_valid_and_other_text_is_not():
+    judgment = validator_pdf.validate_court_case_pdf("unused.pdf", pages=[(0, JUDGMENT)])
+    recipe = validator_pdf.validate_court_case_pdf("unused.pdf", pages=[(0, "Mango chutney, serves four.")])
+    empty = validator_pdf.validate_court_case_pdf("unused.pdf", pages=[(0, "  ")])
+
+    assert judgment["is_valid"] and judgment["confidence"] == 1.0
+    assert not recipe["is_valid"] and recipe["keywords_matched"] == 0
+    assert not empty["is_valid"] and empty["reason"]
+
+
+@pytest.fixture
+def judgment_pdf(tmp_path):
+    fitz = pytest.importorskip("fitz")
+
+    def make(page_count):
+        path = str(tmp_path / f"judgment_{page_count}.pdf")
+        with fitz.open() as doc:
+            for number in range(page_count):
+                doc.new_page().insert_text((72, 72), f"In the High Court of Delhi. Petitioner v. Respondent. Page {number}.")
+            doc.save(path)
+        return path
+
+    return make
+
+
+@pytest.fixture
+def opens(monkeypatch):
+    fitz = pytest.importorskip("fitz")
+    opened = []
+    real_open = fitz.open
+
+    def counting_open(*args, **kwargs):
+        if args:  # Not the empty documents the fixture builds
+            opened.append(args[0])
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(validator_pdf.fitz, "open", counting_open)
+    return opened
+
+
+def test_extract_and_validate_returns_the_pages_it_read_and_the_page_count(judgment_pdf, opens, monkeypatch):
+    monkeypatch.setattr(validator_pdf.config, "PARSE_PAGES_PER_TASK", 2)
+    path = judgment_pdf(validator_pdf.VALIDATION_PAGES + 3)
+
+    result, pages, page_count = validator_pdf.extract_and_validate(path)
+
+    assert result["is_valid"] and len(opens) == 1
+    assert [number for number, _ in pages] == list(range(validator_pdf.VALIDATION_PAGES))
+    assert page_count == validator_pdf.VALIDATION_PAGES + 3
+    assert "High Court" in pages[0][1]  # Original case, for ingestion
+
+
+def test_short_or_fully_requested_documents_are_read_in_the_same_pass(judgment_pdf, opens, monkeypatch):
+    monkeypatch.setattr(validator_pdf.config, "PARSE_PAGES_PER_TASK", 2)
+
+    _, short_pages, _ = validator_pdf.extract_and_validate(judgment_pdf(validator_pdf.VALIDATION_PAGES + 2))
+    _, all_pages, page_count = validator_pdf.extract_and_validate(judgment_pdf(9), read_all=True)
+
+    assert len(opens) == 2
+    assert len(short_pages) == validator_pdf.VALIDATION_PAGES + 2
+    assert [number for number, _ in all_pages] == list(range(page_count)) == list(range(9))
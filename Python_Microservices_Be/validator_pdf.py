@@ -1,7 +1,15 @@
 # backend/pdf_validator.py
 
+import re
+
 import fitz  # PyMuPDF
 
+import config
+from pdf_extraction import read_pages
+from telemetry import get_logger
+
+log = get_logger(__name__)
+
 # List of keywords that are strong indicators of a legal document
 LEGAL_KEYWORDS = [
     "in the high court of",
@@ -31,25 +39,64 @@ LEGAL_KEYWORDS = [
     "fir no",
 ]
 
-# This is the simplified text extraction function without OCR
-def extract_text_for_validation(file_path: str) -> str:
-    text = ""
+# Number of leading pages inspected for validation
+VALIDATION_PAGES = 3
+
+
+def _build_keyword_matcher(keywords):
+    """
+    Compiles all keywords into one regex that is scanned once over the text.
+    The zero-width lookahead lets matches overlap, and longer keywords are tried
+    first; a keyword that is a prefix of a longer one (same start position) is
+    credited through the `prefixes` map instead of being shadowed.
+    """
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in ordered) + "))")
+    prefixes = {k: [p for p in ordered if p != k and k.startswith(p)] for k in ordered}
+    return pattern, prefixes
+
+_KEYWORD_PATTERN, _KEYWORD_PREFIXES = _build_keyword_matcher(LEGAL_KEYWORDS)
+
+
+def find_keyword_hits(text: str) -> dict:
+    """Returns {keyword: [start positions]} for every LEGAL_KEYWORDS entry found in the (lowercased) text."""
+    hits = {}
+    for match in _KEYWORD_PATTERN.finditer(text):
+        keyword = match.group(1)
+        position = match.start()
+        hits.setdefault(keyword, []).append(position)
+        for prefix in _KEYWORD_PREFIXES[keyword]:
+            hits.setdefault(prefix, []).append(position)
+    return hits
+
+
+def extract_pages_for_validation(file_path: str) -> list:
+    """
+    Opens the PDF once and returns [(page_number, text), ...] for the first
+    VALIDATION_PAGES pages, in their original case so ingestion can reuse them.
+    """
     try:
         with fitz.open(file_path) as doc:
             # Limit the number of pages to check for efficiency
-            page_count = min(3, doc.page_count) 
-            for i in range(page_count):
-                page = doc.load_page(i)
-                text += page.get_text("text")
+            return read_pages(doc, 0, VALIDATION_PAGES)
     except Exception as e:
-        print(f"Error extracting text from {file_path}: {e}")
-        return "" # Return empty string on failure
+        log.warning("Error extracting text from %s: %s", file_path, e)
+        return [] # Return no pages on failure
+
 
-    return text.lower()
+# This is the simplified text extraction function without OCR
+def extract_text_for_validation(file_path: str) -> str:
+    return "".join(text for _, text in extract_pages_for_validation(file_path)).lower()
 
 
-def validate_court_case_pdf(file_path: str) -> dict:
-    text = extract_text_for_validation(file_path)
+def validate_court_case_pdf(file_path: str, pages: list = None) -> dict:
+    """
+    Scores the document against LEGAL_KEYWORDS. Pass `pages` from
+    extract_pages_for_validation() to avoid opening the file again.
+    """
+    if pages is None:
+        pages = extract_pages_for_validation(file_path)
+    text = "".join(page_text for _, page_text in pages).lower()
 
     if not text.strip():
         return {
@@ -59,8 +106,8 @@ def validate_court_case_pdf(file_path: str) -> dict:
             "reason": "Document contains no extractable text."
         }
 
-    # 2. Count how many unique keywords are present in the text
-    matched_keywords = {k for k in LEGAL_KEYWORDS if k in text}
+    # 2. Count how many unique keywords are present in the text (single pass)
+    matched_keywords = find_keyword_hits(text)
     hits = len(matched_keywords)
     
     # 3. Calculate a confidence score
@@ -78,4 +125,25 @@ def validate_court_case_pdf(file_path: str) -> dict:
         "is_valid": is_valid,
         "confidence": round(confidence, 2),
         "keywords_matched": hits,
-    }
\ No newline at end of file
+    }
+
+
+def extract_and_validate(file_path: str, read_all: bool = False):
+    """
+    Combined path for ingestion: opens the PDF once, validates its first pages and
+    returns (validation_result, pages, page_count). The pages go straight to the
+    splitter and page_count to pdf_extraction.iter_pages, so the file is not opened
+    again to count its pages. The rest of a valid document is read in the same pass
+    with read_all, or when it is short enough that iter_pages would read it inline.
+    """
+    try:
+        with fitz.open(file_path) as doc:
+            page_count = doc.page_count
+            pages = read_pages(doc, 0, VALIDATION_PAGES)
+            validation = validate_court_case_pdf(file_path, pages=pages)
+            if validation["is_valid"] and (read_all or page_count - len(pages) <= config.PARSE_PAGES_PER_TASK):
+                pages += read_pages(doc, len(pages), page_count)
+    except Exception as e:
+        log.warning("Error extracting text from %s: %s", file_path, e)
+        return validate_court_case_pdf(file_path, pages=[]), [], 0
+    return validation, pages, page_count
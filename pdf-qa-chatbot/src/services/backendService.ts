@@ -2,6 +2,15 @@
 
 const BACKEND_URL = 'http://127.0.0.1:5001'; 
 
+const UPLOAD_POLL_INTERVAL_MS = 1000;
+
+type UploadJob = {
+  job_id?: string;
+  collection_name: string;
+  status: string;
+  error?: string;
+};
+
 export const uploadPdf = async (file: File): Promise<{ collection_name: string }> => {
   const formData = new FormData();
   formData.append('file', file);
@@ -16,8 +25,22 @@ export const uploadPdf = async (file: File): Promise<{ collection_name: string }
     throw new Error(errorData.error || 'Failed to upload PDF');
   }
 
-  const data = await response.json();
-  return data;
+  // Ingestion runs in the background: poll the job until it is done or failed.
+  let job: UploadJob = await response.json();
+  while (job.status !== 'done') {
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Failed to process PDF');
+    }
+    await new Promise((resolve) => setTimeout(resolve, UPLOAD_POLL_INTERVAL_MS));
+    const statusResponse = await fetch(`${BACKEND_URL}/api/upload/status/${job.job_id}`);
+    if (!statusResponse.ok) {
+      const errorData = await statusResponse.json();
+      throw new Error(errorData.error || 'Failed to get upload status');
+    }
+    job = await statusResponse.json();
+  }
+
+  return { collection_name: job.collection_name };
 };
 
 export const askBackend = async (